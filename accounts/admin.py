@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, Sequence
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -19,3 +19,10 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ('user_type', 'is_staff', 'is_superuser', 'is_active')
 
 admin.site.register(CustomUser, CustomUserAdmin)
+
+
+@admin.register(Sequence)
+class SequenceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'period', 'last_value', 'updated_at')
+    list_filter = ('name',)
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,207 @@
+# accounts/jobs.py
+import csv
+import json
+import os
+import time
+import tracemalloc
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+# ---------------------- ROW JOBS ----------------------
+# Base for management commands that work through a CSV one batch at a time.
+# The file is streamed (only one batch of rows is held at once), progress is
+# shown with rows/sec, rows a job can't use go to a reject file next to the
+# input, and after every finished batch the last CSV line is saved to a
+# checkpoint so ``--resume`` carries on from there after a crash or kill.
+#
+# A job implements process_batch(rows), where rows is a list of
+# ``(line_no, row)`` pairs, and calls self.reject(line_no, row, reason) for
+# rows it skips. setup() and teardown() run before and after the rows;
+# self.stats counts whatever the job wants summarised at the end.
+
+PROGRESS_BAR_WIDTH = 30
+
+
+def read_checkpoint(path, csv_file):
+    """Last finished CSV line for ``csv_file`` from the checkpoint at ``path`` (0 if none)."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('file') != os.path.abspath(csv_file):
+        raise CommandError(f"Checkpoint {path} belongs to {checkpoint.get('file')}, not {csv_file}")
+    return checkpoint['line']
+
+
+def write_checkpoint(path, csv_file, line):
+    # Write-then-rename, so a crash mid-write never leaves a truncated checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'file': os.path.abspath(csv_file), 'line': line}, f)
+    os.replace(tmp, path)
+
+
+def count_lines(path):
+    """Physical lines in ``path``, counted in binary chunks (for the progress bar)."""
+    lines = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            lines += chunk.count(b'\n')
+    return lines
+
+
+class RowJobCommand(BaseCommand):
+    """Run ``process_batch`` over a CSV file's rows; see the notes at the top of accounts/jobs.py."""
+
+    batch_size = 1000
+    supports_dry_run = False
+    reject_omit_columns = ()  # input columns left out of the reject file (e.g. secrets)
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', type=str, help="Path to the CSV file")
+        parser.add_argument('--batch-size', type=int, default=self.batch_size, help="Rows handled per batch")
+        if self.supports_dry_run:
+            parser.add_argument('--dry-run', action='store_true', help="Go through the file without saving anything")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: <csv_file>.<command>.checkpoint)")
+        parser.add_argument('--resume', action='store_true',
+                            help="Skip the rows finished by an earlier run, as recorded in the checkpoint")
+        parser.add_argument('--rejects', help="Where rejected rows are written (default: <csv_file>.<command>.rejects.csv)")
+        parser.add_argument('--max-errors', type=int,
+                            help="Stop once more than this many rows have been rejected")
+        parser.add_argument('--trace-memory', action='store_true',
+                            help="Report peak Python memory (tracemalloc; makes the run slower)")
+
+    # ---- hooks ----
+
+    def setup(self):
+        """Called once before the first batch (preloads, pools)."""
+
+    def process_batch(self, rows):
+        raise NotImplementedError
+
+    def teardown(self):
+        """Called once after the last batch, also when the run fails."""
+
+    def report(self):
+        """Write any job-specific lines after the summary counts."""
+
+    # ---- helpers for jobs ----
+
+    def reject(self, line_no, row, reason, detail=None):
+        """
+        Record a row the job couldn't use in the reject file. ``reason`` is
+        counted in the summary, so keep it short and fixed; ``detail`` (e.g.
+        an exception message) only goes into the file.
+        """
+        self.rejected += 1
+        self.stats[f"rejected: {reason}"] += 1
+        if self._reject_writer is None:
+            exists = self.resuming and os.path.exists(self.rejects_path) and os.path.getsize(self.rejects_path)
+            self._reject_file = open(self.rejects_path, 'a' if exists else 'w', newline='', encoding='utf-8')
+            self._reject_writer = csv.DictWriter(
+                self._reject_file,
+                ['line', 'error', *(name for name in self.fieldnames if name not in self.reject_omit_columns)],
+                restval='', extrasaction='ignore',
+            )
+            if not exists:
+                self._reject_writer.writeheader()
+        error = f"{reason}: {detail}" if detail else reason
+        self._reject_writer.writerow({**row, 'line': line_no, 'error': error})
+
+    # ---- runner ----
+
+    def read_rows(self, file, start_after=0):
+        """Stream ``(line_no, row)`` for the rows after line ``start_after``."""
+        reader = csv.DictReader(file)
+        self.fieldnames = [name for name in (reader.fieldnames or []) if name not in ('line', 'error')]
+        for row in reader:
+            if reader.line_num > start_after:
+                yield reader.line_num, row
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.dry_run = options.get('dry_run', False)
+        csv_file = options['csv_file']
+        if not os.path.exists(csv_file):
+            raise CommandError(f"File not found: {csv_file}")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        job = self.__module__.rsplit('.', 1)[-1]
+        checkpoint = options['checkpoint'] or f"{csv_file}.{job}.checkpoint"
+        self.rejects_path = options['rejects'] or f"{csv_file}.{job}.rejects.csv"
+        self.resuming = options['resume']
+        start_after = read_checkpoint(checkpoint, csv_file) if self.resuming else 0
+        if start_after:
+            self.stdout.write(f"Resuming after line {start_after}")
+
+        self.stats = Counter()
+        self.rejected = 0
+        self.fieldnames = []
+        self._reject_file = self._reject_writer = None
+        total_lines = count_lines(csv_file)
+        if options['trace_memory']:
+            tracemalloc.start()
+
+        started = time.monotonic()
+        rows_done = 0
+        self.setup()
+        try:
+            with open(csv_file, newline='', encoding='utf-8-sig') as file:
+                rows = self.read_rows(file, start_after)
+                while batch := list(islice(rows, options['batch_size'])):
+                    self.process_batch(batch)
+                    rows_done += len(batch)
+                    last_line = batch[-1][0]
+                    if not self.dry_run:
+                        write_checkpoint(checkpoint, csv_file, last_line)
+                    self.show_progress(rows_done, last_line, total_lines, started)
+                    if options['max_errors'] is not None and self.rejected > options['max_errors']:
+                        raise CommandError(
+                            f"Stopped after line {last_line}: {self.rejected} rows rejected "
+                            f"(see {self.rejects_path}). Fix them and re-run with --resume."
+                        )
+            peak = tracemalloc.get_traced_memory()[1] if options['trace_memory'] else None
+        finally:
+            self.teardown()
+            if self._reject_file is not None:
+                self._reject_file.close()
+            if options['trace_memory']:
+                tracemalloc.stop()
+
+        if self.stdout.isatty():
+            self.stdout.write("")  # end the progress bar's line
+        if not self.dry_run and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        for label, count in sorted(self.stats.items()):
+            if count:
+                style = self.style.WARNING if label.startswith('rejected') else str
+                self.stdout.write(style(f"  {label}: {count}"))
+        self.report()
+
+        elapsed = time.monotonic() - started
+        rate = rows_done / elapsed if elapsed else 0
+        summary = f"{'Dry run: checked' if self.dry_run else 'Processed'} {rows_done} rows in {elapsed:.1f}s ({rate:.0f} rows/s)"
+        if peak is not None:
+            summary += f", peak memory {peak / (1 << 20):.1f} MiB"
+        self.stdout.write(self.style.SUCCESS(f"✅ {summary}"))
+        if self.rejected:
+            self.stdout.write(self.style.WARNING(f"⚠ {self.rejected} rows rejected, written to {self.rejects_path}"))
+
+    def show_progress(self, rows_done, line, total_lines, started):
+        elapsed = time.monotonic() - started
+        rate = rows_done / elapsed if elapsed else 0
+        fraction = min(line / total_lines, 1) if total_lines else 1
+        filled = int(fraction * PROGRESS_BAR_WIDTH)
+        text = (f"[{'#' * filled}{'.' * (PROGRESS_BAR_WIDTH - filled)}] {fraction:4.0%} "
+                f"line {line}/{total_lines}, {rate:.0f} rows/s")
+        if self.options['trace_memory']:
+            text += f", peak {tracemalloc.get_traced_memory()[1] / (1 << 20):.1f} MiB"
+        if self.stdout.isatty():
+            self.stdout.write(f"\r{text}", ending='')
+            self.stdout.flush()
+        else:
+            self.stdout.write(text)
@@ -0,0 +1,61 @@
+# accounts/mailer.py
+import random
+import threading
+import time
+
+from .zeptomail_backend import ZeptoMailError
+
+# ---------------------- BULK MAIL ----------------------
+# Helpers for sending many messages from a thread pool: a shared limiter
+# spaces the API calls out to a fixed rate across all threads, and each
+# message is retried with exponential backoff (plus jitter, or the API's
+# Retry-After) while the failure is one that can pass: throttling, a 5xx or
+# a network error. Refusals such as a bad address, and unexpected errors,
+# fail at once.
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0  # seconds before the first retry; doubles each time
+
+
+class RateLimiter:
+    """Hands out send slots ``1 / per_second`` apart to any number of threads (0 = unlimited)."""
+
+    def __init__(self, per_second):
+        self.interval = 1 / per_second if per_second else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def send_with_retries(connection, message, limiter=None, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """
+    Send ``message`` through ``connection``, retrying transient failures up to
+    ``retries`` times. Returns ``(attempts, error)``; ``error`` is ``None``
+    once the message was accepted, otherwise the last failure. Never raises:
+    anything other than a ZeptoMailError (a backend bug, a bad message) is
+    returned as a failure that isn't worth retrying, so a bulk send carries on.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        if limiter is not None:
+            limiter.wait()
+        try:
+            connection.send_messages([message])
+            return attempt, None
+        except ZeptoMailError as e:
+            if not e.retryable or attempt > retries:
+                return attempt, e
+            delay = e.retry_after if e.retry_after is not None else backoff * 2 ** (attempt - 1)
+            time.sleep(delay + random.uniform(0, delay / 10))
+        except Exception as e:
+            return attempt, e
@@ -19,3 +19,23 @@ class CustomUser(AbstractUser):
 
     def __str__(self):
         return f"{self.username} ({self.user_type})"
+
+
+class Sequence(models.Model):
+    """
+    Named counter behind human-readable numbers (DC numbers, partner codes,
+    asset codes). Values are handed out by ``accounts.utils.reserve_sequence``
+    under a row lock, so parallel writers never get the same value.
+    """
+    name = models.CharField(max_length=50)
+    # Blank for counters that never reset; e.g. "2025-26" for per-financial-year counters
+    period = models.CharField(max_length=20, blank=True, default='')
+    last_value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('name', 'period')
+
+    def __str__(self):
+        label = f"{self.name} [{self.period}]" if self.period else self.name
+        return f"{label}: {self.last_value}"
@@ -0,0 +1,179 @@
+# accounts/testing.py
+"""
+Local stand-ins for the HTTP APIs the app calls, for tests and manual runs.
+
+FakeJSONAPI is the shared server: a threaded local HTTP server that keeps
+connections alive like the real APIs, logs every request and can be slowed
+down (``delay``) or made to answer with 500s (``fail_next``) to exercise
+timeouts and retries. Each API subclasses it with its own credentials check
+and routes (FakeZeptoMail below, order.testing.FakeRazorpay).
+
+    with FakeZeptoMail() as api, override_settings(**api.settings()):
+        call_command("zm_login_details", "zm_users.csv")
+        api.messages  # the JSON payloads that were accepted
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeJSONAPI:
+    failure = ("SERVER_ERROR", "Stand-in API failure")        # sent with a fail_next 500
+    unauthorized = ("UNAUTHORIZED", "Invalid credentials")     # sent with a 401
+
+    def __init__(self):
+        self.requests = []        # (time.monotonic(), method, path, client address)
+        self.delay = 0            # seconds to wait before answering
+        self.fail_next = 0        # answer this many requests with a 500
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # ---- lifecycle ----
+    def start(self):
+        api = self
+
+        class Handler(_Handler):
+            fake = api
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def origin(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def connections(self):
+        """Number of distinct TCP connections the server has seen."""
+        return len({address for *_, address in self.requests})
+
+    # ---- for subclasses ----
+    def authorized(self, headers):
+        return True
+
+    def route(self, method, path, payload):
+        """Answer an authorized request: ``(status, data, extra headers)``."""
+        raise NotImplementedError
+
+    def error(self, code, message):
+        return {"error": {"code": code, "message": message}}
+
+    # ---- request handling ----
+    def respond(self, method, path, headers, body, client_address):
+        with self._lock:
+            self.requests.append((time.monotonic(), method, path, client_address))
+        if self.delay:
+            time.sleep(self.delay)
+
+        with self._lock:
+            failing = self.fail_next > 0
+            if failing:
+                self.fail_next -= 1
+        if failing:
+            return 500, self.error(*self.failure), {}
+        if not self.authorized(headers):
+            return 401, self.error(*self.unauthorized), {}
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            payload = {}
+        return self.route(method, path, payload)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        status, data, headers = self.fake.respond(method, self.path, self.headers, body, self.client_address)
+
+        out = json.dumps(data).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+class FakeZeptoMail(FakeJSONAPI):
+    """
+    The ZeptoMail send API. Besides delays and 500s it can throttle (429 with
+    Retry-After) and refuse given addresses (422).
+    """
+    unauthorized = ("TM_1001", "Invalid API key")
+
+    def __init__(self, api_key="zm_test_key"):
+        super().__init__()
+        self.api_key = api_key
+        self.messages = []        # accepted payloads
+        self.throttle_next = 0    # answer this many requests with a 429
+        self.retry_after = 0      # Retry-After seconds sent with a 429
+        self.refuse = set()       # recipient addresses answered with a 422
+
+    @property
+    def url(self):
+        return f"{self.origin}/v1.1/email"
+
+    def settings(self, **overrides):
+        """Settings for override_settings() that send the app's mail to this server."""
+        return dict({
+            "EMAIL_BACKEND": "accounts.zeptomail_backend.ZeptoMailBackend",
+            "ZEPTOMAIL_API_URL": self.url,
+            "ZEPTOMAIL_API_KEY": self.api_key,
+            "ZEPTOMAIL_TIMEOUT": (1, 2),
+        }, **overrides)
+
+    def recipients(self):
+        """Every accepted "to" address, in the order the messages arrived."""
+        return [to["email_address"]["address"] for message in self.messages for to in message["to"]]
+
+    def authorized(self, headers):
+        return headers.get("Authorization") == f"Zoho-enczapikey {self.api_key}"
+
+    def route(self, method, path, payload):
+        with self._lock:
+            if self.throttle_next:
+                self.throttle_next -= 1
+                return 429, self.error("TM_4001", "Rate limit exceeded"), {"Retry-After": str(self.retry_after)}
+
+        addresses = [to["email_address"]["address"] for to in payload.get("to", [])]
+        refused = [address for address in addresses if address in self.refuse]
+        if refused or not addresses:
+            return 422, self.error("TM_3201", f"Invalid recipient {', '.join(refused)}"), {}
+
+        with self._lock:
+            self.messages.append(payload)
+        return 201, {"data": [{"code": "EM_104", "message": "Email request received"}],
+                     "message": "OK", "request_id": uuid.uuid4().hex}, {}
@@ -1,3 +1,291 @@
+import csv
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import datetime
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+
+from asset.models import Asset, Cart, CartItem
+from order.models import Order, OrderItem
+from order.utils import CartChanged, place_order_from_cart
+from partner.models import Partner, PartnerAssetLimit
+from partner.utils import next_partner_codes
+from .jobs import RowJobCommand
+from .models import Sequence
+from .utils import decode_cursor, encode_cursor, financial_year, reserve_sequence
+
+
+class CartLimitTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        self.partner = Partner.objects.create(user=self.user)
+        self.asset = Asset.objects.create(name='ONT', asset_code='ONT-0001', purchase_price=100,
+                                          max_order_per_partner=10)
+        PartnerAssetLimit.objects.create(partner=self.partner, asset=self.asset, max_purchase_limit=2)
+        self.client.login(username='partner1', password='pass1234')
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), json.dumps(payload), content_type='application/json')
+
+    def test_add_to_cart_respects_partner_override(self):
+        resp = self.post('add_to_cart', {'asset_id': self.asset.id, 'quantity': 2})
+        self.assertTrue(resp.json()['success'])
+
+        resp = self.post('add_to_cart', {'asset_id': self.asset.id, 'quantity': 1})
+        self.assertFalse(resp.json()['success'])
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 2)
+
+    def test_update_cart_respects_partner_override(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, asset=self.asset, quantity=1)
+
+        resp = self.post('update_cart', {'asset_id': self.asset.id, 'quantity': 3})
+        self.assertFalse(resp.json()['success'])
+
+        resp = self.post('update_cart', {'asset_id': self.asset.id, 'quantity': 2})
+        self.assertTrue(resp.json()['success'])
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        Partner.objects.create(user=self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill_cart(self, lines):
+        start = Asset.objects.count()
+        for n in range(start, start + lines):
+            asset = Asset.objects.create(name=f'Asset {n}', asset_code=f'A-{n:04d}', purchase_price=Decimal('10.50'))
+            CartItem.objects.create(cart=self.cart, asset=asset, quantity=2)
+
+    def test_order_items_snapshot_prices_and_cart_is_cleared(self):
+        self.fill_cart(3)
+        order = place_order_from_cart(self.user, lambda amount: 'order_TEST1')
+
+        self.assertEqual(order.amount, Decimal('63.00'))
+        self.assertEqual(order.status, 'Pending')
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 3)
+        self.assertEqual(set(OrderItem.objects.values_list('price', flat=True)), {Decimal('10.50')})
+        self.assertFalse(CartItem.objects.exists())
+        self.cart.refresh_totals()
+        self.assertEqual((self.cart.total_items(), self.cart.total_price()), (0, Decimal('0.00')))
+
+    def test_query_count_does_not_grow_with_cart_lines(self):
+        Order.objects.create(user=self.user, order_id='order_FIRST')  # creates the DC number counter
+        self.fill_cart(2)
+        with CaptureQueriesContext(connection) as small:
+            place_order_from_cart(self.user, lambda amount: 'order_SMALL')
+
+        self.fill_cart(35)
+        with self.assertNumQueries(len(small.captured_queries)):
+            order = place_order_from_cart(self.user, lambda amount: 'order_BIG')
+        self.assertEqual(order.orderitem_set.count(), 35)
+
+    def test_gateway_failure_leaves_cart_untouched(self):
+        self.fill_cart(2)
+
+        def failing_gateway(amount):
+            raise RuntimeError('gateway down')
+
+        with self.assertRaises(RuntimeError):
+            place_order_from_cart(self.user, failing_gateway)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_gateway_is_called_outside_the_transaction(self):
+        self.fill_cart(2)
+        depth = len(connection.savepoint_ids)
+        seen = []
+
+        def gateway(amount):
+            seen.append(len(connection.savepoint_ids))
+            return 'order_OUTSIDE'
+
+        place_order_from_cart(self.user, gateway)
+        self.assertEqual(seen, [depth])
+
+    def test_cart_changed_during_gateway_call(self):
+        self.fill_cart(2)
+        line = CartItem.objects.first()
+
+        def gateway(amount):
+            line.quantity = 5
+            line.save()
+            return 'order_STALE'
+
+        with self.assertRaises(CartChanged):
+            place_order_from_cart(self.user, gateway)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+        self.client.login(username='partner1', password='pass1234')
+        line.quantity = 1
+        line.save()
+        with mock.patch('accounts.views.create_gateway_order', side_effect=gateway):
+            resp = self.client.post(reverse('place_order'))
+        self.assertRedirects(resp, reverse('view_cart'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+
+    def test_empty_cart_redirects(self):
+        self.client.login(username='partner1', password='pass1234')
+        with mock.patch('accounts.views.create_gateway_order') as create_gateway_order:
+            resp = self.client.post(reverse('place_order'))
+        self.assertRedirects(resp, reverse('view_cart'), fetch_redirect_response=False)
+        create_gateway_order.assert_not_called()
+
+    def test_view_renders_payment_page(self):
+        self.fill_cart(1)
+        self.client.login(username='partner1', password='pass1234')
+        with mock.patch('accounts.views.create_gateway_order', return_value='order_VIEW') as create_gateway_order:
+            resp = self.client.post(reverse('place_order'))
+        create_gateway_order.assert_called_once_with(Decimal('21.00'))
+        self.assertEqual(resp.context['order'].order_id, 'order_VIEW')
+        self.assertEqual(resp.context['amount'], 2100)
+
+
+class CursorTests(TestCase):
+    def test_round_trip(self):
+        when = datetime.datetime(2025, 3, 5, 10, 30, tzinfo=datetime.timezone.utc)
+        cursor = encode_cursor(when, 42)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor, datetime.datetime, int), (when, 42))
+        self.assertEqual(decode_cursor(encode_cursor(None, 7), datetime.datetime, int), (None, 7))
+
+    def test_malformed_cursors(self):
+        for cursor in ('garbage!', encode_cursor(1), encode_cursor('yesterday', 1), encode_cursor('x', 'y')[:-2]):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor, datetime.datetime, int)
+
+
+class SequenceTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='partner1', password='pass1234')
+
+    def test_batches_are_consecutive(self):
+        self.assertEqual(list(reserve_sequence('test', 3)), [1, 2, 3])
+        self.assertEqual(list(reserve_sequence('test', 2)), [4, 5])
+        self.assertEqual(Sequence.objects.get(name='test').last_value, 5)
+        with self.assertNumQueries(4):  # savepoint, lock, update, release
+            reserve_sequence('test', 100)
+
+    def test_new_sequence_continues_from_existing_data(self):
+        self.assertEqual(list(reserve_sequence('seeded', 2, initial=lambda: 41)), [42, 43])
+        # initial only matters when the counter row is created
+        self.assertEqual(list(reserve_sequence('seeded', 1, initial=lambda: 0)), [44])
+
+    def test_financial_year_reset(self):
+        self.assertEqual(financial_year(datetime.date(2026, 3, 31)), '2025-26')
+        self.assertEqual(financial_year(datetime.date(2026, 4, 1)), '2026-27')
+
+        march = datetime.date(2026, 3, 10)
+        reserve_sequence('fy', 5, per_financial_year=True, day=march)
+        self.assertEqual(list(reserve_sequence('fy', 1, per_financial_year=True, day=march)), [6])
+        self.assertEqual(list(reserve_sequence('fy', 1, per_financial_year=True, day=datetime.date(2026, 4, 2))), [1])
+
+    def test_rolled_back_values_are_reused(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                reserve_sequence('test', 1)
+                raise RuntimeError
+        self.assertEqual(list(reserve_sequence('test', 1)), [1])
+
+    def test_dc_numbers_continue_after_existing_orders(self):
+        Order.objects.create(user=self.user, order_id='LEGACY', dc_number='DC0041')
+        Sequence.objects.filter(name='dc_number').delete()  # as if the counter had never existed
+
+        first = Order.objects.create(user=self.user, order_id='A')
+        second = Order.objects.create(user=self.user, order_id='B')
+        self.assertEqual((first.dc_number, second.dc_number), ('DC0042', 'DC0043'))
+
+    def test_partner_codes_start_at_1000(self):
+        self.assertEqual(next_partner_codes(2), ['skyplay_1000', 'skyplay_1001'])
+
+
+class CollectRows(RowJobCommand):
+    """Test job: keeps every row with a numeric "n", rejects the rest, can crash on one line."""
+    batch_size = 3
+    supports_dry_run = True
+
+    def __init__(self, crash_on=None, **kwargs):
+        super().__init__(**kwargs)
+        self.crash_on, self.seen = crash_on, []
+
+    def process_batch(self, rows):
+        for line_no, row in rows:
+            if line_no == self.crash_on:
+                raise RuntimeError("killed")
+        for line_no, row in rows:
+            if row['n'].isdigit():
+                self.seen.append(int(row['n']))
+            else:
+                self.reject(line_no, row, "not a number", repr(row['n']))
+
+
+class RowJobCommandTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'rows.csv')
+        with open(self.path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['n', 'note'])
+            for n in range(10):
+                writer.writerow([n if n != 4 else 'four', f'row {n}'])
+        self.checkpoint = f'{self.path}.tests.checkpoint'
+        self.rejects = f'{self.path}.tests.rejects.csv'
+
+    def run_job(self, job, *args):
+        out = StringIO()
+        call_command(job, self.path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_runs_in_batches_with_progress_and_rejects(self):
+        job = CollectRows()
+        report = self.run_job(job, '--trace-memory')
+        self.assertEqual(job.seen, [0, 1, 2, 3, 5, 6, 7, 8, 9])
+        self.assertEqual(report.count('rows/s'), 5)  # a progress line per batch of 3, then the summary
+        self.assertIn('100% line 11/11', report)
+        self.assertIn('Processed 10 rows', report)
+        self.assertIn('peak memory', report)
+        self.assertIn('rejected: not a number: 1', report)
+        with open(self.rejects, encoding='utf-8') as f:
+            self.assertEqual(list(csv.DictReader(f)), [
+                {'line': '6', 'error': "not a number: 'four'", 'n': 'four', 'note': 'row 4'},
+            ])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_after_crash(self):
+        with self.assertRaisesMessage(RuntimeError, "killed"):
+            self.run_job(CollectRows(crash_on=9))
+        with open(self.checkpoint, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['line'], 7)  # the first two batches finished
+
+        job = CollectRows()
+        report = self.run_job(job, '--resume')
+        self.assertIn('Resuming after line 7', report)
+        self.assertEqual(job.seen, [6, 7, 8, 9])
+        self.assertFalse(os.path.exists(self.checkpoint))
+        with open(self.rejects, encoding='utf-8') as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 1)  # kept from the first run
+
+    def test_error_budget_stops_the_run(self):
+        with self.assertRaisesMessage(CommandError, "Stopped after line 7: 1 rows rejected"):
+            self.run_job(CollectRows(), '--max-errors=0')
+        self.assertTrue(os.path.exists(self.checkpoint))
 
-# Create your tests here.
+    def test_dry_run_leaves_no_checkpoint(self):
+        self.run_job(CollectRows(crash_on=None), '--dry-run', '--batch-size=2')
+        self.assertFalse(os.path.exists(self.checkpoint))
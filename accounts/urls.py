@@ -18,6 +18,7 @@ urlpatterns = [
     path('cart/', views.view_cart, name='view_cart'),
     path('checkout/', views.checkout, name='checkout'),
     path('place-order/', views.place_order, name='place_order'),
+    path('place-order/<int:pk>/status/', views.payment_intent_status, name='payment_intent_status'),
     path('success/', views.success_page, name='success_page'),
 
     path('profile/', views.profile_view, name='profile'),
@@ -1,9 +1,17 @@
+import binascii
+import json
 import random
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
 
 
 import requests
 from urllib.parse import urlencode
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Sequence
 
 
 # MSG91 API Configuration
@@ -19,3 +27,94 @@ def generate_verification_code():
     return str(random.randint(100000, 999999))
 
 
+
+
+# ---------------------- SEQUENCES ----------------------
+# reserve_sequence() locks the counter row, bumps it by N and returns the N
+# values, all inside the caller's transaction. If that transaction rolls back
+# the values go back too, so numbers stay gap-free; a concurrent caller waits
+# on the row lock instead of reading the same "last number".
+
+def financial_year(day=None):
+    """Indian financial year label (April–March) for ``day``, e.g. ``"2025-26"``."""
+    day = day or timezone.localdate()
+    start = day.year if day.month >= 4 else day.year - 1
+    return f"{start}-{(start + 1) % 100:02d}"
+
+
+def reserve_sequence(name, count=1, per_financial_year=False, initial=None, day=None):
+    """
+    Reserve ``count`` consecutive values of the named sequence and return them
+    as a ``range``.
+
+    ``initial`` is an optional callable returning the last value already in
+    use; it is only called when the counter row is first created, so a new
+    sequence continues from existing data. With ``per_financial_year`` the
+    counter starts again at 1 every April.
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    period = financial_year(day) if per_financial_year else ''
+
+    with transaction.atomic():
+        try:
+            seq = Sequence.objects.select_for_update().get(name=name, period=period)
+        except Sequence.DoesNotExist:
+            try:
+                with transaction.atomic():
+                    seq = Sequence.objects.create(
+                        name=name, period=period, last_value=initial() if initial else 0,
+                    )
+            except IntegrityError:
+                # Another writer created it first; wait for its lock
+                pass
+            seq = Sequence.objects.select_for_update().get(name=name, period=period)
+
+        first = seq.last_value + 1
+        seq.last_value += count
+        seq.save(update_fields=['last_value', 'updated_at'])
+    return range(first, first + count)
+
+
+def next_sequence_value(name, **kwargs):
+    return reserve_sequence(name, 1, **kwargs)[0]
+
+
+def max_numeric_suffix(values, prefix=''):
+    """Largest integer found after ``prefix`` in ``values`` (0 if none); seeds a new sequence."""
+    last = 0
+    for value in values:
+        if value and value.startswith(prefix):
+            digits = value[len(prefix):]
+            if digits.isdigit():
+                last = max(last, int(digits))
+    return last
+
+
+# ---------------------- KEYSET CURSORS ----------------------
+# Keyset pagers hand out the sort key of a page's last row as an opaque
+# cursor: the values as compact JSON, URL-safe base64 without padding.
+# Datetimes travel as ISO strings.
+
+def encode_cursor(*values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, *types):
+    """
+    The values of an ``encode_cursor`` cursor as a tuple, each converted by
+    the matching entry of ``types`` (``datetime`` parses ISO strings; a null
+    stays ``None``). Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("Wrong number of cursor values")
+        return tuple(
+            None if value is None else datetime.fromisoformat(value) if kind is datetime else kind(value)
+            for kind, value in zip(types, values)
+        )
+    except (TypeError, ValueError, UnicodeError, binascii.Error) as e:
+        raise ValueError("Invalid cursor") from e
@@ -16,7 +16,14 @@ from django.conf import settings
 from asset.models import Asset, Category, Banner, Cart, CartItem
 from partner.models import Partner, WalletTransaction, PartnerAssetLimit, PartnerCategory, PartnerCategoryAssetLimit
 from order.models import Order, OrderItem
+from order.payments import (
+    create_gateway_order, deferred_orders_enabled, mark_order_failed, mark_order_paid, verify_payment_signature,
+)
+from order.utils import CartChanged, place_order_from_cart
 from django.contrib import messages
+from asset.utils import (
+    get_catalog_snapshot, add_cart_item, set_cart_item_quantity, remove_cart_item, CartLimitExceeded,
+)
 from .utils import generate_verification_code 
 
 import requests
@@ -134,22 +141,14 @@ def resend_otp_view(request):
 @login_required
 def home_view(request):
     user_type = request.user.user_type
-    categories = Category.objects.all()
-    products = Asset.objects.all()
-    banners = Banner.objects.filter(is_active=True).order_by('order')
-    cart = Cart.objects.filter(user=request.user).first()
-    cart_count=0
-    product_ids_in_cart = []
-    product_quantities = {}
-
-    if cart:
-        cart_items = CartItem.objects.filter(cart=cart)
-        cart_count = cart_items.count()
-        product_ids_in_cart = cart_items.values_list('asset__id', flat=True)
-        product_quantities = {item.asset.id: item.quantity for item in cart_items}
-        # cart_count =cart_items = CartItem.objects.filter(cart=cart).count()
-
-    context = {'categories': categories, 'products': products, 'banners': banners,"cart_count": cart_count,'product_quantities': product_quantities ,'product_ids_in_cart': list(product_ids_in_cart),}
+    # Catalog snapshot: one cache read per request, rebuilt when the catalog changes
+    catalog = get_catalog_snapshot()
+    categories = catalog['categories']
+    products = catalog['products']
+    banners = catalog['banners']
+
+    # cart_count / product_quantities / product_ids_in_cart come from asset.context_processors.cart
+    context = {'categories': categories, 'products': products, 'banners': banners}
 
     if user_type == 'superadmin':
         return redirect('/admin/')
@@ -206,71 +205,21 @@ def add_to_cart(request):
             asset_id = data.get('asset_id')
             quantity = int(data.get('quantity', 1))
 
-            asset = Asset.objects.get(id=asset_id)
-            cart, _ = Cart.objects.get_or_create(user=request.user)
             partner = Partner.objects.get(user=request.user)
 
-            print("Request Arrived - Add to Cart")
-
-            # 1️⃣ Lifetime ordered quantity (excluding cancelled/failed)
-            lifetime_ordered_qty = (
-                OrderItem.objects.filter(order__user=request.user, asset=asset)
-                .exclude(order__status__in=['Cancelled', 'Failed'])
-                .aggregate(total=Sum('quantity'))['total'] or 0
-            )
-
-            # 2️⃣ Existing cart quantity (for this asset)
-            existing_cart_item = CartItem.objects.filter(cart=cart, asset=asset).first()
-            existing_qty = existing_cart_item.quantity if existing_cart_item else 0
-
-            total_after_add = lifetime_ordered_qty + existing_qty + quantity
-            print(f"Total after add: {total_after_add}")
-
-            # 3️⃣ Determine applicable max limit
-            max_limit = asset.max_order_per_partner or 0
-
-            # Partner category–specific limit check
-            if partner.partner_category:
-                partner_category = partner.partner_category
-                category_limit = PartnerCategoryAssetLimit.objects.filter(
-                    partner_category=partner_category, asset=asset
-                ).first()
-                print("Partner category asset limit:", category_limit)
-
-                if category_limit:
-                    # Use stricter (lower) limit between asset and category
-                    max_limit = category_limit.default_limit
-
-            # 4️⃣ Enforce maximum limit
-            if max_limit and total_after_add > max_limit:
-                remaining = max_limit - (lifetime_ordered_qty + existing_qty)
-                if remaining <= 0:
-                    return JsonResponse({
-                        'success': False,
-                        'error': f"You've reached the maximum order limit ({max_limit}) for {asset.name}."
-                    })
-                return JsonResponse({
-                    'success': False,
-                    'error': f"You can only add {remaining} more of {asset.name} (max {max_limit} per partner)."
-                })
-
-            # 5️⃣ Add or update cart item
-            if existing_cart_item:
-                existing_cart_item.quantity += quantity
-                existing_cart_item.save()
-                created = False
-            else:
-                CartItem.objects.create(cart=cart, asset=asset, quantity=quantity)
-                created = True
-
-            final_cart_count = cart.total_items()
+            # Limit check and upsert run under a lock on the user's cart
+            cart, cart_item, created = add_cart_item(request.user, partner, asset_id, quantity)
 
             return JsonResponse({
                 'success': True,
-                'message': f"{asset.name} {'added' if created else 'updated'} in cart",
-                'cart_count': final_cart_count,
+                'message': f"{cart_item.asset.name} {'added' if created else 'updated'} in cart",
+                'cart_count': cart.total_items(),
             })
 
+        except CartLimitExceeded as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'Invalid quantity.'})
         except Asset.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Asset not found.'})
         except Partner.DoesNotExist:
@@ -289,67 +238,23 @@ def update_cart(request):
             asset_id = data.get('asset_id')
             new_quantity = int(data.get('quantity', 1))
 
-            asset = Asset.objects.get(id=asset_id)
-            cart = Cart.objects.get(user=request.user)
-            cart_item = CartItem.objects.get(cart=cart, asset=asset)
             partner = Partner.objects.get(user=request.user)
 
-            # 1️⃣ Lifetime ordered quantity (excluding cancelled/failed)
-            lifetime_ordered_qty = (
-                OrderItem.objects.filter(order__user=request.user, asset=asset)
-                .exclude(order__status__in=['Cancelled', 'Failed'])
-                .aggregate(total=Sum('quantity'))['total'] or 0
-            )
-
-            # 2️⃣ Other cart quantity (excluding current item)
-            other_cart_qty = (
-                CartItem.objects.filter(cart=cart, asset=asset)
-                .exclude(id=cart_item.id)
-                .aggregate(total=Sum('quantity'))['total'] or 0
-            )
-
-            total_after_update = lifetime_ordered_qty + other_cart_qty + new_quantity
-            max_limit = asset.max_order_per_partner or 0  # default limit from Asset
-
-            # 3️⃣ Check if partner has a specific category limit
-            if partner.partner_category:
-                partner_category = partner.partner_category
-                category_limit = PartnerCategoryAssetLimit.objects.filter(
-                    partner_category=partner_category, asset=asset
-                ).first()
-
-                if category_limit:
-                    max_limit = category_limit.default_limit
-
-            # 4️⃣ Enforce maximum limit
-            if max_limit and total_after_update > max_limit:
-                remaining = max_limit - (lifetime_ordered_qty + other_cart_qty)
-                if remaining <= 0:
-                    return JsonResponse({
-                        'success': False,
-                        'error': f"You've reached the maximum order limit ({max_limit}) for {asset.name}."
-                    })
-                return JsonResponse({
-                    'success': False,
-                    'error': f"You can only keep {remaining} of {asset.name} (max {max_limit} per partner)."
-                })
-
-            # 5️⃣ Update the quantity safely
-            cart_item.quantity = new_quantity
-            cart_item.save()
-
-            total_price = cart.total_price()
+            # Limit check and update run under a lock on the user's cart
+            cart, cart_item = set_cart_item_quantity(request.user, partner, asset_id, new_quantity)
 
             return JsonResponse({
                 'success': True,
-                'message': f"Quantity updated to {new_quantity} for {asset.name}",
+                'message': f"Quantity updated to {new_quantity} for {cart_item.asset.name}",
                 'cart_count': cart.total_items(),
-                'new_total_price': float(total_price),
+                'new_total_price': float(cart.total_price()),
             })
 
-        except Asset.DoesNotExist:
-            return JsonResponse({'success': False, 'error': 'Asset not found.'})
-        except CartItem.DoesNotExist:
+        except CartLimitExceeded as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'Invalid quantity.'})
+        except (Cart.DoesNotExist, CartItem.DoesNotExist):
             return JsonResponse({'success': False, 'error': 'Item not in cart.'})
         except Partner.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Partner not found.'})
@@ -366,14 +271,12 @@ def delete_from_cart(request):
         asset_id = data.get('asset_id')
 
         try:
-            cart = Cart.objects.get(user=request.user)
-            CartItem.objects.filter(cart=cart, asset_id=asset_id).delete()
-            total_price = cart.total_price()
+            cart = remove_cart_item(request.user, asset_id)
             return JsonResponse({
                 'success': True,
                 'message': 'Item removed from cart',
                 'cart_count': cart.total_items(),
-                'new_total_price': float(total_price),
+                'new_total_price': float(cart.total_price()),
             })
         except Cart.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Cart not found'})
@@ -393,15 +296,11 @@ def view_cart(request):
     # ✅ Preload asset info to reduce queries
     cart_items = cart.cartitem_set.select_related('asset').all()
 
-
-    cart_count = CartItem.objects.filter(cart=cart).count()
-
     # ✅ Render the cart page
     return render(request, 'asset/cart.html', {
         'cart': cart,
         'cart_items': cart_items,
         'total_price': cart.total_price(),
-        "cart_count":cart_count,
     })
 
 
@@ -425,45 +324,39 @@ def checkout(request):
 @login_required
 def place_order(request):
     if request.method == 'POST':
-        cart = Cart.objects.get(user=request.user)
-        cart_items = cart.cartitem_set.all()
-        if not cart_items.exists():
-            return redirect('view_cart')
-
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-        amount = int(cart.total_price() * 100)
-
-        razorpay_order = client.order.create({
-            'amount': amount,
-            'currency': 'INR',
-            'payment_capture': '1'
-        })
-
-        order = Order.objects.create(
-            user=request.user,
-            order_id=razorpay_order['id'],
-            amount=cart.total_price(),
-            status='Pending'
-        )
-
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                asset=item.asset,
-                quantity=item.quantity,
-                price=item.asset.purchase_price
-            )
+        deferred = deferred_orders_enabled()
 
-        cart.cartitem_set.all().delete()
+        # Order, items and cart clearing commit together (or not at all).
+        # In deferred mode the Razorpay order is created by the intent worker.
+        try:
+            order = place_order_from_cart(request.user, None if deferred else create_gateway_order)
+        except CartChanged:
+            messages.error(request, "Your cart changed while the order was being placed. Please check it and try again.")
+            return redirect('view_cart')
+        if order is None:
+            return redirect('view_cart')
 
         return render(request, 'asset/payment.html', {
             'order': order,
             'razorpay_key': settings.RAZORPAY_KEY_ID,
-            'amount': amount,
-            'display_amount': cart.total_price(),
+            'amount': int(order.amount * 100),
+            'display_amount': order.amount,
+            'intent_pending': deferred,
         })
 
 
+# ---------------------- PAYMENT INTENT STATUS ----------------------
+@login_required
+def payment_intent_status(request, pk):
+    """Polled by the payment page until the deferred Razorpay order exists."""
+    order = get_object_or_404(Order.objects.select_related('payment_intent'), pk=pk, user=request.user)
+    intent = getattr(order, 'payment_intent', None)
+    return JsonResponse({
+        'status': intent.status if intent else 'Created',
+        'order_id': order.order_id if not intent or intent.status == 'Created' else None,
+    })
+
+
 # ---------------------- PAYMENT SUCCESS ----------------------
 @csrf_exempt
 def success_page(request):
@@ -473,55 +366,18 @@ def success_page(request):
         signature = request.POST.get('razorpay_signature')
 
         try:
-            client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-            client.utility.verify_payment_signature({
-                'razorpay_order_id': order_id,
-                'razorpay_payment_id': payment_id,
-                'razorpay_signature': signature
-            })
+            verify_payment_signature(order_id, payment_id, signature)
 
-            order = Order.objects.get(order_id=order_id)
-            order.razorpay_payment_id = payment_id
-            order.razorpay_signature = signature
-            order.status = 'Paid'
-            order.save()
-
-            # ✅ Wallet credit only if order has refundable assets
-            try:
-                partner = Partner.objects.get(user=order.user)
-
-                refundable_total = 0
-                # Loop through all items in this order
-                for item in order.orderitem_set.select_related('asset').all():
-                    if item.asset and item.asset.is_refundable_wallet_deposit:
-                        refundable_total += item.asset.purchase_price * item.quantity
-
-                # Only credit if there's refundable amount
-                if refundable_total > 0:
-                    old_balance = partner.refundable_wallet or 0
-                    partner.refundable_wallet = old_balance + refundable_total
-                    partner.save()
-
-                    # Log wallet credit
-                    WalletTransaction.objects.create(
-                        partner=partner,
-                        order=order,
-                        transaction_type="Credit",
-                        amount=refundable_total,
-                        description=f"Refundable wallet credit for Order {order.order_id}",
-                        transaction_date=timezone.now() 
-                    )
-
-            except Partner.DoesNotExist:
-                pass
+            # ✅ Idempotent: a repeated callback (or an earlier webhook) won't credit the wallet twice
+            order = Order.objects.only('pk').get(order_id=order_id)
+            order, _ = mark_order_paid(order.pk, payment_id, signature)
 
             return render(request, 'asset/success.html', {"order": order})
 
         except razorpay.errors.SignatureVerificationError as e:
             order = Order.objects.filter(order_id=order_id).first()
             if order:
-                order.status = 'Failed'
-                order.save()
+                mark_order_failed(order.pk)
             return HttpResponse(f"Signature verification failed: {str(e)}", status=400)
 
         except Exception as e:
@@ -532,12 +388,7 @@ def success_page(request):
 
 @login_required
 def profile_view(request):
-
-    cart = Cart.objects.filter(user=request.user).first()
-    cart_count = 0
-    if cart:
-        cart_count = cart_items = CartItem.objects.filter(cart=cart).count()
-    return render(request, 'accounts/profile.html', {'user': request.user,"cart_count":cart_count})
+    return render(request, 'accounts/profile.html', {'user': request.user})
 
 
 
@@ -0,0 +1,108 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+
+# ---------------------- ZEPTOMAIL ----------------------
+# Mail goes out through the ZeptoMail HTTP API. Every backend instance shares
+# one pooled requests.Session per process, so consecutive sends (and
+# concurrent ones from a bulk mailer's threads) reuse keep-alive connections
+# instead of paying a TLS handshake per message. Every call has a timeout.
+
+DEFAULT_TIMEOUT = (3.05, 15)  # (connect, read) seconds
+DEFAULT_POOL_SIZE = 10
+
+_session = None
+_session_config = None
+_session_lock = threading.Lock()
+
+
+class ZeptoMailError(Exception):
+    """The API refused or failed a message; ``retryable`` for throttling, 5xx and network errors."""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+def _session_settings():
+    return (
+        tuple(getattr(settings, "ZEPTOMAIL_TIMEOUT", DEFAULT_TIMEOUT)),
+        getattr(settings, "ZEPTOMAIL_POOL_SIZE", DEFAULT_POOL_SIZE),
+    )
+
+
+def get_zeptomail_session():
+    """The process-wide session for the API (rebuilt if the ZEPTOMAIL_* pool settings change)."""
+    global _session, _session_config
+    config = _session_settings()
+    if _session is None or _session_config != config:
+        with _session_lock:
+            if _session is None or _session_config != config:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config[1])
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session, _session_config = session, config
+    return _session
+
+
+def _addresses(addresses):
+    return [{"email_address": {"address": address}} for address in addresses]
+
+
+def message_payload(message):
+    payload = {
+        "from": {"address": settings.ZEPTOMAIL_FROM_EMAIL},
+        "to": _addresses(message.to),
+        "subject": message.subject,
+        # Plain-text bodies would lose their line breaks if sent as HTML
+        "htmlbody" if message.content_subtype == "html" else "textbody": message.body,
+    }
+    if message.cc:
+        payload["cc"] = _addresses(message.cc)
+    if message.bcc:
+        payload["bcc"] = _addresses(message.bcc)
+    return payload
+
+
+class ZeptoMailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        """Send each message; returns the number accepted. Failures raise ZeptoMailError unless fail_silently."""
+        headers = {
+            "accept": "application/json",
+            "content-type": "application/json",
+            "authorization": f"Zoho-enczapikey {settings.ZEPTOMAIL_API_KEY}",
+        }
+        session = get_zeptomail_session()
+        timeout = _session_settings()[0]
+
+        sent_count = 0
+        for message in email_messages:
+            try:
+                response = session.post(
+                    settings.ZEPTOMAIL_API_URL, json=message_payload(message), headers=headers, timeout=timeout,
+                )
+            except requests.RequestException as e:
+                if not self.fail_silently:
+                    raise ZeptoMailError(f"ZeptoMail unreachable: {e}") from e
+                continue
+
+            if 200 <= response.status_code < 300:
+                sent_count += 1
+            elif not self.fail_silently:
+                retry_after = response.headers.get("Retry-After")
+                raise ZeptoMailError(
+                    f"ZeptoMail answered {response.status_code}: {response.text[:200]}",
+                    status=response.status_code,
+                    retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+                )
+
+        return sent_count
@@ -0,0 +1,18 @@
+from .utils import get_cart_summary
+
+
+def cart(request):
+    """
+    Cart badge count and per-asset cart quantities for every template,
+    served from the per-user cart summary cache.
+    """
+    user = getattr(request, "user", None)
+    if not user or not user.is_authenticated:
+        return {"cart_count": 0}
+
+    summary = get_cart_summary(user)
+    return {
+        "cart_count": summary["count"],
+        "product_quantities": summary["quantities"],
+        "product_ids_in_cart": list(summary["quantities"]),
+    }
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from asset.utils import get_catalog_cache_stats, reset_catalog_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show (or reset) the partner home catalog cache hit/miss counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the counters after printing them")
+
+    def handle(self, *args, **options):
+        stats = get_catalog_cache_stats()
+        ratio = f"{stats['hit_ratio']:.2%}" if stats['hit_ratio'] is not None else "n/a"
+        self.stdout.write(f"Catalog version: {stats['version']}")
+        self.stdout.write(f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit ratio: {ratio}")
+
+        if options['reset']:
+            reset_catalog_cache_stats()
+            self.stdout.write(self.style.SUCCESS("✅ Counters reset"))
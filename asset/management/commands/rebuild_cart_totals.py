@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from asset.models import Cart
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized cart totals from cart lines with a single aggregate update"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str, help="Only rebuild the cart of this username")
+
+    def handle(self, *args, **options):
+        carts = Cart.objects.all()
+        if options['user']:
+            carts = carts.filter(user__username=options['user'])
+
+        updated = Cart.rebuild_totals(carts)
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt totals for {updated} cart(s)"))
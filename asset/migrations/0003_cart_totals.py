@@ -0,0 +1,44 @@
+# Generated by Django 4.2.19 on 2026-10-18 17:34
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('asset', 'Cart')
+    CartItem = apps.get_model('asset', 'CartItem')
+    amount_field = models.DecimalField(max_digits=12, decimal_places=2)
+
+    lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    quantity = lines.annotate(total=Sum('quantity')).values('total')
+    amount = lines.annotate(
+        total=Sum(F('quantity') * F('asset__purchase_price'), output_field=amount_field)
+    ).values('total')
+    Cart.objects.update(
+        total_quantity=Coalesce(Subquery(quantity), 0),
+        total_amount=Coalesce(Subquery(amount, output_field=amount_field), Value(Decimal('0.00'))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asset', '0002_alter_category_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
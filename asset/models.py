@@ -1,9 +1,11 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
 
-from django.db import models
-
 class Category(models.Model):
     name = models.CharField(max_length=100)  # name is not unique
     code = models.CharField(max_length=50, unique=True)  # unique code for category
@@ -61,12 +63,58 @@ class Banner(models.Model):
 class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+    # Denormalized totals, kept in step by CartItem save/delete (see asset/signals.py)
+    total_quantity = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+
     def total_items(self):
         # Count total quantity (not just distinct assets)
-        return sum(item.quantity for item in self.cartitem_set.all())
+        return self.total_quantity
 
     def total_price(self):
-        return sum(item.asset.purchase_price * item.quantity for item in self.cartitem_set.all())
+        return self.total_amount
+
+    def refresh_totals(self):
+        """Re-read only the denormalized totals after they were changed in the database."""
+        self.refresh_from_db(fields=['total_quantity', 'total_amount'])
+
+    @classmethod
+    def apply_item_delta(cls, cart_id, asset_id, quantity_delta):
+        """
+        Shift a cart's totals by ``quantity_delta`` units of ``asset_id`` in one
+        UPDATE, so concurrent changes to the same cart never lose an increment.
+        """
+        if not quantity_delta:
+            return
+        price = Subquery(
+            Asset.objects.filter(pk=asset_id).values('purchase_price')[:1],
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+        cls.objects.filter(pk=cart_id).update(
+            total_quantity=F('total_quantity') + quantity_delta,
+            total_amount=F('total_amount') + Value(quantity_delta) * price,
+        )
+
+    @classmethod
+    def rebuild_totals(cls, carts=None):
+        """
+        Recompute totals from the cart lines with one aggregate UPDATE.
+        Fallback for drift, asset price changes and data loaded around the ORM.
+        """
+        carts = cls.objects.all() if carts is None else carts
+        lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        quantity = lines.annotate(total=Sum('quantity')).values('total')
+        amount = lines.annotate(
+            total=Sum(F('quantity') * F('asset__purchase_price'),
+                      output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        ).values('total')
+        return carts.update(
+            total_quantity=Coalesce(Subquery(quantity), 0),
+            total_amount=Coalesce(
+                Subquery(amount, output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                Value(Decimal('0.00')),
+            ),
+        )
 
     def __str__(self):
         return f"Cart of {self.user.username}"
@@ -78,5 +126,25 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     class Meta:
         unique_together = ('cart', 'asset')  # ✅ Enforce unique pair
+
+    # The quantity as stored, so saves apply just the difference to the cart
+    # totals (see asset/signals.py). 0 until the line is first written.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_quantity = 0
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'quantity' in field_names:
+            instance._saved_quantity = instance.quantity
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'quantity' in update_fields:
+            self._saved_quantity = self.quantity
+
     def __str__(self):
-        return f"{self.quantity} x {self.asset.name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.asset.name}"
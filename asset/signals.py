@@ -0,0 +1,65 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Asset, Banner, Cart, CartItem, Category
+from .utils import bump_catalog_version, invalidate_cart_summary
+
+
+@receiver([post_save, post_delete], sender=Asset)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Banner)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Any catalog change moves the catalog version, so the next home page
+    rebuilds the snapshot. The bump waits for the commit: bumping earlier would
+    let a concurrent request cache the old rows under the new version.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+def _part_of_cart_reset(kwargs):
+    """True for the post_delete of a line removed by clear_cart, which resets totals and cache once itself."""
+    return getattr(kwargs.get('origin'), 'resets_cart_totals', False)
+
+
+@receiver([post_save, post_delete], sender=CartItem)
+def invalidate_cart_cache(sender, instance, **kwargs):
+    if _part_of_cart_reset(kwargs):
+        return
+    transaction.on_commit(partial(invalidate_cart_summary, instance.cart.user_id))
+
+
+@receiver(post_delete, sender=Cart)
+def invalidate_deleted_cart_cache(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_cart_summary, instance.user_id))
+
+
+@receiver(post_save, sender=CartItem)
+def update_cart_totals_on_save(sender, instance, created, update_fields, **kwargs):
+    # CartItem.save() moves _saved_quantity on after this runs
+    if update_fields is not None and 'quantity' not in update_fields:
+        return
+    previous = 0 if created else instance._saved_quantity
+    Cart.apply_item_delta(instance.cart_id, instance.asset_id, instance.quantity - previous)
+
+
+@receiver(post_delete, sender=CartItem)
+def update_cart_totals_on_delete(sender, instance, **kwargs):
+    if _part_of_cart_reset(kwargs):
+        return
+    if 'quantity' in instance.get_deferred_fields():
+        # Loaded without its quantity, and the row is gone, so there is nothing
+        # to read it back from; total the cart's remaining lines instead
+        Cart.rebuild_totals(Cart.objects.filter(pk=instance.cart_id))
+        return
+    Cart.apply_item_delta(instance.cart_id, instance.asset_id, -instance._saved_quantity)
+
+
+@receiver(post_save, sender=Asset)
+def reprice_carts(sender, instance, created, **kwargs):
+    """Carts holding an asset are re-totalled from their lines when the asset is edited (e.g. a price change)."""
+    if not created:
+        Cart.rebuild_totals(Cart.objects.filter(cartitem__asset=instance))
@@ -1,3 +1,273 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from partner.models import Partner
+from .models import Asset, Banner, Cart, CartItem, Category
+from . import utils
+from .utils import (
+    CART_SUMMARY_INVALIDATED, CART_SUMMARY_KEY, CartLimitExceeded, add_cart_item, flush_catalog_stats, get_cart_summary, get_catalog_cache_stats,
+    get_catalog_snapshot, get_catalog_version, invalidate_cart_summary, reset_catalog_cache_stats,
+    set_cart_item_quantity,
+)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(
+            CATALOG_VERSION_FILE=os.path.join(tmp.name, 'catalog.version'),
+            CATALOG_CACHE_ALIAS='default',
+            CATALOG_STATS_CACHE_ALIAS='default',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        caches['default'].clear()
+        reset_catalog_cache_stats()
+
+        self.category = Category.objects.create(name='Devices', code='DEV')
+        Asset.objects.create(name='ONT', asset_code='ONT-0001', category=self.category)
+        Banner.objects.create(title='Sale', is_active=True)
+        Banner.objects.create(title='Old', is_active=False)
+
+    def test_snapshot_served_from_cache(self):
+        with self.assertNumQueries(3):
+            snapshot = get_catalog_snapshot()
+        self.assertEqual([b.title for b in snapshot['banners']], ['Sale'])
+
+        with self.assertNumQueries(0):
+            snapshot = get_catalog_snapshot()
+            # category is preloaded, so templates can use product.category.id freely
+            self.assertEqual(snapshot['products'][0].category.code, 'DEV')
+
+        stats = get_catalog_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_catalog_changes_bump_version(self):
+        get_catalog_snapshot()
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Asset.objects.create(name='Router', asset_code='RTR-0001')
+            # Not before the commit, or a concurrent rebuild could cache the old rows
+            self.assertEqual(get_catalog_version(), version)
+        self.assertEqual(get_catalog_version(), version + 1)
+        self.assertEqual(len(get_catalog_snapshot()['products']), 2)
+
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Banner.objects.get(title='Sale').delete()
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertEqual(get_catalog_snapshot()['banners'], [])
+
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Network Devices'
+            self.category.save()
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertEqual(get_catalog_snapshot()['categories'][0].name, 'Network Devices')
+
+    def test_version_is_a_counter(self):
+        self.assertEqual(get_catalog_version(), 0)
+        # Back-to-back bumps (same clock tick) still give distinct versions
+        self.assertEqual([utils.bump_catalog_version() for _ in range(3)], [1, 2, 3])
+        self.assertEqual(get_catalog_version(), 3)
+
+    def test_stats_flush_to_shared_counters(self):
+        for _ in range(utils.CATALOG_STATS_FLUSH_EVERY + 5):
+            get_catalog_snapshot()
+        flush_catalog_stats()
+        self.assertEqual(utils._catalog_stats, {'hits': 0, 'misses': 0})
+
+        stats = get_catalog_cache_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], utils.CATALOG_STATS_FLUSH_EVERY + 4)
+
+
+@override_settings(CART_CACHE_ALIAS='default')
+class CartSummaryCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        self.ont = Asset.objects.create(name='ONT', asset_code='ONT-0001')
+        self.stb = Asset.objects.create(name='Set Top Box', asset_code='STB-0001')
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, asset=self.ont, quantity=3)
+
+    def test_summary_is_cached(self):
+        with self.assertNumQueries(1):
+            summary = get_cart_summary(self.user)
+        self.assertEqual(summary, {'count': 1, 'quantities': {self.ont.id: 3}})
+        with self.assertNumQueries(0):
+            get_cart_summary(self.user)
+
+    def test_cart_mutations_invalidate_summary(self):
+        get_cart_summary(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item = CartItem.objects.create(cart=self.cart, asset=self.stb, quantity=1)
+        self.assertEqual(get_cart_summary(self.user)['count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.quantity = 4
+            item.save()
+        self.assertEqual(get_cart_summary(self.user)['quantities'][self.stb.id], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cart.cartitem_set.all().delete()
+        self.assertEqual(get_cart_summary(self.user), {'count': 0, 'quantities': {}})
+
+    def test_invalidation_waits_for_commit(self):
+        get_cart_summary(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            CartItem.objects.create(cart=self.cart, asset=self.stb, quantity=1)
+        self.assertEqual(len(callbacks), 1)
+        self.assertIsInstance(caches['default'].get(CART_SUMMARY_KEY.format(self.user.pk)), dict)
+
+    def test_rebuild_does_not_replace_invalidation_marker(self):
+        # A request that read the cart before another one committed must not cache what it read
+        invalidate_cart_summary(self.user.pk)
+        self.assertEqual(get_cart_summary(self.user)['count'], 1)
+        key = CART_SUMMARY_KEY.format(self.user.pk)
+        self.assertEqual(caches['default'].get(key), CART_SUMMARY_INVALIDATED)
+
+        caches['default'].delete(key)  # the marker expires
+        get_cart_summary(self.user)
+        with self.assertNumQueries(0):
+            get_cart_summary(self.user)
+
+    def test_context_processor_feeds_badge(self):
+        self.client.login(username='partner1', password='pass1234')
+        resp = self.client.get(reverse('profile'))
+        self.assertEqual(resp.context['cart_count'], 1)
+        self.assertEqual(resp.context['product_ids_in_cart'], [self.ont.id])
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        self.ont = Asset.objects.create(name='ONT', asset_code='ONT-0001', purchase_price=Decimal('1500.00'))
+        self.stb = Asset.objects.create(name='Set Top Box', asset_code='STB-0001', purchase_price=Decimal('999.50'))
+        self.cart = Cart.objects.create(user=self.user)
+
+    def assertTotals(self, quantity, amount):
+        self.cart.refresh_totals()
+        self.assertEqual(self.cart.total_items(), quantity)
+        self.assertEqual(self.cart.total_price(), Decimal(amount))
+
+    def test_totals_follow_cart_lines(self):
+        item = CartItem.objects.create(cart=self.cart, asset=self.ont, quantity=2)
+        CartItem.objects.create(cart=self.cart, asset=self.stb, quantity=1)
+        self.assertTotals(3, '3999.50')
+
+        item.quantity = 5
+        item.save()
+        self.assertTotals(6, '8499.50')
+
+        CartItem.objects.filter(cart=self.cart, asset=self.stb).delete()
+        self.assertTotals(5, '7500.00')
+
+        self.cart.cartitem_set.all().delete()
+        self.assertTotals(0, '0.00')
+
+    def test_repeated_saves_apply_only_the_difference(self):
+        item = CartItem(cart=self.cart, asset=self.ont, quantity=2)
+        self.assertEqual(item._saved_quantity, 0)
+        item.save()
+        item.quantity = 3
+        item.save()
+        item.save()  # nothing changed
+        self.assertTotals(3, '4500.00')
+
+        item.quantity = 10
+        item.save(update_fields=[])  # quantity not written, so the totals don't move
+        self.assertTotals(3, '4500.00')
+        CartItem.objects.get(pk=item.pk).delete()
+        self.assertTotals(0, '0.00')
+
+    def test_deleting_a_line_loaded_without_quantity(self):
+        CartItem.objects.create(cart=self.cart, asset=self.ont, quantity=2)
+        CartItem.objects.create(cart=self.cart, asset=self.stb, quantity=1)
+        CartItem.objects.only('id', 'cart', 'asset').get(asset=self.stb).delete()
+        self.assertTotals(2, '3000.00')
+
+    def test_clear_cart_resets_totals(self):
+        CartItem.objects.create(cart=self.cart, asset=self.ont, quantity=2)
+        CartItem.objects.create(cart=self.cart, asset=self.stb, quantity=1)
+        Cart.objects.filter(pk=self.cart.pk).update(total_quantity=99)  # drifted totals don't survive either
+        utils.clear_cart(self.cart)
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+        self.assertEqual((self.cart.total_quantity, self.cart.total_amount), (0, Decimal('0.00')))
+        self.assertTotals(0, '0.00')
+
+    def test_asset_price_change_reprices_carts(self):
+        CartItem.objects.create(cart=self.cart, asset=self.ont, quantity=2)
+        self.ont.purchase_price = Decimal('1200.00')
+        self.ont.save()
+        self.assertTotals(2, '2400.00')
+
+    def test_rebuild_totals_fixes_drift(self):
+        CartItem.objects.create(cart=self.cart, asset=self.ont, quantity=2)
+        Cart.objects.filter(pk=self.cart.pk).update(total_quantity=99, total_amount=0)
+        with self.assertNumQueries(1):
+            Cart.rebuild_totals()
+        self.assertTotals(2, '3000.00')
+
+    def test_ajax_endpoints_return_totals(self):
+        self.client.login(username='partner1', password='pass1234')
+        CartItem.objects.create(cart=self.cart, asset=self.ont, quantity=1)
+        Partner.objects.create(user=self.user)
+
+        resp = self.client.post(reverse('update_cart'), json.dumps({'asset_id': self.ont.id, 'quantity': 3}),
+                                content_type='application/json')
+        self.assertEqual(resp.json()['cart_count'], 3)
+        self.assertEqual(resp.json()['new_total_price'], 4500.0)
+
+        resp = self.client.post(reverse('delete_from_cart'), json.dumps({'asset_id': self.ont.id}),
+                                content_type='application/json')
+        self.assertEqual(resp.json()['cart_count'], 0)
+        self.assertEqual(resp.json()['new_total_price'], 0.0)
+
+
+class CartMutationTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        self.partner = Partner.objects.create(user=self.user)
+        self.ont = Asset.objects.create(name='ONT', asset_code='ONT-0001', purchase_price=Decimal('100.00'),
+                                        max_order_per_partner=5)
+
+    def test_add_merges_into_existing_line(self):
+        add_cart_item(self.user, self.partner, self.ont.id, 2)
+        cart, item, created = add_cart_item(self.user, self.partner, self.ont.id, 1)
+        self.assertFalse(created)
+        self.assertEqual(CartItem.objects.get(cart=cart).quantity, 3)
+        self.assertEqual((cart.total_items(), cart.total_price()), (3, Decimal('300.00')))
+
+    def test_limit_is_checked_before_writing(self):
+        add_cart_item(self.user, self.partner, self.ont.id, 4)
+        with self.assertRaisesMessage(CartLimitExceeded, 'You can only add 1 more of ONT'):
+            add_cart_item(self.user, self.partner, self.ont.id, 2)
+        with self.assertRaisesMessage(CartLimitExceeded, 'You can only keep 5 of ONT'):
+            set_cart_item_quantity(self.user, self.partner, self.ont.id, 6)
+        self.assertEqual(CartItem.objects.get().quantity, 4)
+
+        with self.assertRaises(ValueError):
+            add_cart_item(self.user, self.partner, self.ont.id, 0)
+
+    def test_round_trips_are_fixed(self):
+        add_cart_item(self.user, self.partner, self.ont.id, 1)
+        # lock cart, limits, line lookup, line update, totals delta, totals re-read (+ savepoint pair)
+        with self.assertNumQueries(8):
+            add_cart_item(self.user, self.partner, self.ont.id, 1)
+        with self.assertNumQueries(8):
+            set_cart_item_quantity(self.user, self.partner, self.ont.id, 3)
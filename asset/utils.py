@@ -0,0 +1,299 @@
+# asset/utils.py
+import fcntl
+import os
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from accounts.utils import reserve_sequence
+from partner.utils import get_asset_limit
+from .models import Asset, Banner, Cart, CartItem, Category
+
+# ---------------------- CATALOG CACHE ----------------------
+# The partner home catalog (categories, assets, active banners) is cached as a
+# single snapshot keyed by a catalog version. The version is a counter kept in
+# a small file, so every gunicorn worker on the host sees a bump made by any
+# other worker, whether the cache backend is local-memory or file-based. Bumps
+# take an exclusive flock and publish the new value with an atomic rename, so
+# concurrent bumps never lose an increment and readers never see a torn
+# write. A request therefore costs one small file read plus one cache read.
+
+CATALOG_KEY_PREFIX = "catalog:snapshot"
+CATALOG_STATS_KEY = "catalog:stats:{}"
+CATALOG_STATS_FLUSH_EVERY = 50
+
+# Hits/misses seen by this process that haven't been added to the shared totals yet
+_catalog_stats = {"hits": 0, "misses": 0}
+
+
+def _catalog_cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def _catalog_stats_cache():
+    # Counters must live in a backend every process can see (file-based by default)
+    alias = getattr(settings, "CATALOG_STATS_CACHE_ALIAS", getattr(settings, "CATALOG_CACHE_ALIAS", "default"))
+    return caches[alias]
+
+
+def _catalog_version_file():
+    return str(getattr(settings, "CATALOG_VERSION_FILE", settings.BASE_DIR / "catalog.version"))
+
+
+def get_catalog_version():
+    """Current catalog version; 0 until the catalog has been changed once."""
+    try:
+        with open(_catalog_version_file()) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog snapshot by moving the version up by one.
+    The signals call this through transaction.on_commit, so a snapshot rebuilt
+    under the new version can never be built from pre-commit rows.
+    """
+    path = _catalog_version_file()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file closes
+        version = get_catalog_version() + 1
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(version))
+        os.replace(tmp, path)
+    return version
+
+
+def build_catalog_snapshot():
+    return {
+        "categories": list(Category.objects.all()),
+        "products": list(Asset.objects.select_related("category").all()),
+        "banners": list(Banner.objects.filter(is_active=True).order_by("order")),
+    }
+
+
+def get_catalog_snapshot():
+    """
+    Return ``{"categories", "products", "banners"}`` for the current catalog
+    version, building and caching it on a miss.
+    """
+    cache = _catalog_cache()
+    key = f"{CATALOG_KEY_PREFIX}:{get_catalog_version()}"
+
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        _record_catalog_stat("hits")
+        return snapshot
+
+    _record_catalog_stat("misses")
+    snapshot = build_catalog_snapshot()
+    cache.set(key, snapshot, getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 60 * 24))
+    return snapshot
+
+
+def _record_catalog_stat(kind):
+    _catalog_stats[kind] += 1
+    if _catalog_stats["hits"] + _catalog_stats["misses"] >= CATALOG_STATS_FLUSH_EVERY:
+        flush_catalog_stats()
+
+
+def flush_catalog_stats():
+    """Add this process's pending hit/miss counts to the shared totals in the cache."""
+    cache = _catalog_stats_cache()
+    for kind in ("hits", "misses"):
+        count = _catalog_stats[kind]
+        if not count:
+            continue
+        key = CATALOG_STATS_KEY.format(kind)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(key, count, None)
+        _catalog_stats[kind] = 0
+
+
+def get_catalog_cache_stats():
+    """Hit/miss totals across workers, including this process's unflushed counts."""
+    cache = _catalog_stats_cache()
+    hits = (cache.get(CATALOG_STATS_KEY.format("hits")) or 0) + _catalog_stats["hits"]
+    misses = (cache.get(CATALOG_STATS_KEY.format("misses")) or 0) + _catalog_stats["misses"]
+    total = hits + misses
+    return {
+        "version": get_catalog_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
+
+
+def reset_catalog_cache_stats():
+    cache = _catalog_stats_cache()
+    cache.delete_many([CATALOG_STATS_KEY.format("hits"), CATALOG_STATS_KEY.format("misses")])
+    _catalog_stats.update(hits=0, misses=0)
+
+
+# ---------------------- ASSET CODES ----------------------
+
+def _last_asset_code_number():
+    # Codes look like "ONT-0007"; the number part is shared across all assets
+    last = 0
+    for code in Asset.objects.values_list("asset_code", flat=True).iterator():
+        digits = code.rsplit("-", 1)[-1]
+        if digits.isdigit():
+            last = max(last, int(digits))
+    return last
+
+
+def next_asset_code(asset_name):
+    """Next asset code for a new asset, e.g. ``"ONT-0042"`` for "ONT Router"."""
+    number = reserve_sequence("asset_code", initial=_last_asset_code_number)[0]
+    return f"{asset_name[:3].upper()}-{number:04d}"
+
+
+# ---------------------- CART SUMMARY CACHE ----------------------
+# The cart badge and the home page quantity inputs only need the user's cart
+# lines, so they are cached per user and invalidated whenever the cart changes.
+# The entry lives in a cache every worker shares, otherwise a mutation handled
+# by one worker would leave a stale badge in the others.
+#
+# Invalidation runs after the commit and leaves a short-lived marker instead
+# of deleting the entry; rebuilds only ever ``add()``. A request that read the
+# cart just before another request committed therefore can't put its stale
+# summary back: the marker is still there, so its add() is a no-op. (The file
+# cache has no atomic incr, so a per-cart version counter would race.)
+
+CART_SUMMARY_KEY = "cart:summary:{}"
+CART_SUMMARY_INVALIDATED = "invalidated"
+
+
+def _cart_cache():
+    return caches[getattr(settings, "CART_CACHE_ALIAS", "default")]
+
+
+def get_cart_summary(user):
+    """
+    Return ``{"count": <cart lines>, "quantities": {asset_id: quantity}}`` for
+    the user's cart, from cache when possible.
+    """
+    cache = _cart_cache()
+    key = CART_SUMMARY_KEY.format(user.pk)
+    summary = cache.get(key)
+    if not isinstance(summary, dict):
+        quantities = dict(
+            CartItem.objects.filter(cart__user=user).values_list("asset_id", "quantity")
+        )
+        summary = {"count": len(quantities), "quantities": quantities}
+        cache.add(key, summary, getattr(settings, "CART_CACHE_TIMEOUT", 60 * 60))
+    return summary
+
+
+def invalidate_cart_summary(user_id):
+    """Drop the user's cached summary; call it once the change is committed (see the signals)."""
+    _cart_cache().set(
+        CART_SUMMARY_KEY.format(user_id),
+        CART_SUMMARY_INVALIDATED,
+        getattr(settings, "CART_CACHE_INVALIDATION_TIMEOUT", 10),
+    )
+
+
+# ---------------------- CART MUTATIONS ----------------------
+# Each mutation locks the user's Cart row first, so overlapping requests from
+# the same partner (double taps, retries on slow networks) run one after the
+# other: the limit check always sees the previous request's line and the
+# upsert can't collide on (cart, asset).
+
+class CartLimitExceeded(Exception):
+    """The requested quantity would take the partner past the asset's order limit."""
+
+
+def add_cart_item(user, partner, asset_id, quantity):
+    """
+    Add ``quantity`` of an asset to the user's cart after checking the partner's
+    limit. Returns ``(cart, item, created)``; raises ``CartLimitExceeded`` or
+    ``Asset.DoesNotExist``.
+    """
+    if quantity < 1:
+        raise ValueError("Quantity must be at least 1.")
+
+    with transaction.atomic():
+        cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
+
+        limit = get_asset_limit(partner, asset_id)
+        asset, max_limit = limit["asset"], limit["max_limit"]
+        if max_limit and limit["ordered_qty"] + limit["cart_qty"] + quantity > max_limit:
+            remaining = limit["remaining"]
+            if remaining <= 0:
+                raise CartLimitExceeded(f"You've reached the maximum order limit ({max_limit}) for {asset.name}.")
+            raise CartLimitExceeded(f"You can only add {remaining} more of {asset.name} (max {max_limit} per partner).")
+
+        item, created = CartItem.objects.get_or_create(cart=cart, asset=asset, defaults={"quantity": quantity})
+        if not created:
+            item.cart = cart  # the save signals need cart.user_id; don't lazy-load it again
+            item.quantity += quantity
+            item.save(update_fields=["quantity"])
+
+        cart.refresh_totals()
+    return cart, item, created
+
+
+def set_cart_item_quantity(user, partner, asset_id, quantity):
+    """
+    Replace the quantity of an asset already in the user's cart, checking the
+    partner's limit. Returns ``(cart, item)``; raises ``CartLimitExceeded``,
+    ``Cart.DoesNotExist`` or ``CartItem.DoesNotExist``.
+    """
+    if quantity < 1:
+        raise ValueError("Quantity must be at least 1.")
+
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().get(user=user)
+        item = CartItem.objects.select_related("asset").get(cart=cart, asset_id=asset_id)
+        item.cart = cart
+
+        limit = get_asset_limit(partner, item.asset_id)
+        asset, max_limit = item.asset, limit["max_limit"]
+        # The current line is replaced, so only past orders count
+        if max_limit and limit["ordered_qty"] + quantity > max_limit:
+            remaining = max_limit - limit["ordered_qty"]
+            if remaining <= 0:
+                raise CartLimitExceeded(f"You've reached the maximum order limit ({max_limit}) for {asset.name}.")
+            raise CartLimitExceeded(f"You can only keep {remaining} of {asset.name} (max {max_limit} per partner).")
+
+        item.quantity = quantity
+        item.save(update_fields=["quantity"])
+
+        cart.refresh_totals()
+    return cart, item
+
+
+def remove_cart_item(user, asset_id):
+    """Drop an asset from the user's cart. Returns the cart; raises ``Cart.DoesNotExist``."""
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().get(user=user)
+        CartItem.objects.filter(cart=cart, asset_id=asset_id).delete()
+        cart.refresh_totals()
+    return cart
+
+
+def clear_cart(cart):
+    """
+    Empty a cart and zero its totals in one transaction (nested in the
+    caller's, e.g. order placement). The lines go through a regular delete so
+    cascades and other receivers still run; the totals are reset outright in
+    one UPDATE, and the cart's own per-line receivers skip a delete marked
+    ``resets_cart_totals``, so the query count doesn't grow with the lines.
+    """
+    with transaction.atomic():
+        lines = CartItem.objects.filter(cart=cart)
+        lines.resets_cart_totals = True
+        lines.delete()
+        Cart.objects.filter(pk=cart.pk).update(total_quantity=0, total_amount=0)
+    cart.total_quantity, cart.total_amount = 0, Decimal("0.00")
+    transaction.on_commit(lambda: invalidate_cart_summary(cart.user_id))
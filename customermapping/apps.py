@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class CustomermappingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'customermapping'
-    verbose_name = "Customer Device Mapping" 
+    verbose_name = "Customer Device Mapping"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+def backfill_mapped_at(apps, schema_editor):
+    """Stamp every mapped serial with its latest mapping's date, in one UPDATE."""
+    OrderItemSerial = apps.get_model('order', 'OrderItemSerial')
+    CustomerAssetMapping = apps.get_model('customermapping', 'CustomerAssetMapping')
+    latest = CustomerAssetMapping.objects.filter(order_serial=models.OuterRef('pk')).order_by('-assigned_at', '-id')
+    OrderItemSerial.objects.filter(
+        models.Exists(CustomerAssetMapping.objects.filter(order_serial=models.OuterRef('pk')))
+    ).update(mapped_at=models.Subquery(latest.values('assigned_at')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customermapping', '0002_alter_customerassetmapping_options'),
+        ('order', '0013_serial_owner_mapped_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_mapped_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import CustomerAssetMapping
+from .utils import refresh_serial_mapped_at
+
+
+@receiver(pre_save, sender=CustomerAssetMapping)
+def remember_previous_serial(sender, instance, **kwargs):
+    """An edited mapping may move to another serial; the old one needs its date refreshed too."""
+    instance._previous_serial_id = None
+    if instance.pk:
+        instance._previous_serial_id = (
+            CustomerAssetMapping.objects.filter(pk=instance.pk).values_list('order_serial_id', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=CustomerAssetMapping)
+def update_serial_mapped_at(sender, instance, **kwargs):
+    refresh_serial_mapped_at({instance.order_serial_id, getattr(instance, '_previous_serial_id', None)} - {None})
@@ -1,3 +1,203 @@
-from django.test import TestCase
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.utils import timezone
 
-# Create your tests here.
+from asset.models import Asset
+from order.models import Order, OrderItem, OrderItemSerial
+from partner.models import Partner
+from .models import CustomerAssetMapping
+
+
+@override_settings(CART_CACHE_ALIAS='default')
+class CustomerAssetMappingPageTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        Partner.objects.create(user=self.user)
+        other = User.objects.create_user(username='other', password='pass1234')
+
+        self.ont = Asset.objects.create(name='ONT', asset_code='ONT-0001', max_order_per_partner=10)
+        self.stb = Asset.objects.create(name='Set Top Box', asset_code='STB-0001')
+        self.serials = []
+        for n in range(3):
+            order = Order.objects.create(user=self.user, order_id=f'ORD{n}', status='Paid')
+            ont_item = OrderItem.objects.create(order=order, asset=self.ont, quantity=2)
+            stb_item = OrderItem.objects.create(order=order, asset=self.stb, quantity=1)
+            for item, count in ((ont_item, 2), (stb_item, 1)):
+                for i in range(count):
+                    self.serials.append(OrderItemSerial.objects.create(
+                        order_item=item, serial_number=f'SN-{item.id}-{i}'))
+
+        # Someone else's serial must not leak into the counts
+        other_order = Order.objects.create(user=other, order_id='OTHER1')
+        other_item = OrderItem.objects.create(order=other_order, asset=self.ont)
+        OrderItemSerial.objects.create(order_item=other_item, serial_number='SN-OTHER')
+
+        for serial in self.serials[:3]:
+            CustomerAssetMapping.objects.create(order_serial=serial, customer_name='Cust', assigned_by=self.user)
+
+        self.client.login(username='partner1', password='pass1234')
+
+    def test_summary_counts(self):
+        resp = self.client.get(reverse('customer_asset_mapping'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['total_assets'], 9)
+        self.assertEqual(resp.context['total_mapped'], 3)
+        self.assertEqual(resp.context['total_unmapped'], 6)
+
+        assets = {a['id']: a for a in resp.context['available_assets']}
+        self.assertEqual(assets[self.ont.id]['total_assets_bought'], 6)
+        self.assertEqual(assets[self.ont.id]['mapped_asset'], 2)
+        self.assertEqual(assets[self.ont.id]['remaining_qty'], 4)
+        self.assertEqual(assets[self.stb.id]['total_assets_bought'], 3)
+        self.assertEqual(assets[self.stb.id]['mapped_asset'], 1)
+
+        serials = resp.context['serials']
+        self.assertEqual(len(serials), 9)
+        self.assertIsNone(serials[0].mapping)  # unmapped serials come first
+        self.assertEqual(sum(1 for s in serials if s.mapping), 3)
+
+    def test_query_budget_does_not_grow_with_serials(self):
+        url = reverse('customer_asset_mapping')
+        self.client.get(url)  # warm the cart badge cache
+        with self.assertNumQueries(8):
+            self.client.get(url)
+
+        order = Order.objects.create(user=self.user, order_id='ORD-BIG', status='Paid')
+        item = OrderItem.objects.create(order=order, asset=self.stb, quantity=50)
+        for i in range(50):
+            serial = OrderItemSerial.objects.create(order_item=item, serial_number=f'BULK-{i}')
+            if i % 2:
+                CustomerAssetMapping.objects.create(order_serial=serial, assigned_by=self.user)
+        Asset.objects.create(name='Router', asset_code='RTR-0001')
+
+        with self.assertNumQueries(8):
+            self.client.get(url)
+
+
+class CustomerSerialsApiTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        other = User.objects.create_user(username='other', password='pass1234')
+        self.ont = Asset.objects.create(name='ONT', asset_code='ONT-0001')
+        self.stb = Asset.objects.create(name='Set Top Box', asset_code='STB-0001')
+
+        order = Order.objects.create(user=self.user, order_id='ORD1', status='Paid')
+        ont_item = OrderItem.objects.create(order=order, asset=self.ont, quantity=12)
+        stb_item = OrderItem.objects.create(order=order, asset=self.stb, quantity=5)
+        self.serials = [
+            OrderItemSerial.objects.create(order_item=ont_item, serial_number=f'ONT-{i:02d}',
+                                           mac_id=f'AA:BB:CC:00:00:{i:02X}')
+            for i in range(12)
+        ] + [
+            OrderItemSerial.objects.create(order_item=stb_item, serial_number=f'STB-{i:02d}')
+            for i in range(5)
+        ]
+        for n, serial in enumerate(self.serials[::3]):
+            CustomerAssetMapping.objects.create(order_serial=serial, customer_name=f'Cust {n}',
+                                                phone=f'98765{n:05d}', assigned_by=self.user)
+
+        other_order = Order.objects.create(user=other, order_id='OTHER1')
+        other_item = OrderItem.objects.create(order=other_order, asset=self.ont)
+        OrderItemSerial.objects.create(order_item=other_item, serial_number='ONT-OTHER')
+
+        self.url = reverse('customer_serials_api')
+        self.client.login(username='partner1', password='pass1234')
+
+    def fetch_all(self, **params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, limit=4)
+            if cursor:
+                query['cursor'] = cursor
+            data = self.client.get(self.url, query).json()
+            self.assertLessEqual(len(data['results']), 4)
+            ids.extend(row['id'] for row in data['results'])
+            cursor = data['next']
+            if not cursor:
+                return ids
+
+    def test_keyset_pages_cover_every_serial_once(self):
+        ids = self.fetch_all()
+        self.assertEqual(sorted(ids), sorted(s.id for s in self.serials))
+        self.assertEqual(len(ids), len(set(ids)))
+
+        mapped_ids = {s.id for s in self.serials[::3]}
+        # unmapped first, then mapped (newest first)
+        self.assertFalse(set(ids[:11]) & mapped_ids)
+        self.assertEqual(ids[11:], [s.id for s in reversed(self.serials[::3])])
+
+        asc_ids = self.fetch_all(order='asc')
+        self.assertEqual(asc_ids[:6], [s.id for s in self.serials[::3]])
+        self.assertEqual(sorted(asc_ids), sorted(ids))
+
+    def test_filters_and_search(self):
+        self.assertEqual(len(self.fetch_all(asset=self.stb.id)), 5)
+        self.assertEqual(len(self.fetch_all(status='mapped')), 6)
+        self.assertEqual(len(self.fetch_all(status='unmapped')), 11)
+        self.assertEqual(self.fetch_all(q='ONT-05'), [self.serials[5].id])
+        self.assertEqual(self.fetch_all(q='00:0A'), [self.serials[10].id])
+        self.assertEqual(self.fetch_all(q='9876500002'), [self.serials[6].id])
+        self.assertEqual(self.fetch_all(q='ONT-OTHER'), [])
+
+    def test_compact_row(self):
+        data = self.client.get(self.url, {'status': 'mapped', 'limit': 1}).json()
+        row = data['results'][0]
+        self.assertEqual(row['customer'], 'Cust 5')
+        self.assertEqual(row['mapped_by'], 'partner1')
+        self.assertEqual(row['asset'], 'Set Top Box')
+
+    def test_remapped_serial_shows_latest_customer(self):
+        serial = self.serials[3]  # mapped to 'Cust 1' in setUp
+        CustomerAssetMapping.objects.create(order_serial=serial, customer_name='New Owner', phone='9000000001')
+        CustomerAssetMapping.objects.filter(order_serial=serial).update(assigned_at=timezone.now())  # same instant
+        row = next(r for r in self.client.get(self.url, {'limit': 100}).json()['results'] if r['id'] == serial.id)
+        self.assertEqual((row['customer'], row['phone']), ('New Owner', '9000000001'))
+
+    def test_serials_carry_owner_and_latest_mapped_at(self):
+        serial = self.serials[1]  # unmapped in setUp
+        self.assertEqual((serial.owner_id, serial.mapped_at), (self.user.id, None))
+
+        first = CustomerAssetMapping.objects.create(order_serial=serial, customer_name='First')
+        serial.refresh_from_db()
+        self.assertEqual(serial.mapped_at, first.assigned_at)
+        second = CustomerAssetMapping.objects.create(order_serial=serial, customer_name='Second')
+        serial.refresh_from_db()
+        self.assertEqual(serial.mapped_at, second.assigned_at)
+
+        second.order_serial = self.serials[2]
+        second.save()
+        serial.refresh_from_db()
+        self.assertEqual(serial.mapped_at, first.assigned_at)
+        self.assertEqual(OrderItemSerial.objects.get(pk=self.serials[2].pk).mapped_at, second.assigned_at)
+
+        first.delete()
+        serial.refresh_from_db()
+        self.assertIsNone(serial.mapped_at)
+
+    def test_page_query_sorts_on_serial_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url, {'limit': 4})
+        page_sql = next(q['sql'] for q in ctx.captured_queries if 'ORDER BY' in q['sql'] and 'LIMIT 5' in q['sql'])
+        # No correlated subquery or join to orders: a range scan on serial_owner_mapped_idx
+        self.assertNotIn('customerassetmapping', page_sql)
+        where = page_sql.split(' WHERE ')[1]
+        self.assertTrue(where.startswith('"order_orderitemserial"."owner_id" = '), where)
+        self.assertIn('ORDER BY "order_orderitemserial"."mapped_at" DESC', where)
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_page_renders_only_first_page(self):
+        for i in range(30):
+            OrderItemSerial.objects.create(order_item=self.serials[0].order_item, serial_number=f'X-{i}')
+        resp = self.client.get(reverse('customer_asset_mapping'))
+        self.assertEqual(len(resp.context['serials']), 25)
+        self.assertIsNotNone(resp.context['next_cursor'])
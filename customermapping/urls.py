@@ -5,4 +5,5 @@ urlpatterns = [
     path("", views.customer_asset_mapping, name="customer_asset_mapping"),
     path("get-customer/", views.get_customer_ajax, name="get_customer_ajax"),
     path("assign/", views.assign_customer, name="assign_customer"),
+    path("serials/", views.customer_serials_api, name="customer_serials_api"),
 ]
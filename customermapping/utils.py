@@ -1,8 +1,15 @@
 # customermapping/utils.py
+from datetime import datetime
+
 import requests
 from django.conf import settings
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, Subquery
 from base64 import b64encode
 
+from accounts.utils import decode_cursor, encode_cursor
+from order.models import OrderItemSerial
+from .models import CustomerAssetMapping
+
 def fetch_user_by_phone(phone_number):
     api_base = getattr(settings, "API_BASE_URL", None)
     username = getattr(settings, "API_AUTH_USERNAME", None)
@@ -62,3 +69,134 @@ def get_customer_by_phone(phone):
             })
 
     return users
+
+
+def get_serial_summary(user):
+    """
+    Return ``{asset_id: {"total": n, "mapped": m}}`` for every serial the user
+    has received, using a single grouped query.
+    """
+    rows = (
+        OrderItemSerial.objects
+        .filter(order_item__order__user=user)
+        .values("order_item__asset")
+        .annotate(
+            total=Count("id", distinct=True),
+            mapped=Count("id", filter=Q(customerassetmapping__isnull=False), distinct=True),
+        )
+        .order_by()
+    )
+    return {
+        row["order_item__asset"]: {"total": row["total"], "mapped": row["mapped"]}
+        for row in rows
+    }
+
+
+SERIAL_PAGE_SIZE = 25
+MAX_SERIAL_PAGE_SIZE = 100
+
+
+def refresh_serial_mapped_at(serial_ids):
+    """Copy the latest mapping's date onto each serial in ``serial_ids`` (None if unmapped), in one UPDATE."""
+    if not serial_ids:
+        return
+    latest = CustomerAssetMapping.objects.filter(order_serial=OuterRef("pk")).order_by("-assigned_at", "-id")
+    OrderItemSerial.objects.filter(pk__in=serial_ids).update(mapped_at=Subquery(latest.values("assigned_at")[:1]))
+
+
+def partner_serials_queryset(user):
+    """
+    Base queryset for the user's serials, with order, asset and mappings
+    loaded up front. It filters on the serial's own ``owner`` and
+    ``mapped_at`` copies, so paging by mapped date is a range scan on
+    serial_owner_mapped_idx rather than a sort of every serial.
+    """
+    return (
+        OrderItemSerial.objects
+        .filter(owner=user)
+        .select_related("order_item__order", "order_item__asset")
+        .prefetch_related(Prefetch(
+            "customerassetmapping_set",
+            queryset=CustomerAssetMapping.objects.select_related("assigned_by").order_by("id"),
+            to_attr="mappings",
+        ))
+    )
+
+
+def attach_mappings(serials):
+    """
+    Give each serial a ``mapping`` attribute (the latest mapping, the one
+    ``mapped_at`` comes from, or None) so templates don't query per row.
+    """
+    for serial in serials:
+        serial.mapping = max(serial.mappings, key=lambda m: (m.assigned_at, m.id), default=None)
+    return serials
+
+
+def encode_serial_cursor(serial):
+    return encode_cursor(serial.mapped_at, serial.id)
+
+
+def decode_serial_cursor(cursor):
+    """Return ``(mapped_at, id)`` from a cursor (``mapped_at`` may be None); raises ValueError if malformed."""
+    return decode_cursor(cursor, datetime, int)
+
+
+def get_serial_page(user, cursor=None, limit=SERIAL_PAGE_SIZE, asset_id=None,
+                    status=None, search=None, ascending=False):
+    """
+    Fetch one page of the user's serials using keyset pagination on
+    ``(mapped_at, id)``.
+
+    Newest mappings come first with unmapped serials at the top; ``ascending``
+    flips that. Returns ``(serials, next_cursor)``, where ``next_cursor`` is
+    None on the last page.
+    """
+    qs = partner_serials_queryset(user)
+
+    if asset_id:
+        qs = qs.filter(order_item__asset_id=asset_id)
+    if status == "mapped":
+        qs = qs.filter(mapped_at__isnull=False)
+    elif status == "unmapped":
+        qs = qs.filter(mapped_at__isnull=True)
+    if search:
+        qs = qs.filter(
+            Q(serial_number__icontains=search)
+            | Q(mac_id__icontains=search)
+            | Exists(CustomerAssetMapping.objects.filter(
+                order_serial=OuterRef("pk"), phone__icontains=search))
+        )
+
+    if cursor:
+        mapped, last_id = decode_serial_cursor(cursor)
+        if ascending:
+            if mapped is None:
+                qs = qs.filter(mapped_at__isnull=True, id__gt=last_id)
+            else:
+                qs = qs.filter(
+                    Q(mapped_at__gt=mapped)
+                    | Q(mapped_at=mapped, id__gt=last_id)
+                    | Q(mapped_at__isnull=True)
+                )
+        else:
+            if mapped is None:
+                qs = qs.filter(
+                    Q(mapped_at__isnull=True, id__lt=last_id)
+                    | Q(mapped_at__isnull=False)
+                )
+            else:
+                qs = qs.filter(
+                    Q(mapped_at__lt=mapped)
+                    | Q(mapped_at=mapped, id__lt=last_id)
+                )
+
+    if ascending:
+        qs = qs.order_by(F("mapped_at").asc(nulls_last=True), "id")
+    else:
+        qs = qs.order_by(F("mapped_at").desc(nulls_first=True), "-id")
+
+    limit = max(1, min(limit, MAX_SERIAL_PAGE_SIZE))
+    serials = list(qs[:limit + 1])
+    next_cursor = encode_serial_cursor(serials[limit - 1]) if len(serials) > limit else None
+    return attach_mappings(serials[:limit]), next_cursor
@@ -4,9 +4,9 @@ from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 
 from partner.models import Partner, PartnerAssetLimit, PartnerCategoryAssetLimit
-from .utils import get_customer_by_phone
+from partner.utils import get_asset_limits
+from .utils import get_customer_by_phone, get_serial_summary, get_serial_page, SERIAL_PAGE_SIZE
 from order.models import OrderItemSerial,Order,OrderItem
-from asset.models import Cart, CartItem
 from django.db.models import Sum, F, Q
 from asset.models import Asset
 from .models import CustomerAssetMapping
@@ -36,73 +36,6 @@ def get_customer_ajax(request):
 from django.utils.timezone import localtime
 @login_required
 def customer_asset_mapping(request):
-    # Get only this user's orders
-    user_orders = Order.objects.filter(user=request.user)
-
-    # Related records (filtered through the user's orders)
-    order_items = OrderItem.objects.filter(order__in=user_orders)
-
-    cart = Cart.objects.filter(user=request.user).first()
-    cart_count = 0
-    if cart:
-        cart_count = cart_items = CartItem.objects.filter(cart=cart).count()
-
-    serials = (
-        OrderItemSerial.objects
-        .filter(order_item__order__in=user_orders)
-        .annotate(
-            mapped_date=Max('customerassetmapping__assigned_at')
-        )
-        .order_by('-mapped_date')
-    )
-
-    total_orders = user_orders.count()
-    total_assets = serials.count()
-    total_mapped = CustomerAssetMapping.objects.filter(
-        order_serial__order_item__order__user=request.user
-    ).count()
-    partner = Partner.objects.filter(user=request.user).first()
-
-    total_unmapped = max(total_assets - total_mapped, 0)
-
-    available_assets = []
-    for asset in Asset.objects.all():
-        serial_count = serials.filter(order_item__asset=asset).count()
-        max_allowed = asset.max_order_per_partner or 0
-
-        if partner and partner.partner_category:
-            partner_category = partner.partner_category
-            category_limit = PartnerCategoryAssetLimit.objects.filter(
-                partner_category=partner_category, asset=asset
-            ).first()
-            print("Partner category asset limit:", category_limit)
-
-            if category_limit:
-                # Use stricter (lower) limit between asset and category
-                max_allowed = category_limit.default_limit
-       # skip assets without serials
-        total_mapped_based_asset = CustomerAssetMapping.objects.filter(
-            order_serial__order_item__asset=asset,
-            assigned_by=request.user
-        ).count()
-        ordered_qty = serials.filter(order_item__asset=asset).count()-total_mapped_based_asset
-
-        remaining_qty = max(max_allowed - ordered_qty-total_mapped_based_asset, 0)
-            # If partner-specific limit is defined and lower, use it
-        remaining_qty = max(max_allowed - ordered_qty - total_mapped_based_asset, 0)
-
-        available_assets.append({
-            "id": asset.id,
-            "name": asset.name,
-            "asset_code": asset.asset_code,
-            "image": asset.image.url if asset.image else None,
-            "max_allowed": max_allowed,
-            "ordered_qty": ordered_qty,
-            "remaining_qty": remaining_qty,
-            "mapped_asset":total_mapped_based_asset,
-            "total_assets_bought": serial_count,
-        })
-
     if request.method == "POST" and "assign" in request.POST:
         serial_id = request.POST.get("serial_id")
         phone = request.POST.get("phone")
@@ -113,7 +46,7 @@ def customer_asset_mapping(request):
         if not serial_id:
             return JsonResponse({"error": "Serial ID missing"}, status=400)
 
-        serial = OrderItemSerial.objects.get(id=serial_id)
+        serial = OrderItemSerial.objects.select_related("order_item__order", "order_item__asset").get(id=serial_id)
         order = getattr(serial.order_item, "order", None)
 
         mapping = CustomerAssetMapping.objects.create(
@@ -129,7 +62,7 @@ def customer_asset_mapping(request):
         order_id = getattr(order, "order_id", "N/A") if order else "N/A"
         payment_status = getattr(order, "status", "N/A") if order else "N/A"
         asset_name = getattr(serial.order_item.asset, "name", "N/A")
-        mapped_date = mapping.created_at.strftime("%d-%m-%Y %H:%M")
+        mapped_date = localtime(mapping.assigned_at).strftime("%d-%m-%Y %H:%M")
 
         return JsonResponse({
             "success": True,
@@ -144,21 +77,104 @@ def customer_asset_mapping(request):
             }
         })
 
+    partner = Partner.objects.filter(user=request.user).first()
+    total_orders = Order.objects.filter(user=request.user).count()
+
+    # Per-asset serial/mapped counts in one grouped query
+    summary = get_serial_summary(request.user)
+    total_assets = sum(row["total"] for row in summary.values())
+    total_mapped = sum(row["mapped"] for row in summary.values())
+    total_unmapped = max(total_assets - total_mapped, 0)
+
+    # Effective limits for every asset in a single query
+    asset_limits = get_asset_limits(partner) if partner else {}
+
+    available_assets = []
+    assets = [limit["asset"] for limit in asset_limits.values()] if partner else Asset.objects.all()
+    for asset in assets:
+        limit = asset_limits.get(asset.id)
+        max_allowed = limit["max_limit"] if limit else (asset.max_order_per_partner or 0)
+
+        row = summary.get(asset.id, {"total": 0, "mapped": 0})
+        serial_count = row["total"]
+        total_mapped_based_asset = row["mapped"]
+        ordered_qty = serial_count - total_mapped_based_asset
+        remaining_qty = max(max_allowed - ordered_qty - total_mapped_based_asset, 0)
+
+        available_assets.append({
+            "id": asset.id,
+            "name": asset.name,
+            "asset_code": asset.asset_code,
+            "image": asset.image.url if asset.image else None,
+            "max_allowed": max_allowed,
+            "ordered_qty": ordered_qty,
+            "remaining_qty": remaining_qty,
+            "mapped_asset":total_mapped_based_asset,
+            "total_assets_bought": serial_count,
+        })
+
+    # Only the first page is rendered; the rest comes from customer_serials_api
+    serials, next_cursor = get_serial_page(request.user)
+
     return render(request, "customermapping/customer_asset_mapping.html", {
         "serials": serials,
+        "next_cursor": next_cursor,
         "total_orders": total_orders,
         "total_assets": total_assets,
         "total_assets_in_hand": total_assets-total_mapped,
         "total_mapped": total_mapped,
         "total_unmapped": total_unmapped,
         "available_assets":available_assets,
-        "cart_count":cart_count
     })
 
 
 
 
 
+@login_required
+def customer_serials_api(request):
+    """
+    Keyset-paginated JSON feed of the partner's serials for the mapping table.
+
+    Query params: ``cursor``, ``limit``, ``asset``, ``status`` (mapped/unmapped),
+    ``q`` (serial, MAC or customer phone) and ``order`` (asc/desc by mapped date).
+    """
+    try:
+        limit = int(request.GET.get("limit", SERIAL_PAGE_SIZE))
+        asset_id = int(request.GET["asset"]) if request.GET.get("asset") else None
+        serials, next_cursor = get_serial_page(
+            request.user,
+            cursor=request.GET.get("cursor") or None,
+            limit=limit,
+            asset_id=asset_id,
+            status=request.GET.get("status") or None,
+            search=request.GET.get("q", "").strip() or None,
+            ascending=request.GET.get("order") == "asc",
+        )
+    except ValueError:
+        return JsonResponse({"error": "Invalid parameters."}, status=400)
+
+    results = []
+    for s in serials:
+        mapping = s.mapping
+        results.append({
+            "id": s.id,
+            "order_id": s.order_item.order.order_id,
+            "asset": s.order_item.asset.name,
+            "serial": s.serial_number,
+            "mac": s.mac_id,
+            "make": s.make,
+            "model": s.model,
+            "customer": mapping.customer_name if mapping else None,
+            "phone": mapping.phone if mapping else None,
+            "skyid": mapping.skyid if mapping else None,
+            "mapped_at": localtime(mapping.assigned_at).strftime("%d-%b-%Y %I:%M %p") if mapping else None,
+            "mapped_by": mapping.assigned_by.username if mapping and mapping.assigned_by else None,
+        })
+
+    return JsonResponse({"results": results, "next": next_cursor})
+
+
 @csrf_exempt
 @require_POST
 def assign_customer(request):
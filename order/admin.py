@@ -8,7 +8,7 @@ from io import BytesIO
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 
-from .models import Order, OrderItem, OrderItemSerial, OrderShipment
+from .models import Order, OrderItem, OrderItemSerial, OrderShipment, PaymentEvent, PaymentIntent
 from partner.models import Partner
 
 
@@ -271,3 +271,28 @@ class OrderShipmentAdmin(admin.ModelAdmin):
     list_display = ('order', 'courier_name', 'tracking_id', 'shipping_status', 'dispatched_at', 'delivered_at')
     search_fields = ('order__order_id', 'courier_name', 'tracking_id')
     list_filter = ('shipping_status',)
+
+
+@admin.register(PaymentIntent)
+class PaymentIntentAdmin(admin.ModelAdmin):
+    list_display = ('order', 'status', 'attempts', 'last_error', 'next_attempt_at', 'created_at', 'updated_at')
+    search_fields = ('order__order_id', 'order__dc_number')
+    list_filter = ('status',)
+    list_select_related = ('order__user',)
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ('event', 'gateway_order_id', 'payment_id', 'outcome', 'received_at', 'processed_at')
+    search_fields = ('event_id', 'gateway_order_id', 'payment_id')
+    list_filter = ('event', 'outcome')
+
+    # Append-only audit log
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,74 @@
+# order/macs.py
+import re
+
+# ---------------------- MAC ADDRESSES ----------------------
+# MACs arrive as "AA:BB:CC:DD:EE:FF", "aa-bb-cc-dd-ee-ff", "aabb.ccdd.eeff" or
+# bare hex. OrderItemSerial keeps whatever was typed in mac_id for display and
+# stores the 48-bit value in mac_int, so vendor blocks become integer ranges
+# on an ordinary index.
+
+MAC_BITS = 48
+MAX_MAC = (1 << MAC_BITS) - 1
+_SEPARATORS = re.compile(r"[\s:.\-]")
+_HEX = re.compile(r"[0-9a-fA-F]+")
+
+
+def _hex_digits(value):
+    digits = _SEPARATORS.sub("", str(value or ""))
+    return digits if _HEX.fullmatch(digits) else None
+
+
+def parse_mac(value):
+    """The MAC in ``value`` as an int, or ``None`` if it isn't a full 48-bit MAC."""
+    digits = _hex_digits(value)
+    if digits is None or len(digits) != 12:
+        return None
+    return int(digits, 16)
+
+
+def format_mac(number):
+    """``0xAABBCCDDEEFF`` -> ``"AA:BB:CC:DD:EE:FF"``."""
+    digits = f"{number:012X}"
+    return ":".join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+def parse_mac_range(value):
+    """
+    Inclusive ``(low, high)`` for a vendor block written as
+      - a prefix such as an OUI, ``"AA:BB:CC"`` (whole octets),
+      - CIDR style, ``"AA:BB:CC:DD:00:00/36"``,
+      - or two MACs, ``"AA:BB:CC:00:00:00-AA:BB:CC:00:0F:FF"`` (also with `` to `` or ``..``).
+    Raises ValueError for anything else.
+    """
+    value = str(value or "").strip()
+
+    for separator in ("..", " to ", ","):
+        if separator in value:
+            start, end = (parse_mac(part) for part in value.split(separator, 1))
+            break
+    else:
+        start = end = None
+        if value.count("-") == 1 and parse_mac(value) is None:
+            start, end = (parse_mac(part) for part in value.split("-"))
+
+    if start is not None and end is not None:
+        if start > end:
+            raise ValueError("The start of a MAC range must not be after its end.")
+        return start, end
+
+    if "/" in value:
+        address, _, bits = value.partition("/")
+        base = parse_mac(address)
+        if base is None or not bits.strip().isdigit() or not 0 <= int(bits) <= MAC_BITS:
+            raise ValueError(f"Not a MAC block: {value}")
+        host_bits = MAC_BITS - int(bits)
+        low = base >> host_bits << host_bits
+        return low, low | ((1 << host_bits) - 1)
+
+    digits = _hex_digits(value)
+    if digits and len(digits) % 2 == 0 and 2 <= len(digits) <= 12:
+        host_bits = MAC_BITS - 4 * len(digits)
+        low = int(digits, 16) << host_bits
+        return low, low | ((1 << host_bits) - 1)
+
+    raise ValueError(f"Not a MAC block: {value}")
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from order.models import OrderItemSerial
+
+
+class Command(BaseCommand):
+    help = "Fill OrderItemSerial.mac_int from mac_id for existing serials, in primary-key batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Serials updated per batch")
+        parser.add_argument('--all', action='store_true',
+                            help="Recompute every serial with a MAC, not only those without mac_int")
+        parser.add_argument('--clear-model-copies', action='store_true',
+                            help="Blank `model` where old imports copied the MAC into it")
+
+    def handle(self, *args, **options):
+        serials = OrderItemSerial.objects.filter(mac_id__isnull=False).exclude(mac_id='')
+        if not options['all']:
+            serials = serials.filter(mac_int__isnull=True)
+        serials = serials.order_by('pk').only('pk', 'mac_id', 'mac_int')
+
+        updated = invalid = 0
+        last_pk = 0
+        while True:
+            batch = list(serials.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            changed = []
+            for serial in batch:
+                old = serial.mac_int
+                serial.sync_mac()
+                if serial.mac_int is None:
+                    invalid += 1
+                if serial.mac_int != old:
+                    changed.append(serial)
+            OrderItemSerial.objects.bulk_update(changed, ['mac_int'])
+            updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Set mac_int on {updated} serial(s)"))
+        if invalid:
+            self.stdout.write(self.style.WARNING(f"⚠ {invalid} serial(s) have a mac_id that isn't a valid MAC"))
+
+        if options['clear_model_copies']:
+            cleared = OrderItemSerial.objects.filter(model=F('mac_id')).update(model=None)
+            self.stdout.write(self.style.SUCCESS(f"✅ Cleared MAC copies from `model` on {cleared} serial(s)"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from order.models import PaymentEvent
+from order.payments import process_payment_events
+
+
+class Command(BaseCommand):
+    help = "Apply Razorpay webhook events that haven't been processed yet, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Events applied per transaction")
+
+    def handle(self, *args, **options):
+        # One pass over what is pending now, so an event that fails is tried
+        # once per run rather than over and over until it runs out of attempts
+        pending = list(
+            PaymentEvent.objects.filter(processed_at__isnull=True).order_by('id').values_list('id', flat=True)
+        )
+        total = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(pending), batch_size):
+            total += process_payment_events(limit=batch_size, event_ids=pending[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"✅ Processed {total} payment event(s)"))
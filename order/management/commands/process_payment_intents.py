@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from order.payments import process_payment_intents
+
+
+class Command(BaseCommand):
+    help = "Create Razorpay orders for checkouts placed in deferred mode (RAZORPAY_DEFERRED_ORDERS)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help="Intents claimed per batch")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new intents")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when idle (with --loop)")
+
+    def handle(self, *args, **options):
+        while True:
+            created, failed = process_payment_intents(limit=options['batch_size'])
+            if created or failed:
+                self.stdout.write(self.style.SUCCESS(f"✅ {created} gateway order(s) created, {failed} failed"))
+
+            if not options['loop']:
+                break
+            # Drain backlogs quickly, poll gently when idle
+            if created + failed < options['batch_size']:
+                time.sleep(options['interval'])
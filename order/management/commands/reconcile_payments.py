@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from order.models import Order
+from order.payments import (
+    INTENT_ORDER_PREFIX, fetch_captured_payment, mark_order_failed, mark_order_paid,
+)
+
+
+class Command(BaseCommand):
+    help = "Settle Pending orders against Razorpay: mark captured ones Paid and expire abandoned ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Pending orders fetched per page")
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent gateway lookups")
+        parser.add_argument('--min-age', type=int, default=15,
+                            help="Skip orders younger than this many minutes (checkout may still be open)")
+        parser.add_argument('--expire-after', type=int, default=24,
+                            help="Mark orders with no captured payment Failed after this many hours")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without saving")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = now - timedelta(minutes=options['min_age'])
+        expire_before = now - timedelta(hours=options['expire_after'])
+        dry_run = options['dry_run']
+
+        pending = (
+            Order.objects.filter(status='Pending', created_at__lt=cutoff)
+            .exclude(order_id__startswith=INTENT_ORDER_PREFIX)  # no gateway order yet
+            .order_by('id')
+            .only('id', 'order_id', 'created_at')
+        )
+        counts = {'paid': 0, 'failed': 0, 'pending': 0, 'errors': 0}
+        last_id = 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                page = list(pending.filter(id__gt=last_id)[:options['batch_size']])
+                if not page:
+                    break
+                last_id = page[-1].id
+
+                # Only the HTTP lookups run in threads; all DB writes stay on this thread
+                for order, payment_id in zip(page, pool.map(self.lookup, page)):
+                    if isinstance(payment_id, Exception):
+                        counts['errors'] += 1
+                        self.stdout.write(self.style.WARNING(f"⚠ {order.order_id}: {payment_id}"))
+                        continue
+
+                    if payment_id:
+                        counts['paid'] += 1
+                        if not dry_run:
+                            mark_order_paid(order.pk, payment_id)
+                        self.stdout.write(self.style.SUCCESS(f"✅ {order.order_id} paid ({payment_id})"))
+                    elif order.created_at < expire_before:
+                        counts['failed'] += 1
+                        if not dry_run:
+                            mark_order_failed(order.pk)
+                        self.stdout.write(f"✖ {order.order_id} expired without payment")
+                    else:
+                        counts['pending'] += 1
+
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Paid: {counts['paid']}, Failed: {counts['failed']}, "
+            f"Still pending: {counts['pending']}, Errors: {counts['errors']}"
+        ))
+
+    @staticmethod
+    def lookup(order):
+        try:
+            return fetch_captured_payment(order.order_id)
+        except Exception as e:
+            return e
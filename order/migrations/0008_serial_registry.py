@@ -0,0 +1,42 @@
+# Generated by Django 4.2.19 on 2026-10-18 17:55
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_serials(apps, schema_editor):
+    """
+    Refuse to continue while a serial number is recorded more than once:
+    which row is the real device is for the store to decide, not a migration.
+    """
+    OrderItemSerial = apps.get_model('order', 'OrderItemSerial')
+    duplicates = list(
+        OrderItemSerial.objects.values('serial_number')
+        .annotate(n=Count('id')).filter(n__gt=1)
+        .order_by('serial_number').values_list('serial_number', 'n')[:20]
+    )
+    if duplicates:
+        listing = ", ".join(f"{serial} (x{n})" for serial, n in duplicates)
+        raise RuntimeError(
+            f"Serial numbers must be unique before this migration can run. Resolve these first: {listing}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0007_store_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_serials, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitemserial',
+            name='serial_number',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='orderitemserial',
+            index=models.Index(fields=['mac_id'], name='serial_mac_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0008_serial_registry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitemserial',
+            name='mac_int',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0009_serial_mac_int'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentintent',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Created', 'Created'), ('Failed', 'Failed')], db_index=True, default='Pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.19 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0010_payment_intent_processing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentevent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='paymentevent',
+            name='last_error',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
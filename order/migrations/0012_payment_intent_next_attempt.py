@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0011_payment_event_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentintent',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
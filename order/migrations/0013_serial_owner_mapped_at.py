@@ -0,0 +1,40 @@
+# Generated by Django 4.2.19 on 2026-10-18 18:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_owners(apps, schema_editor):
+    """Copy each serial's order user onto it, in one UPDATE."""
+    OrderItemSerial = apps.get_model('order', 'OrderItemSerial')
+    OrderItem = apps.get_model('order', 'OrderItem')
+    OrderItemSerial.objects.filter(owner__isnull=True).update(owner_id=models.Subquery(
+        OrderItem.objects.filter(pk=models.OuterRef('order_item_id')).values('order__user_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('order', '0012_payment_intent_next_attempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitemserial',
+            name='mapped_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitemserial',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='orderitemserial',
+            index=models.Index(fields=['owner', 'mapped_at', 'id'], name='serial_owner_mapped_idx'),
+        ),
+        migrations.RunPython(backfill_owners, migrations.RunPython.noop),
+    ]
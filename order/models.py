@@ -1,6 +1,33 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings  # ✅ Import this
+from accounts.utils import financial_year, max_numeric_suffix, reserve_sequence
 from asset.models import Asset
+from .macs import parse_mac
+
+
+def reserve_dc_numbers(count):
+    """
+    ``count`` consecutive DC numbers: DC0001, DC0002, ... or DC/2025-26/0001
+    with DC_NUMBER_PER_FINANCIAL_YEAR. Bulk imports use this directly, since
+    bulk_create doesn't go through Order.save().
+    """
+    if getattr(settings, 'DC_NUMBER_PER_FINANCIAL_YEAR', False):
+        year = financial_year()
+        return [f"DC/{year}/{n:04d}" for n in reserve_sequence('dc_number', count, per_financial_year=True)]
+
+    numbers = reserve_sequence(
+        'dc_number',
+        count,
+        initial=lambda: max_numeric_suffix(
+            Order.objects.filter(dc_number__startswith='DC').values_list('dc_number', flat=True).iterator(),
+            prefix='DC',
+        ),
+    )
+    return [f"DC{n:04d}" for n in numbers]
+
+
+def next_dc_number():
+    return reserve_dc_numbers(1)[0]
 
 
 class Order(models.Model):
@@ -36,16 +63,15 @@ class Order(models.Model):
     def save(self, *args, **kwargs):
         # Auto-generate DC number if not already set
         if not self.dc_number:
-            last_dc = Order.objects.filter(dc_number__isnull=False).order_by('-id').first()
-            if last_dc and last_dc.dc_number.startswith('DC'):
-                try:
-                    last_number = int(last_dc.dc_number.replace('DC', ''))
-                except ValueError:
-                    last_number = 0
-            else:
-                last_number = 0
-            new_number = last_number + 1
-            self.dc_number = f"DC{new_number:04d}"  # DC0001, DC0002, etc.
+            # Allocate and insert together, so a failed insert hands the number back
+            try:
+                with transaction.atomic():
+                    self.dc_number = next_dc_number()
+                    super().save(*args, **kwargs)
+            except Exception:
+                self.dc_number = None
+                raise
+            return
 
         super().save(*args, **kwargs)
 
@@ -58,6 +84,15 @@ class Order(models.Model):
     def total_amount(self):
         return sum(item.price * item.quantity for item in self.orderitem_set.all())
 
+    class Meta:
+        indexes = [
+            # Partner order history is paged newest first by (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            # Store order queue: newest first, optionally narrowed to one status
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='order_status_created_idx'),
+        ]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
@@ -75,18 +110,60 @@ class OrderItem(models.Model):
 
 class OrderItemSerial(models.Model):
     order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name='serials')
-    serial_number = models.CharField(max_length=100)
+    # A device can only be sold once: the serial is unique across all orders
+    serial_number = models.CharField(max_length=100, unique=True)
     
     # New optional fields
     make = models.CharField(max_length=100, blank=True, null=True)
     model = models.CharField(max_length=100, blank=True, null=True)
     mac_id = models.CharField(max_length=100, blank=True, null=True)
+    # mac_id as a 48-bit number (None if it isn't a valid MAC); kept in sync on save
+    mac_int = models.BigIntegerField(blank=True, null=True, db_index=True, editable=False)
+
+    # Copies for the partner's serial table (customermapping.utils.get_serial_page),
+    # so it pages on one index: the partner the serial was sold to (the order's
+    # user, filled in on save) and when its latest customer mapping was made
+    # (kept by customermapping/signals.py).
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='+', db_index=False, editable=False,
+    )
+    mapped_at = models.DateTimeField(blank=True, null=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.order_item.asset.name} - {self.serial_number}"
 
+    def sync_mac(self):
+        """Refresh mac_int from mac_id. bulk_create/bulk_update callers must call this themselves."""
+        self.mac_int = parse_mac(self.mac_id)
+
+    def sync_owner(self):
+        """Fill owner from the order (one query). bulk_create callers set owner_id themselves."""
+        if self.owner_id is None and self.order_item_id:
+            self.owner_id = OrderItem.objects.filter(pk=self.order_item_id).values_list(
+                'order__user_id', flat=True,
+            ).first()
+
+    def save(self, *args, **kwargs):
+        self.sync_mac()
+        if kwargs.get('update_fields') is None:
+            self.sync_owner()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'mac_id' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'mac_int'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            # MAC prefix search (LIKE 'abc%'). On PostgreSQL a plain index can't serve
+            # LIKE under a non-C collation, hence pattern_ops.
+            models.Index(fields=['mac_id'], name='serial_mac_prefix_idx', opclasses=['varchar_pattern_ops']),
+            # The partner's serial table, by mapped date (either direction)
+            models.Index(fields=['owner', 'mapped_at', 'id'], name='serial_owner_mapped_idx'),
+        ]
+
     
 
 
@@ -112,4 +189,62 @@ class OrderShipment(models.Model):
 
     class Meta:
         verbose_name = "Order Shipment"
-        verbose_name_plural = "Order Shipments"
\ No newline at end of file
+        verbose_name_plural = "Order Shipments"
+
+class PaymentIntent(models.Model):
+    """
+    Pending request to create the gateway order for an Order placed in
+    deferred mode (see order/payments.py).
+    """
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Processing', 'Processing'),
+        ('Created', 'Created'),
+        ('Failed', 'Failed'),
+    ]
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='payment_intent')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending', db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True, default='')
+    # After a failed attempt, not claimed again before this time
+    next_attempt_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Payment intent for Order #{self.order_id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Payment Intent"
+        verbose_name_plural = "Payment Intents"
+
+
+class PaymentEvent(models.Model):
+    """
+    Razorpay webhook delivery, stored as received. Rows are only ever added;
+    processing just stamps ``processed_at``/``outcome`` (plus ``attempts`` and
+    ``last_error`` when applying it fails), so the table doubles as an audit
+    log of what the gateway told us.
+    """
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50)
+    gateway_order_id = models.CharField(max_length=100, blank=True, default='', db_index=True)
+    payment_id = models.CharField(max_length=100, blank=True, default='')
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    outcome = models.CharField(max_length=100, blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True, default='')
+
+    def __str__(self):
+        return f"{self.event} ({self.event_id})"
+
+    class Meta:
+        verbose_name = "Payment Event"
+        verbose_name_plural = "Payment Events"
+        indexes = [
+            # The processor only ever scans unprocessed rows in arrival order
+            models.Index(fields=['processed_at', 'id'], name='order_payevent_pending_idx'),
+        ]
@@ -0,0 +1,341 @@
+# order/payments.py
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+import razorpay
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from partner.utils import credit_refundable_deposit
+from .models import Order, PaymentEvent, PaymentIntent
+
+logger = logging.getLogger(__name__)
+
+# ---------------------- RAZORPAY CLIENT ----------------------
+# One client per process, shared by every request. It keeps a pooled
+# requests.Session underneath (keep-alive connections to the gateway) and
+# puts a timeout on every call, so a slow gateway fails fast instead of
+# holding a gunicorn worker indefinitely.
+
+DEFAULT_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+DEFAULT_POOL_SIZE = 10
+
+_client = None
+_client_config = None
+_client_lock = threading.Lock()
+
+
+class _TimeoutSession(requests.Session):
+    """requests.Session that applies a default timeout to every call."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def _razorpay_config():
+    return (
+        settings.RAZORPAY_KEY_ID,
+        settings.RAZORPAY_KEY_SECRET,
+        getattr(settings, "RAZORPAY_BASE_URL", None),
+        tuple(getattr(settings, "RAZORPAY_TIMEOUT", DEFAULT_TIMEOUT)),
+        getattr(settings, "RAZORPAY_POOL_SIZE", DEFAULT_POOL_SIZE),
+    )
+
+
+def build_razorpay_client(key_id, key_secret, base_url=None, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE):
+    session = _TimeoutSession(timeout)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    options = {"base_url": base_url} if base_url else {}
+    return razorpay.Client(session=session, auth=(key_id, key_secret), **options)
+
+
+def get_razorpay_client():
+    """The process-wide Razorpay client (rebuilt if the RAZORPAY_* settings change)."""
+    global _client, _client_config
+    config = _razorpay_config()
+    if _client is None or _client_config != config:
+        with _client_lock:
+            if _client is None or _client_config != config:
+                _client = build_razorpay_client(*config)
+                _client_config = config
+    return _client
+
+
+def create_gateway_order(amount, receipt=None):
+    """Create a Razorpay order for ``amount`` rupees and return its id."""
+    payload = {
+        "amount": int(amount * 100),
+        "currency": "INR",
+        "payment_capture": "1",
+    }
+    if receipt:
+        payload["receipt"] = receipt
+    return get_razorpay_client().order.create(payload)["id"]
+
+
+def verify_payment_signature(order_id, payment_id, signature):
+    """Raise ``razorpay.errors.SignatureVerificationError`` unless the checkout signature matches."""
+    get_razorpay_client().utility.verify_payment_signature({
+        "razorpay_order_id": order_id,
+        "razorpay_payment_id": payment_id,
+        "razorpay_signature": signature,
+    })
+
+
+# ---------------------- ORDER INTENTS ----------------------
+# With RAZORPAY_DEFERRED_ORDERS on, checkout doesn't call the gateway at all:
+# the order is saved with a placeholder order_id plus a Pending PaymentIntent,
+# and the process_payment_intents worker creates the Razorpay order and swaps
+# the real id in. The payment page polls payment_intent_status until then.
+#
+# The worker never holds a transaction (or a row lock) across a gateway call:
+# it claims a batch by marking it Processing and commits, calls the gateway,
+# then records each result in its own short transaction. Every gateway order
+# carries a receipt derived from the order, and a retried intent first asks
+# the gateway for an order with that receipt, so a worker that died after the
+# gateway answered doesn't get a second Razorpay order created on retry.
+# Intents left Processing longer than INTENT_CLAIM_TIMEOUT are claimed again.
+# A failed attempt puts the intent back to Pending with a next_attempt_at that
+# doubles each time (INTENT_RETRY_BACKOFF, 2x, 4x, ...), so a gateway outage
+# has to outlast the whole schedule before the order is given up on.
+
+INTENT_ORDER_PREFIX = "intent_"
+MAX_INTENT_ATTEMPTS = 5
+INTENT_CLAIM_TIMEOUT = timedelta(minutes=5)
+INTENT_RETRY_BACKOFF = timedelta(minutes=1)
+
+
+def deferred_orders_enabled():
+    return getattr(settings, "RAZORPAY_DEFERRED_ORDERS", False)
+
+
+def new_intent_order_id():
+    return f"{INTENT_ORDER_PREFIX}{uuid.uuid4().hex}"
+
+
+def intent_receipt(intent):
+    """Receipt sent with an intent's gateway order; the same on every attempt."""
+    return intent.order.dc_number or f"intent-{intent.pk}"
+
+
+def find_gateway_order(receipt):
+    """Id of an existing gateway order created with ``receipt``, or ``None``."""
+    items = get_razorpay_client().order.all({"receipt": receipt}).get("items", [])
+    return items[0]["id"] if items else None
+
+
+def intent_retry_delay(attempts):
+    """How long an intent waits after its ``attempts``-th failed attempt."""
+    return INTENT_RETRY_BACKOFF * 2 ** (attempts - 1)
+
+
+def claim_payment_intents(limit):
+    """Mark up to ``limit`` due intents Processing (one attempt each) and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        intents = list(
+            PaymentIntent.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(
+                Q(status="Pending", next_attempt_at__isnull=True)
+                | Q(status="Pending", next_attempt_at__lte=now)
+                | Q(status="Processing", updated_at__lt=now - INTENT_CLAIM_TIMEOUT)
+            )
+            .select_related("order")
+            .order_by("id")[:limit]
+        )
+        for intent in intents:
+            intent.status = "Processing"
+            intent.attempts += 1
+            intent.updated_at = now
+        PaymentIntent.objects.bulk_update(intents, ["status", "attempts", "updated_at"])
+    return intents
+
+
+def process_payment_intents(limit=50):
+    """
+    Create gateway orders for up to ``limit`` pending intents.
+    Returns ``(created, failed)`` counts. Safe to run from several workers:
+    intents are claimed with SKIP LOCKED before any gateway call.
+    """
+    created = failed = 0
+    for intent in claim_payment_intents(limit):
+        order = intent.order
+        receipt = intent_receipt(intent)
+        try:
+            gateway_order_id = None
+            if intent.attempts > 1:
+                gateway_order_id = find_gateway_order(receipt)
+            if gateway_order_id is None:
+                gateway_order_id = create_gateway_order(order.amount, receipt=receipt)
+        except Exception as e:
+            intent.last_error = str(e)[:255]
+            if intent.attempts >= MAX_INTENT_ATTEMPTS:
+                intent.status = "Failed"
+                intent.next_attempt_at = None
+            else:
+                intent.status = "Pending"
+                intent.next_attempt_at = timezone.now() + intent_retry_delay(intent.attempts)
+            with transaction.atomic():
+                if intent.status == "Failed":
+                    Order.objects.filter(pk=order.pk).update(status="Failed")
+                    failed += 1
+                intent.save(update_fields=["status", "last_error", "next_attempt_at", "updated_at"])
+        else:
+            intent.status = "Created"
+            intent.last_error = ""
+            intent.next_attempt_at = None
+            with transaction.atomic():
+                Order.objects.filter(pk=order.pk).update(order_id=gateway_order_id)
+                intent.save(update_fields=["status", "last_error", "next_attempt_at", "updated_at"])
+            created += 1
+    return created, failed
+
+
+# ---------------------- SETTLEMENT ----------------------
+# The browser callback (success_page), the webhook and reconcile_payments can
+# all report the same payment, in any order and more than once. They all go
+# through mark_order_paid, which locks the order row and only acts on the
+# first report, so the wallet credit runs exactly once.
+
+PAID_STATUSES = ("Paid", "Completed")
+
+
+def mark_order_paid(order_pk, payment_id, signature=None):
+    """
+    Mark an order Paid and credit any refundable deposit, unless it is
+    already paid. Returns ``(order, changed)``.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order_pk)
+        if order.status in PAID_STATUSES:
+            return order, False
+
+        order.razorpay_payment_id = payment_id
+        if signature:
+            order.razorpay_signature = signature
+        order.status = "Paid"
+        order.save(update_fields=["razorpay_payment_id", "razorpay_signature", "status"])
+
+        credit_refundable_deposit(order)
+    return order, True
+
+
+def mark_order_failed(order_pk):
+    """Fail an order that is still Pending; a paid order is never downgraded."""
+    return Order.objects.filter(pk=order_pk, status="Pending").update(status="Failed") == 1
+
+
+# ---------------------- WEBHOOKS ----------------------
+
+PAID_EVENTS = ("payment.captured", "order.paid")
+MAX_EVENT_ATTEMPTS = 5
+
+
+def verify_webhook_signature(body, signature):
+    secret = getattr(settings, "RAZORPAY_WEBHOOK_SECRET", "")
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def record_payment_event(body, event_id=None):
+    """
+    Store a verified webhook delivery. Redeliveries (same event id) are
+    ignored. Returns ``(event, created)``; raises ValueError on bad JSON.
+    """
+    payload = json.loads(body)
+    entities = payload.get("payload") or {}
+    payment = (entities.get("payment") or {}).get("entity") or {}
+    gateway_order = (entities.get("order") or {}).get("entity") or {}
+
+    return PaymentEvent.objects.get_or_create(
+        # Razorpay sends X-Razorpay-Event-Id; fall back to the body hash
+        event_id=event_id or hashlib.sha256(body).hexdigest(),
+        defaults={
+            "event": payload.get("event", ""),
+            "gateway_order_id": payment.get("order_id") or gateway_order.get("id") or "",
+            "payment_id": payment.get("id") or "",
+            "payload": payload,
+        },
+    )
+
+
+def _apply_payment_event(event, order):
+    """Act on one event; returns its outcome."""
+    if order is None:
+        return "unknown order"
+    if event.event in PAID_EVENTS:
+        _, changed = mark_order_paid(order.pk, event.payment_id)
+        return "paid" if changed else "already paid"
+    # payment.failed etc.: checkout lets the partner retry on the same
+    # order, so the order stays Pending until paid or expired
+    return "ignored"
+
+
+def process_payment_events(limit=100, event_ids=None):
+    """
+    Apply up to ``limit`` unprocessed webhook events, oldest first. Orders are
+    looked up in one query per batch. Returns the number of events handled.
+
+    Each event is applied in its own savepoint, so one that fails doesn't undo
+    or block the rest of the batch: the error is kept on the event and it is
+    tried again next run, up to MAX_EVENT_ATTEMPTS times, after which it is
+    closed with outcome "failed" for someone to look at.
+    """
+    with transaction.atomic():
+        events = PaymentEvent.objects.select_for_update(skip_locked=True).filter(processed_at__isnull=True)
+        if event_ids is not None:
+            events = events.filter(pk__in=event_ids)
+        events = list(events.order_by("id")[:limit])
+        if not events:
+            return 0
+
+        orders = Order.objects.in_bulk(
+            {e.gateway_order_id for e in events if e.gateway_order_id}, field_name="order_id",
+        )
+        now = timezone.now()
+        for event in events:
+            try:
+                with transaction.atomic():
+                    event.outcome = _apply_payment_event(event, orders.get(event.gateway_order_id))
+            except Exception as e:
+                logger.exception("Could not apply payment event %s", event.event_id)
+                event.attempts += 1
+                event.last_error = str(e)[:255]
+                if event.attempts >= MAX_EVENT_ATTEMPTS:
+                    event.outcome = "failed"
+                    event.processed_at = now
+            else:
+                event.processed_at = now
+
+        PaymentEvent.objects.bulk_update(events, ["processed_at", "outcome", "attempts", "last_error"])
+    return len(events)
+
+
+# ---------------------- RECONCILIATION ----------------------
+
+def fetch_captured_payment(gateway_order_id):
+    """Id of the captured payment for a gateway order, or ``None`` if nothing was captured."""
+    items = get_razorpay_client().order.payments(gateway_order_id).get("items", [])
+    for payment in items:
+        if payment.get("status") == "captured":
+            return payment["id"]
+    return None
@@ -0,0 +1,152 @@
+# order/testing.py
+"""
+Local stand-in for the Razorpay API, for tests and manual runs.
+
+    with FakeRazorpay() as gateway, override_settings(**gateway.settings()):
+        order_id = create_gateway_order(Decimal("100"))
+        payment_id, signature = gateway.pay(order_id)
+
+It serves the order endpoints the app uses (create, fetch, list by receipt,
+list payments), checks basic auth, keeps connections alive like the real API
+and can be slowed down or made to fail to exercise timeouts and retries. It
+also signs checkout callbacks and builds signed webhook deliveries.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from urllib.parse import parse_qs
+
+from accounts.testing import FakeJSONAPI
+
+
+class FakeRazorpay(FakeJSONAPI):
+    failure = ("SERVER_ERROR", "Stand-in gateway failure")
+    unauthorized = ("BAD_REQUEST_ERROR", "Authentication failed")
+
+    def __init__(self, key_id="rzp_test_key", key_secret="rzp_test_secret", webhook_secret="whsec_test"):
+        super().__init__()
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.webhook_secret = webhook_secret
+        self.orders = {}      # order id -> order entity
+        self.payments = {}    # order id -> [payment entity]
+
+    @property
+    def base_url(self):
+        return self.origin
+
+    def settings(self, **overrides):
+        """Settings for override_settings() that point the app at this server."""
+        return dict({
+            "RAZORPAY_KEY_ID": self.key_id,
+            "RAZORPAY_KEY_SECRET": self.key_secret,
+            "RAZORPAY_WEBHOOK_SECRET": self.webhook_secret,
+            "RAZORPAY_BASE_URL": self.base_url,
+            "RAZORPAY_TIMEOUT": (1, 1),
+        }, **overrides)
+
+    # ---- checkout side ----
+    def sign(self, order_id, payment_id):
+        """Checkout signature Razorpay hands to the browser for a payment."""
+        message = f"{order_id}|{payment_id}".encode()
+        return hmac.new(self.key_secret.encode(), message, hashlib.sha256).hexdigest()
+
+    def webhook(self, event, order_id, payment_id=None):
+        """
+        Body and headers of the webhook Razorpay would send for ``event``
+        (e.g. ``"payment.captured"``), ready for ``client.post(**...)``.
+        """
+        payment = next((p for p in self.payments.get(order_id, []) if p["id"] == payment_id), None)
+        body = json.dumps({
+            "entity": "event",
+            "event": event,
+            "contains": ["payment", "order"],
+            "payload": {
+                "payment": {"entity": payment or {"id": payment_id, "order_id": order_id}},
+                "order": {"entity": self.orders.get(order_id, {"id": order_id})},
+            },
+            "created_at": int(time.time()),
+        })
+        return {
+            "data": body,
+            "content_type": "application/json",
+            "HTTP_X_RAZORPAY_SIGNATURE": self.sign_webhook(body),
+            "HTTP_X_RAZORPAY_EVENT_ID": f"evt_{uuid.uuid4().hex[:14]}",
+        }
+
+    def sign_webhook(self, body):
+        if isinstance(body, str):
+            body = body.encode()
+        return hmac.new(self.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+
+    def pay(self, order_id, status="captured"):
+        """Record a payment against an order; returns ``(payment_id, signature)``."""
+        order = self.orders[order_id]
+        payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+        payment = {
+            "id": payment_id,
+            "entity": "payment",
+            "amount": order["amount"],
+            "currency": order["currency"],
+            "status": status,
+            "order_id": order_id,
+            "created_at": int(time.time()),
+        }
+        with self._lock:
+            self.payments.setdefault(order_id, []).append(payment)
+            if status == "captured":
+                order.update(status="paid", amount_paid=order["amount"], amount_due=0)
+            else:
+                order["status"] = "attempted"
+            order["attempts"] += 1
+        return payment_id, self.sign(order_id, payment_id)
+
+    # ---- request handling ----
+    def _create_order(self, payload):
+        order_id = f"order_{uuid.uuid4().hex[:14]}"
+        order = {
+            "id": order_id,
+            "entity": "order",
+            "amount": int(payload["amount"]),
+            "amount_paid": 0,
+            "amount_due": int(payload["amount"]),
+            "currency": payload.get("currency", "INR"),
+            "receipt": payload.get("receipt"),
+            "status": "created",
+            "attempts": 0,
+            "created_at": int(time.time()),
+        }
+        with self._lock:
+            self.orders[order_id] = order
+        return 200, order, {}
+
+    def route(self, method, path, payload):
+        path, _, query = path.partition("?")
+        parts = [p for p in path.split("/") if p][1:]  # drop "v1"
+        if method == "POST" and parts == ["orders"]:
+            return self._create_order(payload)
+        if method == "GET" and parts == ["orders"]:
+            receipt = parse_qs(query).get("receipt", [None])[0]
+            items = [o for o in self.orders.values() if receipt is None or o["receipt"] == receipt]
+            return 200, {"entity": "collection", "count": len(items), "items": items}, {}
+        if method == "GET" and len(parts) >= 2 and parts[0] == "orders":
+            order = self.orders.get(parts[1])
+            if order is None:
+                return 400, self.error("BAD_REQUEST_ERROR", "The id provided does not exist"), {}
+            if parts[2:] == ["payments"]:
+                items = list(self.payments.get(parts[1], []))
+                return 200, {"entity": "collection", "count": len(items), "items": items}, {}
+            if not parts[2:]:
+                return 200, order, {}
+        return 400, self.error("BAD_REQUEST_ERROR", f"Unknown endpoint {method} {path}"), {}
+
+    def authorized(self, headers):
+        expected = base64.b64encode(f"{self.key_id}:{self.key_secret}".encode()).decode()
+        return headers.get("Authorization") == f"Basic {expected}"
+
+    def error(self, code, description):
+        return {"error": {"code": code, "description": description}}
+
@@ -1,9 +1,25 @@
-from django.test import TestCase, Client
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import razorpay
+import requests
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from .models import Order, OrderItem
-from asset.models import Asset
+from .models import Order, OrderItem, OrderItemSerial, OrderShipment, PaymentEvent, PaymentIntent
+from . import payments
+from .payments import (
+    INTENT_CLAIM_TIMEOUT, INTENT_RETRY_BACKOFF, MAX_EVENT_ATTEMPTS, MAX_INTENT_ATTEMPTS, create_gateway_order,
+    get_razorpay_client, process_payment_events, process_payment_intents, record_payment_event, verify_payment_signature,
+)
+from .testing import FakeRazorpay
+from .utils import ORDERS_PAGE_SIZE, get_orders_page
+from asset.models import Asset, Cart, CartItem
+from partner.models import Partner, WalletTransaction
 
 
 class OrderModelTests(TestCase):
@@ -74,3 +90,327 @@ class OrderViewsTests(TestCase):
         resp = self.client.post(url)
         self.assertEqual(resp.status_code, 200)
         self.assertJSONEqual(resp.content, {"success": False, "message": "Order not found."})
+
+
+class FakeGatewayMixin:
+    def setUp(self):
+        self.gateway = FakeRazorpay().start()
+        self.addCleanup(self.gateway.stop)
+        settings_override = override_settings(**self.gateway.settings())
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class RazorpayGatewayTests(FakeGatewayMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username='partner1', password='pass1234')
+        self.asset = Asset.objects.create(name='ONT', asset_code='ONT-0001', purchase_price=Decimal('1250.00'))
+
+    def test_client_is_shared_and_reuses_connections(self):
+        self.assertIs(get_razorpay_client(), get_razorpay_client())
+        for _ in range(3):
+            create_gateway_order(Decimal('10.00'))
+        self.assertEqual(len(self.gateway.orders), 3)
+        self.assertEqual(self.gateway.connections, 1)
+
+    def test_slow_gateway_times_out(self):
+        self.gateway.delay = 1.5
+        with self.assertRaises(requests.exceptions.Timeout):
+            create_gateway_order(Decimal('10.00'))
+
+    def test_signature_check(self):
+        order_id = create_gateway_order(Decimal('10.00'))
+        payment_id, signature = self.gateway.pay(order_id)
+        verify_payment_signature(order_id, payment_id, signature)
+        with self.assertRaises(razorpay.errors.SignatureVerificationError):
+            verify_payment_signature(order_id, payment_id, 'forged')
+
+    def place_deferred_order(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, asset=self.asset, quantity=2)
+        self.client.login(username='partner1', password='pass1234')
+        with override_settings(RAZORPAY_DEFERRED_ORDERS=True):
+            resp = self.client.post(reverse('place_order'))
+        self.assertTrue(resp.context['intent_pending'])
+        return resp.context['order']
+
+    def test_deferred_checkout_creates_gateway_order_in_worker(self):
+        order = self.place_deferred_order()
+        self.assertEqual(self.gateway.requests, [])  # the request never touched the gateway
+        status_url = reverse('payment_intent_status', args=[order.pk])
+        self.assertEqual(self.client.get(status_url).json(), {'status': 'Pending', 'order_id': None})
+
+        self.assertEqual(process_payment_intents(), (1, 0))
+        order.refresh_from_db()
+        self.assertEqual(self.gateway.orders[order.order_id]['amount'], 250000)
+        self.assertEqual(self.gateway.orders[order.order_id]['receipt'], order.dc_number)
+        self.assertEqual(self.client.get(status_url).json(), {'status': 'Created', 'order_id': order.order_id})
+
+        # the regular checkout callback now finds the order by its gateway id
+        payment_id, signature = self.gateway.pay(order.order_id)
+        resp = self.client.post(reverse('success_page'), {
+            'razorpay_order_id': order.order_id,
+            'razorpay_payment_id': payment_id,
+            'razorpay_signature': signature,
+        })
+        self.assertEqual(resp.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Paid')
+
+    def test_intent_retries_then_fails(self):
+        order = self.place_deferred_order()
+        self.gateway.fail_next = MAX_INTENT_ATTEMPTS
+        for _ in range(MAX_INTENT_ATTEMPTS - 1):
+            self.assertEqual(process_payment_intents(), (0, 0))
+            PaymentIntent.objects.filter(order=order).update(next_attempt_at=timezone.now())
+        self.assertEqual(process_payment_intents(), (0, 1))
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Failed')
+        self.assertEqual(order.payment_intent.attempts, MAX_INTENT_ATTEMPTS)
+        self.assertIn('Stand-in gateway failure', order.payment_intent.last_error)
+
+    def test_failed_intent_waits_before_retrying(self):
+        order = self.place_deferred_order()
+        self.gateway.fail_next = 2
+        before = timezone.now()
+        self.assertEqual(process_payment_intents(), (0, 0))
+        intent = PaymentIntent.objects.get(order=order)
+        self.assertEqual(intent.status, 'Pending')
+        self.assertGreaterEqual(intent.next_attempt_at, before + INTENT_RETRY_BACKOFF)
+
+        # Not due yet: the next poll leaves it alone and doesn't touch the gateway
+        calls = len(self.gateway.requests)
+        self.assertEqual(process_payment_intents(), (0, 0))
+        self.assertEqual(len(self.gateway.requests), calls)
+        self.assertEqual(PaymentIntent.objects.get(order=order).attempts, 1)
+
+        # The second failure waits twice as long
+        PaymentIntent.objects.filter(order=order).update(next_attempt_at=timezone.now())
+        before = timezone.now()
+        self.assertEqual(process_payment_intents(), (0, 0))
+        intent.refresh_from_db()
+        self.assertGreaterEqual(intent.next_attempt_at, before + 2 * INTENT_RETRY_BACKOFF)
+        self.assertLess(intent.next_attempt_at, before + 3 * INTENT_RETRY_BACKOFF)
+
+        PaymentIntent.objects.filter(order=order).update(next_attempt_at=timezone.now())
+        self.assertEqual(process_payment_intents(), (1, 0))
+        intent.refresh_from_db()
+        self.assertEqual((intent.status, intent.next_attempt_at), ('Created', None))
+
+    def test_gateway_is_called_after_the_claim_commits(self):
+        order = self.place_deferred_order()
+        seen = []
+
+        def create(amount, receipt=None):
+            # The claim is already saved, so other workers skip this intent meanwhile
+            seen.append(PaymentIntent.objects.get(order=order).status)
+            return create_gateway_order(amount, receipt=receipt)
+
+        with mock.patch('order.payments.create_gateway_order', side_effect=create):
+            self.assertEqual(process_payment_intents(), (1, 0))
+        self.assertEqual(seen, ['Processing'])
+
+    def test_retry_reuses_gateway_order_with_same_receipt(self):
+        order = self.place_deferred_order()
+        # A worker that died after the gateway answered: the order exists, the intent is still claimed
+        gateway_order_id = create_gateway_order(order.amount, receipt=order.dc_number)
+        PaymentIntent.objects.filter(order=order).update(
+            status='Processing', attempts=1, updated_at=timezone.now() - INTENT_CLAIM_TIMEOUT - timedelta(seconds=1),
+        )
+
+        self.assertEqual(process_payment_intents(), (1, 0))
+        order.refresh_from_db()
+        self.assertEqual(order.order_id, gateway_order_id)
+        self.assertEqual(len(self.gateway.orders), 1)
+        self.assertEqual(order.payment_intent.attempts, 2)
+
+    def test_fresh_claims_are_not_taken_over(self):
+        order = self.place_deferred_order()
+        PaymentIntent.objects.filter(order=order).update(status='Processing', attempts=1)
+        self.assertEqual(process_payment_intents(), (0, 0))
+        self.assertEqual(self.gateway.requests, [])
+
+
+class PaymentSettlementTests(FakeGatewayMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username='partner1', password='pass1234')
+        self.partner = Partner.objects.create(user=self.user, refundable_wallet=Decimal('500.00'))
+        self.deposit = Asset.objects.create(name='ONT', asset_code='ONT-0001', purchase_price=Decimal('1000.00'),
+                                            is_refundable_wallet_deposit=True)
+        self.webhook_url = reverse('razorpay_webhook')
+
+    def gateway_order(self, quantity=1):
+        order_id = create_gateway_order(self.deposit.purchase_price * quantity)
+        order = Order.objects.create(user=self.user, order_id=order_id, amount=self.deposit.purchase_price * quantity)
+        OrderItem.objects.create(order=order, asset=self.deposit, quantity=quantity, price=self.deposit.purchase_price)
+        return order
+
+    def assertWallet(self, balance, credits):
+        self.partner.refresh_from_db()
+        self.assertEqual(self.partner.refundable_wallet, Decimal(balance))
+        self.assertEqual(WalletTransaction.objects.filter(partner=self.partner).count(), credits)
+
+    def test_webhook_settles_order_once(self):
+        order = self.gateway_order(quantity=2)
+        payment_id, _ = self.gateway.pay(order.order_id)
+
+        delivery = self.gateway.webhook('payment.captured', order.order_id, payment_id)
+        self.assertEqual(self.client.post(self.webhook_url, **delivery).status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.razorpay_payment_id), ('Paid', payment_id))
+        self.assertWallet('2500.00', 1)
+
+        # Redelivery of the same event, then the order.paid event for the same payment
+        self.client.post(self.webhook_url, **delivery)
+        self.client.post(self.webhook_url, **self.gateway.webhook('order.paid', order.order_id, payment_id))
+        self.assertEqual(PaymentEvent.objects.count(), 2)
+        self.assertEqual(PaymentEvent.objects.get(event='order.paid').outcome, 'already paid')
+        self.assertWallet('2500.00', 1)
+
+    def test_browser_callback_and_webhook_credit_once(self):
+        order = self.gateway_order()
+        payment_id, signature = self.gateway.pay(order.order_id)
+        callback = {'razorpay_order_id': order.order_id, 'razorpay_payment_id': payment_id,
+                    'razorpay_signature': signature}
+
+        self.client.post(reverse('success_page'), callback)
+        self.client.post(reverse('success_page'), callback)
+        self.client.post(self.webhook_url, **self.gateway.webhook('payment.captured', order.order_id, payment_id))
+        self.assertWallet('1500.00', 1)
+
+    def test_webhook_rejects_bad_signature(self):
+        order = self.gateway_order()
+        delivery = self.gateway.webhook('payment.captured', order.order_id, 'pay_FAKE')
+        delivery['HTTP_X_RAZORPAY_SIGNATURE'] = 'forged'
+        self.assertEqual(self.client.post(self.webhook_url, **delivery).status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    def test_failed_payment_leaves_order_pending(self):
+        order = self.gateway_order()
+        payment_id, _ = self.gateway.pay(order.order_id, status='failed')
+        self.client.post(self.webhook_url, **self.gateway.webhook('payment.failed', order.order_id, payment_id))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Pending')
+        self.assertEqual(PaymentEvent.objects.get().outcome, 'ignored')
+
+    def test_webhook_logs_processing_errors(self):
+        order = self.gateway_order()
+        payment_id, _ = self.gateway.pay(order.order_id)
+        delivery = self.gateway.webhook('payment.captured', order.order_id, payment_id)
+        with mock.patch('order.views.process_payment_events', side_effect=RuntimeError("db down")), \
+                self.assertLogs('order.views', 'ERROR') as logs:
+            self.assertEqual(self.client.post(self.webhook_url, **delivery).status_code, 200)
+        self.assertIn('db down', logs.output[0])
+        self.assertTrue(PaymentEvent.objects.filter(processed_at__isnull=True).exists())  # left for the worker
+
+    def test_failing_event_does_not_block_the_batch(self):
+        broken, fine = self.gateway_order(), self.gateway_order()
+        for order in (broken, fine):
+            payment_id, _ = self.gateway.pay(order.order_id)
+            delivery = self.gateway.webhook('payment.captured', order.order_id, payment_id)
+            record_payment_event(delivery['data'].encode(), delivery['HTTP_X_RAZORPAY_EVENT_ID'])
+
+        real_credit = payments.credit_refundable_deposit
+
+        def credit(order):
+            if order.pk == broken.pk:
+                raise RuntimeError("wallet unavailable")
+            return real_credit(order)
+
+        with mock.patch('order.payments.credit_refundable_deposit', side_effect=credit), \
+                self.assertLogs('order.payments', 'ERROR'):
+            self.assertEqual(process_payment_events(), 2)
+        broken.refresh_from_db()
+        fine.refresh_from_db()
+        self.assertEqual((broken.status, fine.status), ('Pending', 'Paid'))  # the broken one rolled back alone
+        event = PaymentEvent.objects.get(gateway_order_id=broken.order_id)
+        self.assertEqual((event.processed_at, event.attempts, event.last_error), (None, 1, 'wallet unavailable'))
+
+        with mock.patch('order.payments.credit_refundable_deposit', side_effect=credit), \
+                self.assertLogs('order.payments', 'ERROR'):
+            for _ in range(MAX_EVENT_ATTEMPTS - 1):
+                process_payment_events()
+        event.refresh_from_db()
+        self.assertEqual((event.outcome, event.attempts), ('failed', MAX_EVENT_ATTEMPTS))
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(process_payment_events(), 0)  # given up on, no longer retried
+
+    def test_reconcile_payments(self):
+        paid, abandoned, recent, too_new = (self.gateway_order() for _ in range(4))
+        payment_id, _ = self.gateway.pay(paid.order_id)
+        self.gateway.pay(abandoned.order_id, status='failed')
+        now = timezone.now()
+        Order.objects.filter(pk__in=[paid.pk, abandoned.pk]).update(created_at=now - timedelta(days=2))
+        Order.objects.filter(pk=recent.pk).update(created_at=now - timedelta(hours=1))
+
+        out = StringIO()
+        call_command('reconcile_payments', '--dry-run', stdout=out)
+        self.assertIn('[dry run] Paid: 1, Failed: 1, Still pending: 1', out.getvalue())
+        self.assertEqual(Order.objects.filter(status='Pending').count(), 4)
+
+        call_command('reconcile_payments', '--batch-size=1', stdout=StringIO())
+        statuses = dict(Order.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[o.pk] for o in (paid, abandoned, recent, too_new)],
+            ['Paid', 'Failed', 'Pending', 'Pending'],
+        )
+        self.assertEqual(Order.objects.get(pk=paid.pk).razorpay_payment_id, payment_id)
+        self.assertWallet('1500.00', 1)
+
+
+class OrderListPageTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        other = User.objects.create_user(username='other', password='pass1234')
+        self.ont = Asset.objects.create(name='ONT', asset_code='ONT-0001')
+        self.stb = Asset.objects.create(name='Set Top Box', asset_code='STB-0001')
+
+        now = timezone.now()
+        self.orders = []
+        for n in range(20):
+            order = Order.objects.create(user=self.user, order_id=f'ORD{n}', status='Paid')
+            # Pairs of orders share a timestamp: the id breaks the tie
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=n // 2))
+            self.orders.append(order)
+        Order.objects.create(user=other, order_id='OTHER1')
+
+        first = self.orders[0]
+        ont_item = OrderItem.objects.create(order=first, asset=self.ont, quantity=2)
+        OrderItem.objects.create(order=first, asset=self.stb, quantity=1)
+        for i in range(2):
+            OrderItemSerial.objects.create(order_item=ont_item, serial_number=f'SN-{i}')
+        OrderShipment.objects.create(order=first, shipping_status=1)
+
+        self.client.login(username='partner1', password='pass1234')
+
+    def test_keyset_pages_cover_every_order_once(self):
+        seen, cursor = [], None
+        while True:
+            resp = self.client.get(reverse('orders'), {'before': cursor} if cursor else {})
+            page = resp.context['orders']
+            self.assertLessEqual(len(page), ORDERS_PAGE_SIZE)
+            seen.extend(o.id for o in page)
+            cursor = resp.context['next_cursor']
+            if not cursor:
+                break
+        expected = list(Order.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+        resp = self.client.get(reverse('orders'), {'before': 'garbage'})
+        self.assertRedirects(resp, reverse('orders'), fetch_redirect_response=False)
+
+    def test_cards_are_annotated(self):
+        orders, _ = get_orders_page(self.user)
+        by_id = {o.id: o for o in orders}
+        first, plain = by_id[self.orders[0].id], by_id[self.orders[1].id]
+        self.assertEqual((first.item_count, first.serial_count, first.shipment_status_label), (2, 2, 'In Transit'))
+        self.assertEqual((plain.item_count, plain.serial_count, plain.shipment_status_label), (0, 0, 'Not shipped'))
+
+    def test_page_is_one_query(self):
+        _, cursor = get_orders_page(self.user)
+        with self.assertNumQueries(1):
+            get_orders_page(self.user, cursor=cursor)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('orders/<int:pk>/', views.order_detail, name='order_detail'),
     path('mark-received/<int:order_id>/', views.mark_order_received, name='mark_order_received'),
     path('order_items_verify/', views.order_items_verify_page, name='order_items_verify'),
+    path('razorpay/webhook/', views.razorpay_webhook, name='razorpay_webhook'),
 
 
 ]
@@ -0,0 +1,138 @@
+# order/utils.py
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from accounts.utils import decode_cursor, encode_cursor
+from asset.models import Cart, CartItem
+from asset.utils import clear_cart
+from .models import Order, OrderItem, OrderItemSerial, OrderShipment, PaymentIntent
+from .payments import new_intent_order_id
+
+
+class CartChanged(Exception):
+    """The cart was edited while its gateway order was being created."""
+
+
+def _cart_lines(cart):
+    """``(asset_id, quantity, price)`` for each line of ``cart``, in one query."""
+    if cart is None:
+        return []
+    return list(
+        CartItem.objects.filter(cart=cart)
+        .order_by('id')
+        .values_list('asset_id', 'quantity', 'asset__purchase_price')
+    )
+
+
+def place_order_from_cart(user, create_gateway_order=None):
+    """
+    Turn the user's cart into a Pending order. Returns ``None`` for an empty cart.
+
+    ``create_gateway_order(amount)`` must return the gateway order id. It is
+    called between two short transactions, never while the cart row is
+    locked: the cart is read and priced under the lock, then the gateway is
+    called, then the order is written and the cart cleared under the lock
+    again. If the cart changed in between, ``CartChanged`` is raised and
+    nothing is written (the unused gateway order simply expires); if the
+    gateway raises, nothing is written either. Without it the order is saved
+    in one transaction with a placeholder id and a PaymentIntent for the
+    background worker.
+
+    The query count does not depend on the number of cart lines: the lines
+    and their price snapshots are read in one query, the order items are
+    inserted with one bulk_create and the cart is cleared with one DELETE.
+    """
+    gateway_order_id = None
+    if create_gateway_order:
+        with transaction.atomic():
+            lines = _cart_lines(Cart.objects.select_for_update().filter(user=user).first())
+        if not lines:
+            return None
+        gateway_order_id = create_gateway_order(sum(quantity * price for _, quantity, price in lines))
+
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().filter(user=user).first()
+        current = _cart_lines(cart)
+        if gateway_order_id is None:
+            if not current:
+                return None
+            lines = current
+        elif current != lines:
+            raise CartChanged("The cart changed while the order was being placed.")
+
+        order = Order.objects.create(
+            user=user,
+            order_id=gateway_order_id or new_intent_order_id(),
+            amount=sum(quantity * price for _, quantity, price in lines),
+            status='Pending',
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, asset_id=asset_id, quantity=quantity, price=price)
+            for asset_id, quantity, price in lines
+        ])
+
+        if gateway_order_id is None:
+            PaymentIntent.objects.create(order=order)
+
+        clear_cart(cart)
+    return order
+
+
+# ---------------------- PARTNER ORDER LIST ----------------------
+# The "My Orders" page is paged by keyset on (created_at, id), served by
+# order_user_created_idx, so an old page costs the same as the first one and
+# there is no COUNT(*). Item/serial counts and the shipment status come back
+# as annotations on the same query instead of per-card lookups.
+
+ORDERS_PAGE_SIZE = 9
+SHIPMENT_STATUS_LABELS = dict(OrderShipment.SHIPPING_STATUS_CHOICES)
+
+
+def _count_subquery(grouped):
+    # A correlated COUNT per order: two counts over joins would multiply each other
+    return Coalesce(
+        Subquery(grouped.order_by().annotate(n=Count("pk")).values("n")[:1], output_field=IntegerField()),
+        Value(0),
+    )
+
+
+def partner_orders_queryset(user):
+    """The user's orders with ``item_count``, ``serial_count`` and ``shipment_status`` annotated."""
+    return Order.objects.filter(user=user).annotate(
+        item_count=_count_subquery(OrderItem.objects.filter(order=OuterRef("pk")).values("order")),
+        serial_count=_count_subquery(
+            OrderItemSerial.objects.filter(order_item__order=OuterRef("pk")).values("order_item__order")
+        ),
+        shipment_status=F("shipment__shipping_status"),
+    )
+
+
+def encode_order_cursor(order):
+    return encode_cursor(order.created_at, order.id)
+
+
+def decode_order_cursor(cursor):
+    """Return ``(created_at, id)`` from a cursor; raises ValueError if it is malformed."""
+    return decode_cursor(cursor, datetime, int)
+
+
+def get_orders_page(user, cursor=None, limit=ORDERS_PAGE_SIZE):
+    """
+    One page of the user's orders, newest first. Each order carries
+    ``item_count``, ``serial_count``, ``shipment_status`` and
+    ``shipment_status_label``. Returns ``(orders, next_cursor)``.
+    """
+    qs = partner_orders_queryset(user).order_by("-created_at", "-id")
+    if cursor:
+        created, last_id = decode_order_cursor(cursor)
+        qs = qs.filter(Q(created_at__lt=created) | Q(created_at=created, id__lt=last_id))
+
+    orders = list(qs[:limit + 1])
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    orders = orders[:limit]
+    for order in orders:
+        order.shipment_status_label = SHIPMENT_STATUS_LABELS.get(order.shipment_status, "Not shipped")
+    return orders, next_cursor
@@ -1,10 +1,9 @@
+import logging
+
 from django.http import HttpResponse
 from django.template.loader import get_template
 from xhtml2pdf import pisa  # pip install xhtml2pdf
 
-from asset.models import CartItem,Cart
-from django.core.paginator import Paginator
-
 from .models import Order  # update this import if your model name differs
 import json
 import base64
@@ -16,6 +15,12 @@ from django.views.decorators.csrf import csrf_exempt
 
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .payments import process_payment_events, record_payment_event, verify_webhook_signature
+from .utils import get_orders_page
+
+logger = logging.getLogger(__name__)
 
 
 def order_summary_pdf(request, order_id):
@@ -41,27 +46,18 @@ from .models import Order, OrderItem
 @login_required
 def orders_list(request):
     """
-    Display all orders for the logged-in user with pagination.
+    Display the logged-in user's orders, newest first, one keyset page at a
+    time (``?before=<cursor>`` for older orders).
     """
-    user = request.user
-    orders = Order.objects.filter(user=user).order_by('-created_at')
-
-    # Pagination
-    paginator = Paginator(orders, 3)  # show 10 orders per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # Cart count
-    cart = Cart.objects.filter(user=request.user).first()
-    cart_count = 0
-
-    if cart:
-        cart_count = CartItem.objects.filter(cart=cart).count()
+    try:
+        orders, next_cursor = get_orders_page(request.user, cursor=request.GET.get('before'))
+    except ValueError:
+        return redirect('orders')
 
     context = {
-        'page_obj': page_obj,   # important!
-        'orders': page_obj,     # if your template expects 'orders'
-        'cart_count': cart_count,
+        'orders': orders,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('before'),
     }
     return render(request, 'order/orders_list.html', context)
 @login_required
@@ -74,18 +70,12 @@ def order_detail(request, pk):
     items = OrderItem.objects.filter(order=order)
     shipment = getattr(order, 'shipment', None)
     total_amount = sum(item.price * item.quantity for item in items)
-    cart = Cart.objects.filter(user=request.user).first()
-    cart_count = 0
-
-    if cart:
-        cart_count = cart_items = CartItem.objects.filter(cart=cart).count()
 
     context = {
         'order': order,
         'items': items,
         'total_amount': total_amount,
         'shipment':shipment,
-        'cart_count':cart_count
 
     }
     return render(request, 'order/order_detail.html', context)
@@ -157,10 +147,6 @@ def mark_order_received(request, order_id):
 def order_items_verify_page(request):
     order_id = request.GET.get("order_id")
     order = get_object_or_404(Order, id=order_id)
-    cart = Cart.objects.filter(user=request.user).first()
-    cart_count = 0
-    if cart:
-        cart_count = cart_items = CartItem.objects.filter(cart=cart).count()
 
     # ✅ Verify that this order belongs to the logged-in user
     if order.user != request.user:
@@ -172,6 +158,28 @@ def order_items_verify_page(request):
     context = {
         "order": order,
         "order_items": order_items,
-        "cart_count":cart_count
     }
     return render(request, 'order/order_items_verify.html',context)
+
+
+# ---------------------- RAZORPAY WEBHOOK ----------------------
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    body = request.body
+    if not verify_webhook_signature(body, request.headers.get('X-Razorpay-Signature')):
+        return HttpResponse("Invalid signature", status=400)
+
+    try:
+        event, created = record_payment_event(body, request.headers.get('X-Razorpay-Event-Id'))
+    except ValueError:
+        return HttpResponse("Invalid payload", status=400)
+
+    if created:
+        # Apply it right away; anything left unprocessed is picked up by process_payment_events
+        try:
+            process_payment_events(event_ids=[event.pk])
+        except Exception:
+            logger.exception("Error processing payment event %s", event.event_id)
+
+    return JsonResponse({"status": "ok"})
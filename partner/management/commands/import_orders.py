@@ -1,129 +1,181 @@
-import csv
-import os
 from datetime import datetime
-from django.core.management.base import BaseCommand
+
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.jobs import RowJobCommand
 from asset.models import Asset
-from order.models import Order, OrderItem, OrderItemSerial
+from asset.utils import next_asset_code
+from order.models import Order, OrderItem, OrderItemSerial, reserve_dc_numbers
 from partner.models import Partner
 
 User = get_user_model()
 
+# ---------------------- BATCHED ORDER IMPORT ----------------------
+# Legacy dispatch sheets become completed "OLD-<serial>" orders with one item
+# and one serial per row. Partners and assets are loaded into dicts once; each
+# batch then costs a fixed handful of queries (three lookups for the batch's
+# orders, items and serials, a DC number reservation and the bulk inserts)
+# inside its own transaction. Assets the sheet names but the database lacks
+# are created just before that transaction. Streaming, progress, rejects and checkpoints
+# come from RowJobCommand.
 
-class Command(BaseCommand):
-    help = "Import order data from CSV using existing partners and assets; create if missing"
-
-    def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help="Path to the CSV file")
-
-    def handle(self, *args, **options):
-        csv_file = options['csv_file']
-
-        if not os.path.exists(csv_file):
-            self.stdout.write(self.style.ERROR(f"File not found: {csv_file}"))
-            return
+DATE_FORMAT = '%d.%m.%Y'
 
-        with open(csv_file, newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                partner_name = row.get('Partner', '').strip()
-                if not partner_name:
-                    self.stdout.write(self.style.WARNING(f"Partner name missing. Skipping row: {row}"))
-                    continue
 
-                username = partner_name.replace(' ', '').lower()
+def cell(row, column):
+    """A stripped CSV value; short rows give DictReader ``None`` for their missing cells."""
+    return (row.get(column) or '').strip()
 
-                # Get existing user
-                try:
-                    user = User.objects.get(username=username)
-                except User.DoesNotExist:
-                    self.stdout.write(self.style.WARNING(f"User {username} not found. Skipping row."))
-                    continue
 
-                # Check partner exists
-                partner = Partner.objects.filter(user=user).first()
-                if not partner:
-                    self.stdout.write(self.style.WARNING(f"Partner for user {username} not found. Skipping row."))
-                    continue
+class Command(RowJobCommand):
+    help = "Import order data from CSV using existing partners and assets; create if missing"
+    supports_dry_run = True
+
+    def setup(self):
+        # username -> user id, for users that have a Partner
+        self.partner_users = dict(Partner.objects.values_list('user__username', 'user_id'))
+        self.usernames = set(User.objects.filter(partner__isnull=True).values_list('username', flat=True))
+        # Asset names aren't unique; like the old per-row lookup, the first one wins
+        self.assets = {}
+        for asset in Asset.objects.order_by('id').only('id', 'name', 'location'):
+            self.assets.setdefault(asset.name, asset)
+
+    def parse(self, line_no, row):
+        """The row's fields, or ``None`` (after rejecting it) if it can't be imported."""
+        partner_name = cell(row, 'Partner')
+        asset_name = cell(row, 'Asset')
+        mac_id = cell(row, 'MAC Number')
+        serial_number = cell(row, 'Serial Number') or mac_id
+
+        username = partner_name.replace(' ', '').lower()
+        if not partner_name:
+            reason = 'partner name missing'
+        elif username not in self.partner_users:
+            reason = 'partner not found' if username in self.usernames else 'user not found'
+        elif not asset_name:
+            reason = 'asset name missing'
+        elif not serial_number:
+            reason = 'no serial or MAC number'
+        else:
+            reason = None
+        if reason:
+            self.reject(line_no, row, reason)
+            return None
+
+        try:
+            created_at = timezone.make_aware(datetime.strptime(cell(row, 'Dispatched Date'), DATE_FORMAT))
+        except (TypeError, ValueError):
+            self.stats['invalid dates (imported as now)'] += 1
+            created_at = timezone.now()
+
+        return {
+            'user_id': self.partner_users[username],
+            'asset_name': asset_name,
+            'location': cell(row, 'Location'),
+            'created_at': created_at,
+            'serial_number': serial_number,
+            'mac_id': mac_id or None,
+            # Only a sheet with a Model column sets it; the MAC never goes there
+            'model': cell(row, 'Model') or None,
+        }
+
+    def prepare_assets(self, parsed):
+        """
+        Create the batch's missing assets (and fill in blank locations) before
+        the batch transaction. They commit on their own, so a batch that rolls
+        back never leaves self.assets holding rows that don't exist.
+        """
+        for p in parsed:
+            name, location = p['asset_name'], p['location']
+            asset = self.assets.get(name)
+            if asset is None:
+                self.stats['assets created'] += 1
+                asset = Asset(name=name, location=location, quantity=1)
+                if not self.dry_run:
+                    with transaction.atomic():
+                        asset.asset_code = next_asset_code(name)
+                        asset.save()
+                self.assets[name] = asset
+            elif location and not asset.location:
+                asset.location = location
+                if not self.dry_run:
+                    asset.save(update_fields=['location'])
+
+    def process_batch(self, rows):
+        """Import one batch of ``(line_no, row)`` pairs in a single transaction."""
+        parsed = [p for p in (self.parse(line_no, row) for line_no, row in rows) if p]
+        if not parsed:
+            return
+        self.prepare_assets(parsed)
+
+        with transaction.atomic():
+            numbers = {p['serial_number'] for p in parsed}
+            order_ids = {f"OLD-{n}" for n in numbers}
+            existing_serials = set(
+                OrderItemSerial.objects.filter(serial_number__in=numbers).values_list('serial_number', flat=True)
+            )
+            orders = dict(Order.objects.filter(order_id__in=order_ids).values_list('order_id', 'pk'))
+            # (order_id, asset) -> item pk for the items those orders already have
+            items = {}
+            for pk, order_id, asset_id in OrderItem.objects.filter(
+                order_id__in=orders.values()
+            ).order_by('id').values_list('pk', 'order__order_id', 'asset_id'):
+                items.setdefault((order_id, asset_id), pk)
+
+            new_orders, new_items, new_serials = {}, {}, []
+            for p in parsed:
+                asset = self.assets[p['asset_name']]
+                order_id = f"OLD-{p['serial_number']}"
+                if order_id not in orders and order_id not in new_orders:
+                    new_orders[order_id] = Order(
+                        user_id=p['user_id'], order_id=order_id, amount=0, status='Completed',
+                        created_at=p['created_at'],
+                    )
 
-                # Get or create Asset
-                asset_name = row.get('Asset', '').strip()
-                if not asset_name:
-                    self.stdout.write(self.style.WARNING(f"Asset name missing. Skipping row: {row}"))
+                # Assets only created by a dry run have no pk yet; their names are unique in self.assets
+                key = (order_id, asset.pk or asset.name)
+                if key not in items and key not in new_items:
+                    item = OrderItem(asset=asset, quantity=1, price=0)
+                    if order_id in orders:
+                        item.order_id = orders[order_id]
+                    else:
+                        item.order = new_orders[order_id]
+                    new_items[key] = item
+
+                if p['serial_number'] in existing_serials:
+                    self.stats['serials already present'] += 1
                     continue
-
-                asset, created = Asset.objects.get_or_create(
-                    name=asset_name,
-                    defaults={
-                        'location': row.get('Location', '').strip(),
-                        'quantity': 1,
-                        'asset_code': f"{asset_name[:3].upper()}-{Asset.objects.count()+1:04d}",
-                    }
+                existing_serials.add(p['serial_number'])
+                serial = OrderItemSerial(
+                    serial_number=p['serial_number'], make=asset.name, model=p['model'], mac_id=p['mac_id'],
+                    owner_id=p['user_id'],
                 )
-                if created:
-                    self.stdout.write(self.style.SUCCESS(f"🆕 Asset '{asset_name}' created"))
-
-                # Update asset location if missing
-                location = row.get('Location', '').strip()
-                if location and not asset.location:
-                    asset.location = location
-                    asset.save()
-
-                # Parse dispatched date
-                try:
-                    order_date = datetime.strptime(row['Dispatched Date'], '%d.%m.%Y')
-                except Exception as e:
-                    self.stdout.write(self.style.WARNING(f"Invalid date for row {row}: {e}"))
-                    order_date = datetime.now()
-
-                # Use Serial Number if available, else fallback to MAC Number
-                serial_number = row.get('Serial Number', '').strip() or row.get('MAC Number', '').strip()
-                if not serial_number:
-                    self.stdout.write(self.style.WARNING(f"No Serial Number or MAC Number for row: {row}. Skipping."))
-                    continue
-
-                # Check if order already exists for this user + serial
-                order_id = f"OLD-{serial_number}"
-                order = Order.objects.filter(order_id=order_id).first()
-                if not order:
-                    order = Order.objects.create(
-                        user=user,
-                        order_id=order_id,
-                        amount=0.0,
-                        status='Completed',  # ✅ Set Completed status
-                    )
-                    # Override created_at with dispatched date
-                    Order.objects.filter(pk=order.pk).update(created_at=order_date)
-
-                    self.stdout.write(self.style.SUCCESS(f"✅ Order created: {order_id} with Completed status"))
+                if key in items:
+                    serial.order_item_id = items[key]
                 else:
-                    self.stdout.write(self.style.WARNING(f"⚠ Order {order_id} already exists."))
-
-                # Check if OrderItem exists for this order + asset
-                order_item = OrderItem.objects.filter(order=order, asset=asset).first()
-                if not order_item:
-                    order_item = OrderItem.objects.create(
-                        order=order,
-                        asset=asset,
-                        quantity=1,
-                        price=0.0
-                    )
-                    self.stdout.write(self.style.SUCCESS(f"✅ OrderItem created for {asset.name}"))
-                else:
-                    self.stdout.write(self.style.WARNING(f"⚠ OrderItem for {asset.name} already exists in this order."))
-
-                # Check if Serial exists globally
-                serial = OrderItemSerial.objects.filter(serial_number=serial_number).first()
-                if not serial:
-                    OrderItemSerial.objects.create(
-                        order_item=order_item,
-                        serial_number=serial_number,
-                        make=asset.name,
-                        model=row.get('MAC Number', ''),
-                        mac_id=row.get('MAC Number', '')
-                    )
-                    self.stdout.write(self.style.SUCCESS(f"✅ Serial {serial_number} created"))
-                else:
-                    self.stdout.write(self.style.WARNING(f"⚠ Serial {serial_number} already exists. Skipping."))
-
-        self.stdout.write(self.style.SUCCESS("✅ All orders imported successfully!"))
+                    serial.order_item = new_items[key]
+                serial.sync_mac()
+                new_serials.append(serial)
+
+            self.stats['orders created'] += len(new_orders)
+            self.stats['items created'] += len(new_items)
+            self.stats['serials created'] += len(new_serials)
+            if self.dry_run:
+                return
+
+            # bulk_create skips Order.save(), so DC numbers are reserved as one block.
+            # Items and serials pick up the new pks from their related instances.
+            created = list(new_orders.values())
+            if created:
+                for order, dc_number in zip(created, reserve_dc_numbers(len(created))):
+                    order.dc_number = dc_number
+                dispatched = [order.created_at for order in created]
+                Order.objects.bulk_create(created)
+                # auto_now_add overwrote created_at on insert; put the dispatch dates back
+                for order, created_at in zip(created, dispatched):
+                    order.created_at = created_at
+                Order.objects.bulk_update(created, ['created_at'])
+            OrderItem.objects.bulk_create(new_items.values())
+            OrderItemSerial.objects.bulk_create(new_serials)
@@ -1,116 +1,185 @@
-import csv
-from django.core.management.base import BaseCommand
-from accounts.models import CustomUser
-from partner.models import Partner, PartnerCategory
+import os
+from concurrent.futures import ProcessPoolExecutor
 
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db import transaction
 
-class Command(BaseCommand):
+from accounts.jobs import RowJobCommand
+from accounts.models import CustomUser
+from partner.models import Partner, PartnerCategory
+from partner.utils import next_partner_codes, post_opening_deposits, post_wallet_entry
+
+# ---------------------- BULK PARTNER IMPORT ----------------------
+# The CSV is upserted one RowJobCommand batch at a time, keyed by username:
+# one lookup each for the batch's users and partners, one bulk_create
+# and one bulk_update per model, and one partner-code reservation. Password
+# hashing is the slow part: each new user gets its own salted PBKDF2 hash of
+# the default password, computed across a process pool. Security deposits
+# always land in the wallet ledger: new partners' opening deposits are posted
+# together with post_opening_deposits, and changes to existing partners'
+# deposits go through post_wallet_entry one partner at a time.
+
+DEFAULT_PASSWORD = "Partner@12345"
+USER_FIELDS = ('first_name', 'last_name', 'email')
+PARTNER_FIELDS = ('first_name', 'last_name', 'address', 'partner_category', 'phone')
+
+
+def sd_category_id(sd_amount):
+    if sd_amount >= 50000:
+        return 1
+    if sd_amount >= 25000:
+        return 3
+    return 2
+
+
+def parse_partner_row(row):
+    """The user and partner fields for a CSV row; raises ValueError for unusable rows."""
+    missing = [c for c in ('FIRM NAME', 'PARTNER NAME', 'SD AMOUNT', 'INVENTORY SHIPPING ADDRESS') if row.get(c) is None]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    firm_name = row['FIRM NAME'].strip()
+    if not firm_name:
+        raise ValueError("FIRM NAME is empty")
+    try:
+        sd_amount = int(row['SD AMOUNT'].strip())
+    except ValueError:
+        raise ValueError("SD AMOUNT is not a whole number")
+    first_name, _, last_name = row['PARTNER NAME'].strip().partition(' ')
+    return {
+        'username': firm_name.replace(' ', '').lower(),
+        'first_name': first_name,
+        'last_name': last_name,
+        'email': (row.get('EMAIL') or '').strip(),
+        'phone': (row.get('MOBILE') or '').strip(),
+        'address': row['INVENTORY SHIPPING ADDRESS'].strip(),
+        'sd_amount': sd_amount,
+        'category_id': sd_category_id(sd_amount),
+    }
+
+
+def hash_passwords(count, pool=None):
+    """``count`` independently salted hashes of DEFAULT_PASSWORD, spread over ``pool`` if given."""
+    passwords = [DEFAULT_PASSWORD] * count
+    if pool is None or count < 2:
+        return [make_password(p) for p in passwords]
+    return list(pool.map(make_password, passwords, chunksize=max(1, count // 64)))
+
+
+class Command(RowJobCommand):
     help = "Import partner data with email & phone update. Creates or updates both User and Partner."
+    batch_size = 500
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help="Path to the CSV file")
-
-    def handle(self, *args, **options):
-        csv_file = options['csv_file']
-        default_password = "Partner@12345"
-
-        with open(csv_file, newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-
-            for row in reader:
-                firm_name = row['FIRM NAME'].strip()
-                sd_amount = int(row['SD AMOUNT'].strip())
-                partner_name = row['PARTNER NAME'].strip()
-                address = row['INVENTORY SHIPPING ADDRESS'].strip()
-
-                phone = row.get('MOBILE', '').strip()
-                email = row.get('EMAIL', '').strip()
-
-                # --- Name split ---
-                parts = partner_name.split(' ', 1)
-                first_name = parts[0]
-                last_name = parts[1] if len(parts) > 1 else ''
-
-                # --- Category Calculation ---
-                if sd_amount >= 50000:
-                    cat_id = 1
-                elif sd_amount >= 25000:
-                    cat_id = 3
-                else:
-                    cat_id = 2
-
-                partner_category = PartnerCategory.objects.filter(id=cat_id).first()
-
-                # --- Username ---
-                username = firm_name.replace(' ', '').lower()
-
-                # --- USER CREATE/UPDATE ---
-                user, created = CustomUser.objects.get_or_create(
-                    username=username,
-                    defaults={
-                        'user_type': 'partner',
-                        'first_name': first_name,
-                        'last_name': last_name,
-                        'email': email if email else f"{username}@example.com",
-                    }
+        super().add_arguments(parser)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Processes used to hash new users' passwords (1 hashes inline)")
+
+    def setup(self):
+        if self.options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+        self.categories = PartnerCategory.objects.in_bulk([1, 2, 3])
+        self.pool = None
+        if self.options['workers'] > 1:
+            # Workers only hash; django.setup() covers spawn-based platforms
+            self.pool = ProcessPoolExecutor(max_workers=self.options['workers'], initializer=django.setup)
+
+    def teardown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def process_batch(self, rows):
+        parsed = {}
+        for line_no, row in rows:
+            try:
+                partner_row = parse_partner_row(row)
+            except ValueError as e:
+                self.reject(line_no, row, str(e))
+                continue
+            if partner_row['username'] in parsed:
+                self.stats['repeated firms (last row used)'] += 1
+            parsed[partner_row['username']] = partner_row
+        if parsed:
+            self.upsert(list(parsed.values()), self.pool)
+
+    def upsert(self, rows, pool):
+        usernames = [r['username'] for r in rows]
+        users = {u.username: u for u in CustomUser.objects.filter(username__in=usernames)}
+        partners = {p.user_id: p for p in Partner.objects.filter(user__in=users.values())}
+
+        new_users, changed_users = [], []
+        for row in rows:
+            user = users.get(row['username'])
+            if user is None:
+                users[row['username']] = user = CustomUser(
+                    username=row['username'],
+                    user_type='partner',
+                    first_name=row['first_name'],
+                    last_name=row['last_name'],
+                    email=row['email'] or f"{row['username']}@example.com",
                 )
-
-                if created:
-                    user.set_password(default_password)
-                    user.save()
-                    self.stdout.write(self.style.SUCCESS(f"👤 User created: {username}"))
-                else:
-                    # Update missing fields
-                    updated = False
-
-                    if first_name and user.first_name != first_name:
-                        user.first_name = first_name
-                        updated = True
-
-                    if last_name and user.last_name != last_name:
-                        user.last_name = last_name
-                        updated = True
-
-                    if email and user.email != email:
-                        user.email = email
-                        updated = True
-
-                    if updated:
-                        user.save()
-                        self.stdout.write(self.style.WARNING(f"⚙️ Updated user fields for: {username}"))
-
-                # --- PARTNER UPDATE/CREATE ---
-                partner = Partner.objects.filter(user=user).first()
-
-                if partner:
-                    # Update partner data
-                    partner.first_name = first_name
-                    partner.last_name = last_name
-                    partner.address = address
-                    partner.partner_category = partner_category
-                    partner.refundable_wallet = sd_amount
-
-                    if phone:
-                        partner.phone = phone
-                    if email:
-                        partner.email = email  # if your model has email
-
-                    partner.save()
-                    self.stdout.write(self.style.SUCCESS(f"🔄 Updated Partner: {firm_name}"))
-                else:
-                    # Create unique code
-                    next_code = f"skyplay_{1000 + Partner.objects.count()}"
-
-                    Partner.objects.create(
-                        user=user,
-                        first_name=first_name,
-                        last_name=last_name,
-                        address=address,
-                        phone=phone,
-                        email=email if email else "",  # only if email exists in model
-                        partner_category=partner_category,
-                        refundable_wallet=sd_amount,
-                        code=next_code,
-                    )
-
-                    self.stdout.write(self.style.SUCCESS(f"🎉 Partner created: {firm_name}"))
+                new_users.append(user)
+                continue
+            # Blank CSV values never clear what the user already has
+            changes = {f: row[f] for f in USER_FIELDS if row[f] and getattr(user, f) != row[f]}
+            if changes:
+                for field, value in changes.items():
+                    setattr(user, field, value)
+                changed_users.append(user)
+
+        # Hash before opening the transaction, so no locks are held while the pool works
+        for user, password in zip(new_users, hash_passwords(len(new_users), pool)):
+            user.password = password
+
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(new_users)
+            CustomUser.objects.bulk_update(changed_users, USER_FIELDS)
+
+            new_partners, changed_partners, opening_deposits, deposits = [], [], [], []
+            for row in rows:
+                user = users[row['username']]
+                category = self.categories.get(row['category_id'])
+                values = {
+                    'first_name': row['first_name'],
+                    'last_name': row['last_name'],
+                    'address': row['address'],
+                    'partner_category_id': category.pk if category else None,
+                }
+                partner = partners.get(user.pk)
+                if partner is None:
+                    partner = Partner(user=user, phone=row['phone'], **values)
+                    new_partners.append(partner)
+                    if row['sd_amount'] > 0:
+                        opening_deposits.append((partner, row['sd_amount'], "Security deposit (partner import)"))
+                    continue
+
+                if row['phone']:
+                    values['phone'] = row['phone']
+                if any(getattr(partner, f) != v for f, v in values.items()):
+                    for field, value in values.items():
+                        setattr(partner, field, value)
+                    changed_partners.append(partner)
+                # Move the wallet to the SD amount through the ledger, never overwrite it
+                difference = row['sd_amount'] - partner.refundable_wallet
+                if difference:
+                    deposits.append((
+                        partner, "Credit" if difference > 0 else "Debit", abs(difference),
+                        "Security deposit updated from partner import",
+                    ))
+
+            if new_partners:
+                for partner, code in zip(new_partners, next_partner_codes(len(new_partners))):
+                    partner.code = code
+                Partner.objects.bulk_create(new_partners)
+            Partner.objects.bulk_update(changed_partners, PARTNER_FIELDS)
+
+            post_opening_deposits(opening_deposits)
+            for partner, transaction_type, amount, description in deposits:
+                post_wallet_entry(partner, transaction_type, amount, description=description)
+            self.stats['wallet entries posted'] += len(opening_deposits) + len(deposits)
+
+        self.stats['users created'] += len(new_users)
+        self.stats['users updated'] += len(changed_users)
+        self.stats['partners created'] += len(new_partners)
+        self.stats['partners updated'] += len(changed_partners)
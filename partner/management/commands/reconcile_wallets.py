@@ -0,0 +1,98 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from partner.models import Partner, WalletTransaction
+
+ADJUSTMENT_DESCRIPTION = "Ledger reconciliation adjustment"
+
+
+def drifted_partners(partner_ids=None):
+    """
+    Partners whose refundable_wallet differs from the sum of their ledger
+    (credits minus debits), annotated with ``ledger_balance`` and ``drift``.
+    One grouped query (JOIN + GROUP BY + HAVING) however many partners there are.
+    """
+    money = DecimalField(max_digits=14, decimal_places=2)
+    amount = Coalesce(F('wallet_transactions__amount'), Value(0), output_field=money)
+    signed = Case(
+        When(wallet_transactions__transaction_type='Debit', then=-amount),
+        default=amount,
+        output_field=money,
+    )
+    partners = Partner.objects.all()
+    if partner_ids is not None:
+        partners = partners.filter(pk__in=partner_ids)
+
+    return (
+        partners.order_by()
+        .annotate(ledger_balance=Coalesce(Sum(signed), Value(0), output_field=money))
+        .annotate(drift=F('refundable_wallet') - F('ledger_balance'))
+        .exclude(drift=0)
+        .values('id', 'user__username', 'refundable_wallet', 'ledger_balance', 'drift')
+    )
+
+
+class Command(BaseCommand):
+    help = "Compare every partner's wallet balance with their ledger and optionally post correcting entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help="Post an adjustment entry so each drifted ledger sums to the wallet balance")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Partners corrected per transaction")
+        parser.add_argument('--show', type=int, default=50, help="How many drifted partners to list")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        drifted = list(drifted_partners())
+        elapsed = time.monotonic() - started
+
+        for row in drifted[:options['show']]:
+            self.stdout.write(
+                f"⚠ {row['user__username']}: wallet ₹{row['refundable_wallet']:.2f}, "
+                f"ledger ₹{row['ledger_balance']:.2f}, drift ₹{row['drift']:.2f}"
+            )
+        if len(drifted) > options['show']:
+            self.stdout.write(f"… and {len(drifted) - options['show']} more")
+
+        total_drift = sum((row['drift'] for row in drifted), 0)
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {Partner.objects.count()} partners in {elapsed:.2f}s: "
+            f"{len(drifted)} drifted, net drift ₹{total_drift:.2f}"
+        ))
+
+        if options['fix'] and drifted:
+            fixed = self.fix(drifted, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"✅ Posted {fixed} adjustment entr{'y' if fixed == 1 else 'ies'}"))
+
+    def fix(self, drifted, batch_size):
+        """
+        Adjustment entries record the difference without moving the balance
+        (balance_after is the current balance). Each batch re-checks its
+        partners under a row lock, so postings made since the report are honoured.
+        """
+        ids = [row['id'] for row in drifted]
+        fixed = 0
+        for start in range(0, len(ids), batch_size):
+            batch_ids = ids[start:start + batch_size]
+            with transaction.atomic():
+                list(Partner.objects.select_for_update().filter(pk__in=batch_ids).values_list('id'))
+                now = timezone.now()
+                entries = [
+                    WalletTransaction(
+                        partner_id=row['id'],
+                        transaction_type='Credit' if row['drift'] > 0 else 'Debit',
+                        amount=abs(row['drift']),
+                        description=ADJUSTMENT_DESCRIPTION,
+                        transaction_date=now,
+                        balance_after=row['refundable_wallet'],
+                    )
+                    for row in drifted_partners(batch_ids)
+                ]
+                WalletTransaction.objects.bulk_create(entries, batch_size=batch_size)
+                fixed += len(entries)
+        return fixed
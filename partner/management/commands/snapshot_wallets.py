@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from partner.models import WalletMonthlySnapshot, WalletTransaction
+
+
+class Command(BaseCommand):
+    help = "Rebuild monthly wallet snapshots (opening/closing balances) from the ledger's running balances"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partner', type=int, help="Only rebuild this partner id")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Snapshots written per batch")
+
+    def handle(self, *args, **options):
+        rows = (
+            WalletTransaction.objects.filter(partner__isnull=False, balance_after__isnull=False)
+            .order_by('partner_id', 'transaction_date', 'id')
+            .values_list('partner_id', 'transaction_date', 'transaction_type', 'amount', 'balance_after')
+        )
+        if options['partner']:
+            rows = rows.filter(partner_id=options['partner'])
+
+        batch, written = [], 0
+        current = None  # [partner_id, month, opening, closing]
+        for partner_id, date, txn_type, amount, balance_after in rows.iterator(chunk_size=5000):
+            month = timezone.localtime(date).date().replace(day=1)
+            if current and current[0] == partner_id and current[1] == month:
+                current[3] = balance_after
+                continue
+
+            if current:
+                batch.append(WalletMonthlySnapshot(
+                    partner_id=current[0], month=current[1], opening_balance=current[2], closing_balance=current[3],
+                ))
+            if current and current[0] == partner_id:
+                opening = current[3]  # carries over from the previous month with postings
+            else:
+                amount = amount or 0
+                opening = balance_after - (amount if txn_type == 'Credit' else -amount)
+            current = [partner_id, month, opening, balance_after]
+
+            if len(batch) >= options['batch_size']:
+                written += self.write(batch)
+                batch = []
+
+        if current:
+            batch.append(WalletMonthlySnapshot(
+                partner_id=current[0], month=current[1], opening_balance=current[2], closing_balance=current[3],
+            ))
+        written += self.write(batch)
+        self.stdout.write(self.style.SUCCESS(f"✅ Wrote {written} monthly snapshot(s)"))
+
+    @staticmethod
+    def write(batch):
+        if not batch:
+            return 0
+        with transaction.atomic():
+            WalletMonthlySnapshot.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=['partner', 'month'],
+                update_fields=['opening_balance', 'closing_balance'],
+            )
+        return len(batch)
@@ -1,70 +1,81 @@
-import csv
-from django.core.management.base import BaseCommand
-from accounts.models import CustomUser
-from partner.models import Partner
+from collections import defaultdict
 
+from django.db import transaction
 
-class Command(BaseCommand):
-    help = "Fix existing partner emails and phone numbers using the original CSV input."
-
-    def add_arguments(self, parser):
-        parser.add_argument("csv_file", type=str, help="Path to the CSV file")
+from accounts.jobs import RowJobCommand
+from accounts.models import CustomUser
+from partner.models import Partner
 
-    def handle(self, *args, **options):
-        csv_file = options["csv_file"]
+# Each batch of CSV rows costs one query loading the users together with
+# their partners; the CSV is compared in memory and only the rows that differ
+# are written: one bulk_update per combination of changed columns, so an
+# unchanged email or phone is never rewritten.
 
-        with open(csv_file, newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
 
-            for row in reader:
-                firm_name = row['FIRM NAME'].strip()
-                email = row.get('EMAIL', '').strip()
-                phone = row.get('MOBILE', '').strip()
+def _group_changes(changes):
+    """``{obj: {field: value}}`` -> ``{fields: [obj, ...]}`` with the new values applied."""
+    groups = defaultdict(list)
+    for obj, fields in changes.items():
+        for field, value in fields.items():
+            setattr(obj, field, value)
+        groups[tuple(sorted(fields))].append(obj)
+    return groups
 
-                # username = firm name without spaces
-                username = firm_name.replace(' ', '').lower()
 
-                try:
-                    user = CustomUser.objects.get(username=username)
-                except CustomUser.DoesNotExist:
-                    self.stdout.write(self.style.ERROR(f"❌ User not found for: {firm_name}"))
-                    continue
+class Command(RowJobCommand):
+    help = "Fix existing partner emails and phone numbers using the original CSV input."
+    batch_size = 2000
+    supports_dry_run = True
 
-                partner = Partner.objects.filter(user=user).first()
-                if not partner:
-                    self.stdout.write(self.style.ERROR(f"❌ Partner entry missing for: {firm_name}"))
-                    continue
+    def process_batch(self, rows):
+        # username -> (line, row, email, phone); a later row for the same firm wins
+        contacts = {}
+        for line_no, row in rows:
+            username = (row.get('FIRM NAME') or '').strip().replace(' ', '').lower()
+            if not username:
+                self.reject(line_no, row, "FIRM NAME is empty")
+                continue
+            contacts[username] = (line_no, row, (row.get('EMAIL') or '').strip(), (row.get('MOBILE') or '').strip())
 
-                # ------------------------------
-                # UPDATE EMAIL
-                # ------------------------------
-                if email and user.email != email:
-                    user.email = email
-                    user.save()
-                    self.stdout.write(self.style.SUCCESS(f"📧 Updated email: {firm_name} → {email}"))
-                else:
-                    self.stdout.write(self.style.WARNING(f"Email already correct for {firm_name}"))
+        users = {
+            user.username: user
+            for user in CustomUser.objects.filter(username__in=contacts).select_related("partner").only(
+                "username", "email", "phone", "partner__user", "partner__phone",
+            )
+        }
 
-                # ------------------------------
-                # UPDATE PHONE (CustomUser + Partner)
-                # ------------------------------
-                if phone:
-                    updated = False
+        user_changes, partner_changes = defaultdict(dict), defaultdict(dict)
+        for username, (line_no, row, email, phone) in contacts.items():
+            user = users.get(username)
+            if user is None:
+                self.reject(line_no, row, "user not found")
+                continue
+            partner = getattr(user, "partner", None)
+            if partner is None:
+                self.reject(line_no, row, "partner entry missing")
+                continue
 
-                    if user.phone != phone:
-                        user.phone = phone
-                        updated = True
-                        user.save()
+            if email and user.email != email:
+                user_changes[user]["email"] = email
+            if phone and user.phone != phone:
+                user_changes[user]["phone"] = phone
+            if phone and partner.phone != phone:
+                partner_changes[partner]["phone"] = phone
 
-                    if partner.phone != phone:
-                        partner.phone = phone
-                        updated = True
-                        partner.save()
+            if user in user_changes or partner in partner_changes:
+                self.stats["partners changed"] += 1
+                if self.options["verbosity"] > 1:
+                    self.stdout.write(f"{username}: {user_changes.get(user, {})} {partner_changes.get(partner, {})}")
+            else:
+                self.stats["partners already correct"] += 1
 
-                    if updated:
-                        self.stdout.write(self.style.SUCCESS(f"📞 Updated phone: {firm_name} → {phone}"))
-                    else:
-                        self.stdout.write(self.style.WARNING(f"Phone already correct for {firm_name}"))
+        self.stats["emails changed"] += sum("email" in fields for fields in user_changes.values())
+        self.stats["phone numbers changed"] += len(
+            {u.pk for u, fields in user_changes.items() if "phone" in fields} | {p.user_id for p in partner_changes}
+        )
 
-                else:
-                    self.stdout.write(self.style.WARNING(f"⚠️ No phone found in CSV for {firm_name}"))
+        if not self.dry_run:
+            with transaction.atomic():
+                for model, changes in ((CustomUser, user_changes), (Partner, partner_changes)):
+                    for fields, objs in _group_changes(changes).items():
+                        model.objects.bulk_update(objs, fields)
@@ -1,41 +1,25 @@
 import csv
-from django.core.management.base import BaseCommand
-from django.core.mail import EmailMessage
-from django.conf import settings
-from accounts.models import CustomUser
-
-
-class Command(BaseCommand):
-    help = "Send login emails to ZM users from CSV with CC"
-
-    def add_arguments(self, parser):
-        parser.add_argument(
-            'csv_file', type=str, help='Path to the CSV file containing ZM user details'
-        )
-
-    def handle(self, *args, **options):
-        csv_file = options['csv_file']
-
-        # CC recipients
-        cc_list = ['rajeswaran@skyplay.in', 'dir-tech@skylink.net.in', 'developer@skylink.net.in']
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-        with open(csv_file, newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-
-            for row in reader:
-                name = row.get('Name', '').strip()
-                username = row.get('User Id', '').strip()
-                password = row.get('Password', '').strip()
-                email = row.get('Official Email ID', '').strip()
-                mobile = row.get('Mobile Number', '').strip()
-                designation = row.get('Designation', '').strip()
-
-                if not email:
-                    self.stdout.write(self.style.WARNING(f"⚠️ No email for {name}, skipping"))
-                    continue
-
-                subject = "Login Details for SIMS Partner & Admin"
-                body = f"""
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import CommandError
+
+from accounts.jobs import RowJobCommand
+from accounts.mailer import DEFAULT_BACKOFF, DEFAULT_RETRIES, RateLimiter, send_with_retries
+from accounts.zeptomail_backend import ZeptoMailError
+
+# ---------------------- CREDENTIAL MAILER ----------------------
+# Each batch of recipients is sent from a thread pool sharing one mail
+# connection (one keep-alive session to the API) and one rate limiter.
+# Transient API failures are retried with backoff. Every recipient's outcome
+# goes to a result log, and a batch only counts as done for the checkpoint
+# once every message in it has succeeded or given up.
+
+SUBJECT = "Login Details for SIMS Partner & Admin"
+CC_RECIPIENTS = ['rajeswaran@skyplay.in', 'dir-tech@skylink.net.in', 'developer@skylink.net.in']
+BODY_TEMPLATE = """
 Hi {name},
 
 I hope this message finds you well.
@@ -61,17 +45,99 @@ Note: This access is valid for one week only. For any clarifications or issues,
 Best regards,
 Skyplay Team
 """
+RESULT_FIELDS = ('line', 'name', 'email', 'status', 'attempts', 'error')
 
-                # Send email with CC
-                try:
-                    email_message = EmailMessage(
-                        subject=subject,
-                        body=body,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        to=[email],
-                        cc=cc_list
-                    )
-                    email_message.send(fail_silently=False)
+
+class Command(RowJobCommand):
+    help = "Send login emails to ZM users from CSV with CC"
+    batch_size = 100
+    supports_dry_run = True
+    reject_omit_columns = ('Password',)  # the reject file stays on disk; don't copy credentials into it
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--workers', type=int, default=8, help="Messages in flight at once")
+        parser.add_argument('--rate', type=float, default=10,
+                            help="Most API calls per second, retries included (0 for no limit)")
+        parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                            help="Retries per message for throttling, 5xx and network errors")
+        parser.add_argument('--backoff', type=float, default=DEFAULT_BACKOFF,
+                            help="Seconds before the first retry; doubles after each one")
+        parser.add_argument('--results', help="Per-recipient result log (default: <csv_file>.zm_login_details.results.csv)")
+
+    def setup(self):
+        options = self.options
+        if options['workers'] < 1 or options['rate'] < 0 or options['retries'] < 0:
+            raise CommandError("--workers must be at least 1; --rate and --retries can't be negative")
+        self.results_file = None
+        if self.dry_run:
+            return
+
+        self.connection = get_connection(fail_silently=False)
+        self.limiter = RateLimiter(options['rate'])
+        self.pool = ThreadPoolExecutor(max_workers=options['workers'])
+
+        path = options['results'] or f"{options['csv_file']}.zm_login_details.results.csv"
+        append = self.resuming and os.path.exists(path) and os.path.getsize(path)
+        self.results_file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.results = csv.DictWriter(self.results_file, RESULT_FIELDS)
+        if not append:
+            self.results.writeheader()
+
+    def teardown(self):
+        if self.results_file is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.results_file.close()
+
+    def log_result(self, line_no, name, email, status, attempts=0, error=''):
+        if self.results_file is not None:
+            self.results.writerow({
+                'line': line_no, 'name': name, 'email': email, 'status': status, 'attempts': attempts, 'error': error,
+            })
+
+    def process_batch(self, rows):
+        pending = {}
+        for line_no, row in rows:
+            name = (row.get('Name') or '').strip()
+            email = (row.get('Official Email ID') or '').strip()
+            if not email:
+                self.reject(line_no, row, "no email")
+                self.log_result(line_no, name, email, 'skipped', error="no email")
+                continue
+
+            message = EmailMessage(
+                subject=SUBJECT,
+                body=BODY_TEMPLATE.format(
+                    name=name,
+                    username=(row.get('User Id') or '').strip(),
+                    password=(row.get('Password') or '').strip(),
+                ),
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email],
+                cc=CC_RECIPIENTS,
+            )
+            if self.dry_run:
+                self.stats['emails rendered'] += 1
+                continue
+            future = self.pool.submit(
+                send_with_retries, self.connection, message,
+                limiter=self.limiter, retries=self.options['retries'], backoff=self.options['backoff'],
+            )
+            pending[future] = (line_no, row, name, email)
+
+        for future in as_completed(pending):
+            line_no, row, name, email = pending[future]
+            attempts, error = future.result()
+            if error is None:
+                self.stats['emails sent'] += 1
+                if attempts > 1:
+                    self.stats['sent after a retry'] += 1
+                self.log_result(line_no, name, email, 'sent', attempts)
+                if self.options['verbosity'] > 1:
                     self.stdout.write(self.style.SUCCESS(f"✅ Email sent to {name} ({email})"))
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"❌ Failed to send email to {name}: {e}"))
+            else:
+                detail = str(error) if isinstance(error, ZeptoMailError) else f"{type(error).__name__}: {error}"
+                self.reject(line_no, row, "send failed", detail)
+                self.log_result(line_no, name, email, 'failed', attempts, detail)
+        if self.results_file is not None:
+            self.results_file.flush()
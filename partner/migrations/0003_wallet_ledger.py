@@ -0,0 +1,53 @@
+# Generated by Django 4.2.19 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+
+def backfill_running_balances(apps, schema_editor):
+    """
+    Walk each partner's history newest first, starting from the current
+    balance, so the latest row always agrees with Partner.refundable_wallet.
+    """
+    Partner = apps.get_model('partner', 'Partner')
+    WalletTransaction = apps.get_model('partner', 'WalletTransaction')
+
+    balances = dict(Partner.objects.values_list('id', 'refundable_wallet'))
+    rows = (
+        WalletTransaction.objects.filter(partner__isnull=False)
+        .order_by('partner_id', '-transaction_date', '-id')
+        .only('id', 'partner_id', 'transaction_type', 'amount')
+    )
+    batch = []
+    current_partner, balance = None, 0
+    for txn in rows.iterator(chunk_size=2000):
+        if txn.partner_id != current_partner:
+            current_partner, balance = txn.partner_id, balances.get(txn.partner_id) or 0
+        txn.balance_after = balance
+        amount = txn.amount or 0
+        balance -= amount if txn.transaction_type == 'Credit' else -amount
+        batch.append(txn)
+        if len(batch) >= 2000:
+            WalletTransaction.objects.bulk_update(batch, ['balance_after'])
+            batch = []
+    if batch:
+        WalletTransaction.objects.bulk_update(batch, ['balance_after'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partner', '0002_alter_partner_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['partner', '-transaction_date', '-id'], name='partner_wallet_history_idx'),
+        ),
+        migrations.RunPython(backfill_running_balances, migrations.RunPython.noop),
+    ]
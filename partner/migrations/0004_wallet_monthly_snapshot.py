@@ -0,0 +1,31 @@
+# Generated by Django 4.2.19 on 2026-10-18 17:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partner', '0003_wallet_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletMonthlySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('opening_balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('closing_balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallet_snapshots', to='partner.partner')),
+            ],
+            options={
+                'verbose_name': 'Wallet Monthly Snapshot',
+                'verbose_name_plural': 'Wallet Monthly Snapshots',
+                'ordering': ['partner', 'month'],
+                'unique_together': {('partner', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.19 on 2026-10-18 18:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def backfill_transaction_dates(apps, schema_editor):
+    """
+    Date the rows saved without one: from their order if they have one,
+    otherwise from the partner's previous posting by id (ids follow insertion
+    order), failing that the next one, and only as a last resort now.
+    """
+    WalletTransaction = apps.get_model('partner', 'WalletTransaction')
+    batch = []
+    for txn in WalletTransaction.objects.filter(transaction_date__isnull=True).select_related('order').iterator(
+        chunk_size=2000,
+    ):
+        date = txn.order.created_at if txn.order_id else None
+        if date is None:
+            dated = WalletTransaction.objects.filter(partner_id=txn.partner_id, transaction_date__isnull=False)
+            date = (
+                dated.filter(id__lt=txn.id).order_by('-id').values_list('transaction_date', flat=True).first()
+                or dated.filter(id__gt=txn.id).order_by('id').values_list('transaction_date', flat=True).first()
+                or django.utils.timezone.now()
+            )
+        txn.transaction_date = date
+        batch.append(txn)
+        if len(batch) >= 2000:
+            WalletTransaction.objects.bulk_update(batch, ['transaction_date'])
+            batch = []
+    if batch:
+        WalletTransaction.objects.bulk_update(batch, ['transaction_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partner', '0004_wallet_monthly_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_transaction_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='wallettransaction',
+            name='transaction_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -80,8 +80,13 @@ class WalletTransaction(models.Model):
         null=True,
         default=""
     )
-    transaction_date = models.DateTimeField(
-        default=timezone.now,
+    # Never null: wallet history pages by (transaction_date, id)
+    transaction_date = models.DateTimeField(default=timezone.now)
+
+    # Partner's wallet balance right after this posting (see partner.utils.post_wallet_entry)
+    balance_after = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
         null=True,
         blank=True
     )
@@ -92,6 +97,37 @@ class WalletTransaction(models.Model):
 
     class Meta:
         ordering = ["-transaction_date"]
+        indexes = [
+            # Wallet history is read newest first, one partner at a time
+            models.Index(fields=["partner", "-transaction_date", "-id"], name="partner_wallet_history_idx"),
+        ]
+
+
+class WalletMonthlySnapshot(models.Model):
+    """
+    A partner's wallet balance at the start and end of a calendar month,
+    kept up to date by post_wallet_entry (rebuild with ``snapshot_wallets``).
+    Statements read their opening/closing balances from here instead of
+    summing the ledger from the beginning.
+    """
+    partner = models.ForeignKey(
+        "partner.Partner",
+        on_delete=models.CASCADE,
+        related_name="wallet_snapshots"
+    )
+    month = models.DateField(help_text="First day of the month")
+    opening_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    closing_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("partner", "month")
+        ordering = ["partner", "month"]
+        verbose_name = "Wallet Monthly Snapshot"
+        verbose_name_plural = "Wallet Monthly Snapshots"
+
+    def __str__(self):
+        return f"{self.partner.user.username} {self.month:%b %Y}: ₹{self.opening_balance} → ₹{self.closing_balance}"
 
 
 from django.db import models
@@ -0,0 +1,185 @@
+# partner/statements.py
+import csv
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from .models import WalletMonthlySnapshot, WalletTransaction
+from .utils import signed_wallet_total
+
+# ---------------------- WALLET STATEMENTS ----------------------
+# Statements are generated row by row from a server-side iterator over the
+# ledger, so a CSV statement's memory stays flat however long the history is.
+# A PDF isn't: reportlab holds every page until the document is saved, so PDF
+# statements are limited to MAX_PDF_STATEMENT_DAYS (about one financial
+# year). Balances at the edges of the range come from WalletMonthlySnapshot
+# (plus at most one month of postings), never from summing the whole ledger.
+
+STATEMENT_CHUNK_SIZE = 2000
+MAX_PDF_STATEMENT_DAYS = 366
+STATEMENT_HEADER = ["Date", "Type", "Amount", "Balance", "Order", "Description"]
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def balance_at(partner, day):
+    """Wallet balance at the start of ``day``."""
+    month = _month_start(day)
+    snapshot = (
+        WalletMonthlySnapshot.objects.filter(partner=partner, month__lte=month)
+        .order_by("-month")
+        .first()
+    )
+    if snapshot is not None and snapshot.month < month:
+        return snapshot.closing_balance
+    if snapshot is not None:
+        # Snapshot of this very month: add what was posted before ``day``
+        return snapshot.opening_balance + signed_wallet_total(WalletTransaction.objects.filter(
+            partner=partner,
+            transaction_date__gte=_start_of_day(month),
+            transaction_date__lt=_start_of_day(day),
+        ))
+
+    # No snapshots yet (history from before they existed): the running
+    # balance on the last earlier posting, one index seek
+    last = (
+        WalletTransaction.objects.filter(partner=partner, transaction_date__lt=_start_of_day(day))
+        .order_by("-transaction_date", "-id")
+        .values_list("balance_after", flat=True)
+        .first()
+    )
+    return last or Decimal("0.00")
+
+
+def monthly_balances(partner, start, end):
+    """
+    ``[(month, opening, closing)]`` for every month touching ``start``..``end``,
+    carrying the previous closing balance over months without postings.
+    """
+    first_month, last_month = _month_start(start), _month_start(end)
+    snapshots = {
+        s.month: s for s in WalletMonthlySnapshot.objects.filter(
+            partner=partner, month__gte=first_month, month__lte=last_month,
+        )
+    }
+    rows = []
+    balance = balance_at(partner, first_month)
+    month = first_month
+    while month <= last_month:
+        snapshot = snapshots.get(month)
+        if snapshot:
+            rows.append((month, snapshot.opening_balance, snapshot.closing_balance))
+            balance = snapshot.closing_balance
+        else:
+            rows.append((month, balance, balance))
+        month = (month + timedelta(days=32)).replace(day=1)
+    return rows
+
+
+def statement_transactions(partner, start, end):
+    """Postings from ``start`` to ``end`` (inclusive), oldest first, streamed in chunks."""
+    return (
+        WalletTransaction.objects.filter(
+            partner=partner,
+            transaction_date__gte=_start_of_day(start),
+            transaction_date__lt=_start_of_day(end + timedelta(days=1)),
+        )
+        .order_by("transaction_date", "id")
+        .values_list(
+            "transaction_date", "transaction_type", "amount", "balance_after", "order__order_id", "description",
+        )
+        .iterator(chunk_size=STATEMENT_CHUNK_SIZE)
+    )
+
+
+def statement_rows(partner, start, end):
+    """
+    Yield the statement as plain rows: title, opening balance, the monthly
+    summary, every posting with its running balance, then the closing balance.
+    """
+    opening = balance_at(partner, start)
+    yield ["Wallet statement", partner.user.username, f"{start:%d-%m-%Y} to {end:%d-%m-%Y}"]
+    yield ["Opening balance", f"{opening:.2f}"]
+    yield []
+    yield ["Month", "Opening balance", "Closing balance"]
+    for month, month_opening, month_closing in monthly_balances(partner, start, end):
+        yield [f"{month:%b %Y}", f"{month_opening:.2f}", f"{month_closing:.2f}"]
+    yield []
+    yield STATEMENT_HEADER
+
+    balance = opening
+    for date, txn_type, amount, balance_after, order_id, description in statement_transactions(partner, start, end):
+        amount = amount or Decimal("0.00")
+        balance = balance_after if balance_after is not None else (
+            balance + amount if txn_type == "Credit" else balance - amount
+        )
+        yield [
+            timezone.localtime(date).strftime("%d-%m-%Y %H:%M"),
+            txn_type,
+            f"{amount:.2f}",
+            f"{balance:.2f}",
+            order_id or "",
+            description or "",
+        ]
+    yield []
+    yield ["Closing balance", f"{balance:.2f}"]
+
+
+class _Echo:
+    """File-like object whose write() just returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_statement_csv(partner, start, end):
+    writer = csv.writer(_Echo())
+    for row in statement_rows(partner, start, end):
+        yield writer.writerow(row)
+
+
+def stream_statement_pdf(partner, start, end, chunk_size=64 * 1024):
+    """
+    PDF version of the statement, for at most MAX_PDF_STATEMENT_DAYS.
+    reportlab keeps the pages in memory until save(), which is why the range
+    is capped; the finished file is written to a temporary file and streamed
+    back from disk in chunks rather than held in a response buffer.
+    """
+    if (end - start).days >= MAX_PDF_STATEMENT_DAYS:
+        raise ValueError(f"PDF statements cover at most {MAX_PDF_STATEMENT_DAYS} days.")
+    with tempfile.TemporaryFile() as tmp:
+        pdf = canvas.Canvas(tmp, pagesize=A4, pageCompression=1)
+        width, height = A4
+        columns = [40, 140, 195, 265, 335, 430]
+        y = height - 50
+
+        for row in statement_rows(partner, start, end):
+            if y < 50:
+                pdf.showPage()
+                y = height - 50
+            if len(row) == len(STATEMENT_HEADER):
+                pdf.setFont("Helvetica-Bold" if row == STATEMENT_HEADER else "Helvetica", 8)
+                for x, value in zip(columns, row):
+                    pdf.drawString(x, y, str(value)[:60 if x == columns[-1] else 18])
+            else:
+                pdf.setFont("Helvetica-Bold" if row and row[0] == "Wallet statement" else "Helvetica", 9)
+                pdf.drawString(40, y, "   ".join(str(v) for v in row))
+            y -= 14
+
+        pdf.save()
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -1,3 +1,646 @@
+import csv
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts import zeptomail_backend
+from accounts.testing import FakeZeptoMail
+from asset.models import Asset, Cart, CartItem
+from order.models import Order, OrderItem, OrderItemSerial
+from .models import (
+    Partner, PartnerCategory, PartnerAssetLimit, PartnerCategoryAssetLimit, WalletMonthlySnapshot, WalletTransaction,
+)
+from .management.commands.reconcile_wallets import ADJUSTMENT_DESCRIPTION, drifted_partners
+from .utils import get_asset_limits, get_asset_limit, post_wallet_entry
+
+
+class AssetLimitResolutionTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        self.category = PartnerCategory.objects.create(name='Gold')
+        self.partner = Partner.objects.create(user=self.user, partner_category=self.category)
+
+        self.router = Asset.objects.create(name='Router', asset_code='RTR-0001', max_order_per_partner=10)
+        self.ont = Asset.objects.create(name='ONT', asset_code='ONT-0001', max_order_per_partner=10)
+        self.stb = Asset.objects.create(name='Set Top Box', asset_code='STB-0001', max_order_per_partner=10)
+        self.cable = Asset.objects.create(name='Cable', asset_code='CBL-0001')
+
+        PartnerCategoryAssetLimit.objects.create(partner_category=self.category, asset=self.ont, default_limit=5)
+        PartnerCategoryAssetLimit.objects.create(partner_category=self.category, asset=self.stb, default_limit=5)
+        PartnerAssetLimit.objects.create(partner=self.partner, asset=self.stb, max_purchase_limit=3)
+
+    def test_limit_precedence(self):
+        limits = get_asset_limits(self.partner)
+        self.assertEqual(limits[self.router.id]["max_limit"], 10)  # asset default
+        self.assertEqual(limits[self.ont.id]["max_limit"], 5)      # category default
+        self.assertEqual(limits[self.stb.id]["max_limit"], 3)      # partner override
+        self.assertEqual(limits[self.cable.id]["max_limit"], 0)
+        self.assertIsNone(limits[self.cable.id]["remaining"])
+
+    def test_ordered_and_cart_quantities(self):
+        paid = Order.objects.create(user=self.user, order_id='ORD1', status='Paid')
+        failed = Order.objects.create(user=self.user, order_id='ORD2', status='Failed')
+        OrderItem.objects.create(order=paid, asset=self.ont, quantity=2)
+        OrderItem.objects.create(order=paid, asset=self.ont, quantity=1)
+        OrderItem.objects.create(order=failed, asset=self.ont, quantity=4)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, asset=self.ont, quantity=1)
+
+        limit = get_asset_limit(self.partner, self.ont.id)
+        self.assertEqual(limit["ordered_qty"], 3)
+        self.assertEqual(limit["cart_qty"], 1)
+        self.assertEqual(limit["remaining"], 1)
+
+    def test_partner_without_category(self):
+        self.partner.partner_category = None
+        self.partner.save()
+        limits = get_asset_limits(self.partner)
+        self.assertEqual(limits[self.ont.id]["max_limit"], 10)
+        self.assertEqual(limits[self.stb.id]["max_limit"], 3)
+
+    def test_all_assets_resolved_in_one_query(self):
+        for i in range(20):
+            Asset.objects.create(name=f'Asset {i}', asset_code=f'AST-{i:04d}')
+        with self.assertNumQueries(1):
+            limits = get_asset_limits(self.partner)
+        self.assertEqual(len(limits), 24)
+
+
+class WalletLedgerTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        self.partner = Partner.objects.create(user=self.user, refundable_wallet=Decimal('100.00'))
+
+    def test_postings_keep_running_balance(self):
+        post_wallet_entry(self.partner, 'Credit', Decimal('250.00'), description='Deposit')
+        txn = post_wallet_entry(self.partner, 'Debit', Decimal('50.00'), description='Refund')
+
+        self.assertEqual(txn.balance_after, Decimal('300.00'))
+        self.assertEqual(self.partner.refundable_wallet, Decimal('300.00'))
+        self.partner.refresh_from_db()
+        self.assertEqual(self.partner.refundable_wallet, Decimal('300.00'))
+        self.assertEqual(
+            list(WalletTransaction.objects.order_by('id').values_list('balance_after', flat=True)),
+            [Decimal('350.00'), Decimal('300.00')],
+        )
+
+    def test_stale_partner_instance_does_not_lose_credits(self):
+        stale = Partner.objects.get(pk=self.partner.pk)
+        post_wallet_entry(self.partner, 'Credit', Decimal('10.00'))
+        post_wallet_entry(stale, 'Credit', Decimal('5.00'))  # read before the first credit
+        self.partner.refresh_from_db()
+        self.assertEqual(self.partner.refundable_wallet, Decimal('115.00'))
+
+    def test_rejects_bad_postings(self):
+        with self.assertRaises(ValueError):
+            post_wallet_entry(self.partner, 'Refund', Decimal('1.00'))
+        with self.assertRaises(ValueError):
+            post_wallet_entry(self.partner, 'Credit', Decimal('0'))
+
+    def test_wallet_view_pages_by_keyset(self):
+        start = timezone.now() - timedelta(days=40)
+        for n in range(30):
+            post_wallet_entry(self.partner, 'Credit', Decimal('1.00'), transaction_date=start + timedelta(days=n))
+        # Same timestamp as another row: the id breaks the tie
+        post_wallet_entry(self.partner, 'Credit', Decimal('1.00'), transaction_date=start + timedelta(days=29))
+
+        self.client.login(username='partner1', password='pass1234')
+        seen, cursor = [], None
+        while True:
+            resp = self.client.get(reverse('wallet'), {'before': cursor} if cursor else {})
+            page = resp.context['transactions']
+            self.assertLessEqual(len(page), 25)
+            seen.extend(t.id for t in page)
+            cursor = resp.context['next_cursor']
+            if not cursor:
+                break
+        expected = list(WalletTransaction.objects.order_by('-transaction_date', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+        resp = self.client.get(reverse('wallet'), {'before': 'garbage'})
+        self.assertRedirects(resp, reverse('wallet'), fetch_redirect_response=False)
+
+
+class ReconcileWalletsTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.partners = [
+            Partner.objects.create(user=User.objects.create_user(username=f'partner{n}', password='x'))
+            for n in range(4)
+        ]
+        in_sync, imported, drifted, empty = self.partners
+        post_wallet_entry(in_sync, 'Credit', Decimal('300.00'))
+        post_wallet_entry(in_sync, 'Debit', Decimal('100.00'))
+        # Opening balance written straight to the column (old import behaviour)
+        Partner.objects.filter(pk=imported.pk).update(refundable_wallet=Decimal('25000.00'))
+        post_wallet_entry(drifted, 'Credit', Decimal('500.00'))
+        Partner.objects.filter(pk=drifted.pk).update(refundable_wallet=Decimal('450.00'))
+
+    def test_report_uses_one_grouped_query(self):
+        with self.assertNumQueries(1):
+            drifted = {row['user__username']: row['drift'] for row in drifted_partners()}
+        self.assertEqual(drifted, {'partner1': Decimal('25000.00'), 'partner2': Decimal('-50.00')})
+
+        out = StringIO()
+        call_command('reconcile_wallets', stdout=out)
+        self.assertIn('Checked 4 partners', out.getvalue())
+        self.assertIn('2 drifted, net drift ₹24950.00', out.getvalue())
+        self.assertEqual(WalletTransaction.objects.count(), 3)  # report only
+
+    def test_fix_posts_adjustments_without_moving_balances(self):
+        call_command('reconcile_wallets', '--fix', '--batch-size=1', stdout=StringIO())
+        self.assertFalse(drifted_partners().exists())
+
+        imported, drifted = self.partners[1], self.partners[2]
+        adjustment = WalletTransaction.objects.get(partner=drifted, description=ADJUSTMENT_DESCRIPTION)
+        self.assertEqual((adjustment.transaction_type, adjustment.amount), ('Debit', Decimal('50.00')))
+        self.assertEqual(adjustment.balance_after, Decimal('450.00'))
+        imported.refresh_from_db()
+        self.assertEqual(imported.refundable_wallet, Decimal('25000.00'))
+
+
+class WalletStatementTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        self.partner = Partner.objects.create(user=self.user)
+        for day, txn_type, amount in (
+            (date(2025, 1, 10), 'Credit', '1000.00'),
+            (date(2025, 1, 20), 'Debit', '200.00'),
+            (date(2025, 3, 5), 'Credit', '50.00'),
+            (date(2025, 4, 2), 'Debit', '100.00'),
+        ):
+            when = timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=12)
+            post_wallet_entry(self.partner, txn_type, Decimal(amount), transaction_date=when)
+        self.client.login(username='partner1', password='pass1234')
+
+    def download(self, **params):
+        resp = self.client.get(reverse('wallet_statement'), params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        return resp, b''.join(resp.streaming_content)
+
+    def test_postings_maintain_monthly_snapshots(self):
+        snapshots = WalletMonthlySnapshot.objects.filter(partner=self.partner).order_by('month')
+        self.assertEqual(
+            [(s.month, s.opening_balance, s.closing_balance) for s in snapshots],
+            [(date(2025, 1, 1), Decimal('0.00'), Decimal('800.00')),
+             (date(2025, 3, 1), Decimal('800.00'), Decimal('850.00')),
+             (date(2025, 4, 1), Decimal('850.00'), Decimal('750.00'))],
+        )
+
+    def test_backdated_posting_moves_later_balances(self):
+        when = timezone.make_aware(datetime(2025, 2, 14, 12))
+        txn = post_wallet_entry(self.partner, 'Credit', Decimal('25.00'), transaction_date=when)
+        self.assertEqual(txn.balance_after, Decimal('825.00'))
+        self.assertEqual(
+            list(WalletTransaction.objects.order_by('transaction_date', 'id').values_list('balance_after', flat=True)),
+            [Decimal('1000.00'), Decimal('800.00'), Decimal('825.00'), Decimal('875.00'), Decimal('775.00')],
+        )
+        snapshots = WalletMonthlySnapshot.objects.filter(partner=self.partner).order_by('month')
+        self.assertEqual(
+            [(s.month, s.opening_balance, s.closing_balance) for s in snapshots],
+            [(date(2025, 1, 1), Decimal('0.00'), Decimal('800.00')),
+             (date(2025, 2, 1), Decimal('800.00'), Decimal('825.00')),
+             (date(2025, 3, 1), Decimal('825.00'), Decimal('875.00')),
+             (date(2025, 4, 1), Decimal('875.00'), Decimal('775.00'))],
+        )
+
+        # Into a month that already has postings
+        post_wallet_entry(self.partner, 'Debit', Decimal('10.00'), transaction_date=when.replace(month=1, day=15))
+        self.assertEqual(
+            list(snapshots.values_list('closing_balance', flat=True)),
+            [Decimal('790.00'), Decimal('815.00'), Decimal('865.00'), Decimal('765.00')],
+        )
+        self.partner.refresh_from_db()
+        self.assertEqual(self.partner.refundable_wallet, Decimal('765.00'))
+
+        # The incremental upkeep matches a rebuild from the ledger
+        expected = list(snapshots.values_list('month', 'opening_balance', 'closing_balance'))
+        WalletMonthlySnapshot.objects.all().delete()
+        call_command('snapshot_wallets', stdout=StringIO())
+        self.assertEqual(list(snapshots.values_list('month', 'opening_balance', 'closing_balance')), expected)
+
+    def test_csv_statement(self):
+        resp, body = self.download(start='2025-01-15', end='2025-03-31')
+        self.assertIn('attachment;', resp['Content-Disposition'])
+        rows = list(csv.reader(body.decode().splitlines()))
+
+        self.assertEqual(rows[1], ['Opening balance', '1000.00'])
+        self.assertIn(['Feb 2025', '800.00', '800.00'], rows)  # no postings: carried over
+        postings = [row for row in rows if row[:1] and row[0][:2].isdigit()]
+        self.assertEqual([(p[1], p[2], p[3]) for p in postings],
+                         [('Debit', '200.00', '800.00'), ('Credit', '50.00', '850.00')])
+        self.assertEqual(rows[-1], ['Closing balance', '850.00'])
+
+    def test_pdf_statement(self):
+        resp, body = self.download(start='2025-01-01', end='2025-04-30', format='pdf')
+        self.assertEqual(resp['Content-Type'], 'application/pdf')
+        self.assertTrue(body.startswith(b'%PDF'))
+
+    def test_bad_range(self):
+        resp = self.client.get(reverse('wallet_statement'), {'start': '2025-02-01', 'end': '2025-01-01'})
+        self.assertEqual(resp.status_code, 400)
+        # PDFs are built in memory, so they're capped at a year; CSV isn't
+        params = {'start': '2024-04-01', 'end': '2025-04-30'}
+        self.assertEqual(self.client.get(reverse('wallet_statement'), {**params, 'format': 'pdf'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('wallet_statement'), params).status_code, 200)
+        resp = self.client.get(reverse('wallet_statement'), {'start': 'yesterday'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_snapshot_wallets_rebuilds_history(self):
+        expected = list(WalletMonthlySnapshot.objects.order_by('month').values_list(
+            'month', 'opening_balance', 'closing_balance'))
+        WalletMonthlySnapshot.objects.all().delete()
+        call_command('snapshot_wallets', '--batch-size=2', stdout=StringIO())
+        self.assertEqual(list(WalletMonthlySnapshot.objects.order_by('month').values_list(
+            'month', 'opening_balance', 'closing_balance')), expected)
+
+
+class ImportOrdersTests(TestCase):
+    HEADER = ['Partner', 'Asset', 'Location', 'Dispatched Date', 'Serial Number', 'MAC Number']
+
+    def setUp(self):
+        User = get_user_model()
+        Partner.objects.create(user=User.objects.create_user(username='acmenet', password='x'))
+        User.objects.create_user(username='nopartner', password='x')
+        self.router = Asset.objects.create(name='ONT Router', asset_code='ONT-0001')
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write_csv(self, rows, header=None):
+        path = os.path.join(self.dir.name, 'orders.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header or self.HEADER)
+            writer.writerows(rows)
+        return path
+
+    def rows(self, count):
+        return [['Acme Net', 'ONT Router', 'Pune', '05.03.2024', f'SN{n:04d}', f'AA:BB:CC:00:00:{n:02X}']
+                for n in range(count)]
+
+    def test_imports_in_batches(self):
+        path = self.write_csv(self.rows(30) + [
+            ['Acme Net', 'Set Top Box', 'Delhi', 'not a date', '', 'AA:BB:CC:00:01:00'],
+            ['No Partner', 'ONT Router', '', '05.03.2024', 'SN9999', ''],
+            ['Acme Net', 'ONT Router', '', '05.03.2024', 'SN0000', ''],  # repeated serial
+        ])
+        out = StringIO()
+        call_command('import_orders', path, '--batch-size=10', stdout=out)
+
+        self.assertEqual(Order.objects.filter(order_id__startswith='OLD-').count(), 31)
+        self.assertEqual(OrderItem.objects.count(), 31)
+        self.assertEqual(OrderItemSerial.objects.count(), 31)
+        order = Order.objects.get(order_id='OLD-SN0007')
+        self.assertEqual((order.status, order.created_at.date()), ('Completed', date(2024, 3, 5)))
+        self.assertEqual(len(set(Order.objects.values_list('dc_number', flat=True))), 31)
+
+        serial = OrderItemSerial.objects.get(serial_number='AA:BB:CC:00:01:00')  # MAC stands in for the serial
+        self.assertEqual(serial.mac_int, 0xAABBCC000100)
+        self.assertIsNone(serial.model)
+        self.assertEqual(serial.owner.username, 'acmenet')
+        self.assertEqual(serial.order_item.asset.location, 'Delhi')
+        self.router.refresh_from_db()
+        self.assertEqual(self.router.location, 'Pune')
+
+        report = out.getvalue()
+        self.assertIn('rejected: partner not found: 1', report)
+        self.assertIn('serials already present: 1', report)
+        self.assertIn('rows/s', report)
+        self.assertFalse(os.path.exists(f'{path}.import_orders.checkpoint'))
+        with open(f'{path}.import_orders.rejects.csv', encoding='utf-8') as f:
+            rejects = list(csv.DictReader(f))
+        self.assertEqual([(r['line'], r['error'], r['Partner']) for r in rejects],
+                         [('33', 'partner not found', 'No Partner')])
+
+        # Running the same file again changes nothing
+        call_command('import_orders', path, stdout=StringIO())
+        self.assertEqual(OrderItemSerial.objects.count(), 31)
+
+    def test_short_rows_are_counted_not_fatal(self):
+        header = ['Partner', 'Asset', 'Serial Number', 'MAC Number', 'Location', 'Dispatched Date', 'Model']
+        path = self.write_csv([
+            ['Acme Net', 'ONT Router', 'SN0001', 'AA:BB:CC:00:00:01'],  # no location or date
+            ['Acme Net', 'ONT Router'],                                  # no serial either
+            ['Acme Net', 'ONT Router', 'SN0002', '', 'Pune', '05.03.2024', 'HG8145'],
+        ], header=header)
+        out = StringIO()
+        call_command('import_orders', path, stdout=out)
+
+        self.assertEqual(sorted(OrderItemSerial.objects.values_list('serial_number', flat=True)), ['SN0001', 'SN0002'])
+        self.assertEqual(Order.objects.get(order_id='OLD-SN0002').created_at.date(), date(2024, 3, 5))
+        self.assertEqual(OrderItemSerial.objects.get(serial_number='SN0002').model, 'HG8145')
+        self.assertIsNone(OrderItemSerial.objects.get(serial_number='SN0001').model)
+        report = out.getvalue()
+        self.assertIn('invalid dates (imported as now): 1', report)
+        self.assertIn('rejected: no serial or MAC number: 1', report)
+
+    def test_query_count_is_per_batch_not_per_row(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        counts = []
+        for batch_size in (5, 50):
+            Order.objects.all().delete()
+            path = self.write_csv(self.rows(50))
+            with CaptureQueriesContext(connection) as queries:
+                call_command('import_orders', path, f'--batch-size={batch_size}', stdout=StringIO())
+            counts.append(len(queries))
+        self.assertEqual(OrderItemSerial.objects.count(), 50)
+        # 10 batches vs 1: each batch is a fixed handful of queries, whatever its size
+        self.assertLess(counts[1], 20)
+        self.assertLess(counts[0], 10 * 15)
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write_csv(self.rows(5) + [['Acme Net', 'Set Top Box', '', '05.03.2024', 'STB1', '']])
+        out = StringIO()
+        call_command('import_orders', path, '--dry-run', stdout=out)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Asset.objects.count(), 1)
+        self.assertIn('serials created: 6', out.getvalue())
+        self.assertIn('assets created: 1', out.getvalue())
+
+    def test_failed_batch_keeps_new_assets_consistent(self):
+        path = self.write_csv([['Acme Net', 'Set Top Box', 'Delhi', '05.03.2024', 'STB1', '']])
+        with mock.patch.object(OrderItemSerial.objects, 'bulk_create', side_effect=DatabaseError("disk full")):
+            with self.assertRaises(DatabaseError):
+                call_command('import_orders', path, stdout=StringIO())
+        self.assertFalse(Order.objects.exists())
+        # The asset was committed before the batch, so nothing cached points at a rolled-back row
+        stb = Asset.objects.get(name='Set Top Box')
+
+        call_command('import_orders', path, stdout=StringIO())
+        self.assertEqual(OrderItemSerial.objects.get().order_item.asset, stb)
+        self.assertEqual(Asset.objects.filter(name='Set Top Box').count(), 1)
+
+    def test_resume_from_checkpoint(self):
+        path = self.write_csv(self.rows(10))
+        checkpoint = os.path.join(self.dir.name, 'run.checkpoint')
+        # An earlier run committed rows on lines 2-7 before it stopped
+        with open(checkpoint, 'w', encoding='utf-8') as f:
+            f.write(f'{{"file": "{os.path.abspath(path)}", "line": 7}}')
+
+        call_command('import_orders', path, '--resume', f'--checkpoint={checkpoint}', stdout=StringIO())
+        self.assertEqual(sorted(OrderItemSerial.objects.values_list('serial_number', flat=True)),
+                         ['SN0006', 'SN0007', 'SN0008', 'SN0009'])
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+class ImportPartnersTests(TestCase):
+    HEADER = ['FIRM NAME', 'SD AMOUNT', 'PARTNER NAME', 'INVENTORY SHIPPING ADDRESS', 'MOBILE', 'EMAIL']
+
+    def setUp(self):
+        for pk, name in ((1, 'Platinum'), (2, 'Silver'), (3, 'Gold')):
+            PartnerCategory.objects.create(pk=pk, name=name)
+        User = get_user_model()
+        self.existing = Partner.objects.create(
+            user=User.objects.create_user(username='oldfirm', password='keep-me', email='old@firm.in'),
+            phone='9000000000', code='skyplay_1000',
+        )
+        post_wallet_entry(self.existing, 'Credit', Decimal('10000.00'))
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def import_rows(self, rows, *args):
+        path = os.path.join(self.dir.name, 'partners.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.HEADER)
+            writer.writerows(rows)
+        out = StringIO()
+        call_command('import_partners', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_upserts_users_partners_and_deposits(self):
+        rows = [[f'New Firm {n}', '30000', f'Asha Rao {n}', f'{n} MG Road', f'98{n:08d}', ''] for n in range(12)]
+        rows += [
+            ['Old Firm', '60000', 'Ravi Kumar', 'New address', '', 'ravi@firm.in'],
+            ['Broken Firm', 'lots', 'Nobody', '', '', ''],
+        ]
+        report = self.import_rows(rows, '--batch-size=5', '--workers=2')
+
+        new = Partner.objects.select_related('user').get(user__username='newfirm3')
+        self.assertEqual((new.first_name, new.last_name, new.partner_category_id), ('Asha', 'Rao 3', 3))
+        self.assertEqual(new.user.email, 'newfirm3@example.com')
+        self.assertTrue(new.user.check_password('Partner@12345'))
+        self.assertEqual(new.refundable_wallet, Decimal('30000.00'))
+        codes = set(Partner.objects.values_list('code', flat=True))
+        self.assertEqual(len(codes), 13)
+        # Salted per user, even though the password is the same
+        self.assertEqual(len(set(get_user_model().objects.values_list('password', flat=True))), 13)
+
+        self.existing.refresh_from_db()
+        self.existing.user.refresh_from_db()
+        self.assertEqual((self.existing.address, self.existing.phone), ('New address', '9000000000'))
+        self.assertEqual(self.existing.partner_category_id, 1)
+        self.assertEqual(self.existing.user.email, 'ravi@firm.in')
+        self.assertTrue(self.existing.user.check_password('keep-me'))
+        self.assertEqual(self.existing.refundable_wallet, Decimal('60000.00'))
+        self.assertEqual(self.existing.wallet_transactions.count(), 2)
+
+        self.assertIn('rejected: SD AMOUNT is not a whole number: 1', report)
+        self.assertIn('partners created: 12', report)
+
+    def test_new_partner_deposits_are_posted_in_bulk(self):
+        def import_new(prefix, count):
+            rows = [[f'{prefix} {n}', '30000', 'Asha Rao', 'Depot', '', ''] for n in range(count)]
+            with CaptureQueriesContext(connection) as ctx:
+                self.import_rows(rows, '--workers=1')
+            return len(ctx.captured_queries)
+
+        import_new('First Firm', 1)  # creates the partner code counter
+        self.assertEqual(import_new('Small Firm', 2), import_new('Big Firm', 20))
+        new = Partner.objects.get(user__username='bigfirm7')
+        self.assertEqual(new.refundable_wallet, Decimal('30000.00'))
+        txn = new.wallet_transactions.get()
+        self.assertEqual((txn.transaction_type, txn.amount, txn.balance_after), ('Credit', Decimal('30000.00'),
+                                                                               Decimal('30000.00')))
+        snapshot = WalletMonthlySnapshot.objects.get(partner=new)
+        self.assertEqual((snapshot.opening_balance, snapshot.closing_balance), (Decimal('0.00'), Decimal('30000.00')))
+
+    def test_rerun_changes_nothing(self):
+        rows = [['Old Firm', '10000', 'John Doe', 'Depot', '', ''], ['New Firm', '0', 'Asha Rao', 'Depot', '', '']]
+        self.import_rows(rows, '--workers=1')
+        report = self.import_rows(rows, '--workers=1')
+        self.assertNotIn('updated', report)
+        self.assertNotIn('created', report)
+        self.assertEqual(WalletTransaction.objects.count(), 1)
+
+
+class UpdatePartnerEmailPhoneTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.partners = {}
+        for n in range(6):
+            user = User.objects.create_user(username=f'firm{n}', password='x', email=f'firm{n}@old.in', phone='9000000000')
+            self.partners[n] = Partner.objects.create(user=user, phone='9000000000')
+        User.objects.create_user(username='loneuser', password='x')
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'contacts.csv')
+        with open(self.path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['FIRM NAME', 'EMAIL', 'MOBILE'])
+            writer.writerow(['Firm 0', 'firm0@new.in', ''])           # email only
+            writer.writerow(['Firm 1', '', '9111111111'])             # phone only
+            writer.writerow(['Firm 2', 'firm2@new.in', '9222222222'])  # both
+            writer.writerow(['Firm 3', 'firm3@old.in', '9000000000'])  # unchanged
+            writer.writerow(['Ghost Firm', 'ghost@new.in', ''])
+            writer.writerow(['Lone User', 'lone@new.in', ''])
+
+    def test_updates_only_changed_fields(self):
+        Partner.objects.filter(pk=self.partners[2].pk).update(phone='9222222222')  # partner already right
+        out = StringIO()
+        # One preload, the savepoint pair, and one UPDATE per changed-column set:
+        # users (email), (phone), (email, phone); partners (phone)
+        with self.assertNumQueries(1 + 2 + 4):
+            call_command('update_partner_email_phone', self.path, stdout=out)
+
+        User = get_user_model()
+        self.assertEqual(User.objects.get(username='firm0').email, 'firm0@new.in')
+        self.assertEqual(User.objects.get(username='firm0').phone, '9000000000')
+        self.assertEqual(User.objects.get(username='firm1').phone, '9111111111')
+        self.assertEqual(Partner.objects.get(user__username='firm1').phone, '9111111111')
+        self.assertEqual(User.objects.get(username='firm2').email, 'firm2@new.in')
+        self.assertEqual(User.objects.get(username='firm2').phone, '9222222222')
+
+        report = out.getvalue()
+        self.assertIn('emails changed: 2', report)
+        self.assertIn('phone numbers changed: 2', report)
+        self.assertIn('partners already correct: 1', report)
+        with open(f'{self.path}.update_partner_email_phone.rejects.csv', encoding='utf-8') as f:
+            rejects = [(r['FIRM NAME'], r['error']) for r in csv.DictReader(f)]
+        self.assertEqual(rejects, [('Ghost Firm', 'user not found'), ('Lone User', 'partner entry missing')])
+
+    def test_dry_run_saves_nothing(self):
+        out = StringIO()
+        with self.assertNumQueries(1):
+            call_command('update_partner_email_phone', self.path, '--dry-run', stdout=out)
+        self.assertIn('emails changed: 2', out.getvalue())
+        self.assertIn('Dry run', out.getvalue())
+        self.assertEqual(get_user_model().objects.get(username='firm0').email, 'firm0@old.in')
+
+
+class ZmLoginDetailsTests(TestCase):
+    HEADER = ['Name', 'User Id', 'Password', 'Official Email ID', 'Mobile Number', 'Designation']
+
+    def setUp(self):
+        self.api = FakeZeptoMail().start()
+        self.addCleanup(self.api.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'zm.csv')
+
+    def send(self, recipients, *args):
+        with open(self.path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.HEADER)
+            writer.writerows(recipients)
+        out = StringIO()
+        with self.settings(**self.api.settings()):
+            call_command('zm_login_details', self.path, '--backoff=0.01', '--rate=0', *args, stdout=out)
+        return out.getvalue()
+
+    def results(self):
+        with open(f'{self.path}.zm_login_details.results.csv', encoding='utf-8') as f:
+            return {row['email']: row for row in csv.DictReader(f)}
+
+    def users(self, count):
+        return [[f'User {n}', f'zm{n}', f'pw{n}', f'zm{n}@example.com', '', ''] for n in range(count)]
+
+    def test_sends_concurrently_over_kept_alive_connections(self):
+        self.api.delay = 0.05
+        started = time.monotonic()
+        report = self.send(self.users(24), '--workers=6', '--rate=0')
+        # 24 sends of 50ms each would take 1.2s one at a time
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertIn('emails sent: 24', report)
+        self.assertEqual(sorted(self.api.recipients()), sorted(f'zm{n}@example.com' for n in range(24)))
+        self.assertLessEqual(self.api.connections, 6)
+
+        message = next(m for m in self.api.messages if m['to'][0]['email_address']['address'] == 'zm3@example.com')
+        self.assertIn('Hi User 3,', message['textbody'])
+        self.assertIn('Password: pw3', message['textbody'])
+        self.assertEqual(len(message['cc']), 3)
+        self.assertEqual({r['status'] for r in self.results().values()}, {'sent'})
+
+    def test_rate_limit(self):
+        started = time.monotonic()
+        self.send(self.users(6), '--workers=6', '--rate=20')
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)  # 6 calls, 50ms apart
+        times = sorted(t for t, *_ in self.api.requests)
+        self.assertGreaterEqual(times[-1] - times[0], 0.2)
+
+    def test_retries_transient_failures(self):
+        self.api.fail_next = 2
+        self.api.throttle_next = 1
+        report = self.send(self.users(4), '--workers=2', '--retries=3')
+        self.assertIn('emails sent: 4', report)
+        self.assertEqual(len(self.api.messages), 4)
+        # Each 500 or 429 costs exactly one extra attempt
+        self.assertEqual(sum(int(r['attempts']) for r in self.results().values()), 4 + 3)
+
+    def test_refused_and_skipped_recipients(self):
+        self.api.refuse = {'zm1@example.com'}
+        report = self.send(self.users(3) + [['No Mail', 'zm9', 'pw9', '', '', '']])
+
+        self.assertIn('emails sent: 2', report)
+        self.assertIn('rejected: send failed: 1', report)
+        self.assertIn('rejected: no email: 1', report)
+        results = self.results()
+        self.assertEqual(results['zm1@example.com']['status'], 'failed')
+        self.assertEqual(results['zm1@example.com']['attempts'], '1')  # a refusal isn't retried
+        self.assertIn('422', results['zm1@example.com']['error'])
+        self.assertEqual(results['']['status'], 'skipped')
+        with open(f'{self.path}.zm_login_details.results.csv', encoding='utf-8') as f:
+            self.assertNotIn('pw', f.read())
+        # Failed rows land in the reject file, without their passwords
+        with open(f'{self.path}.zm_login_details.rejects.csv', encoding='utf-8') as f:
+            rejects = list(csv.DictReader(f))
+        self.assertEqual([r['Official Email ID'] for r in rejects], ['', 'zm1@example.com'])
+        self.assertEqual([r['User Id'] for r in rejects], ['zm9', 'zm1'])
+        self.assertNotIn('Password', rejects[0])
+
+    def test_gives_up_after_retries(self):
+        self.api.fail_next = 10
+        report = self.send(self.users(1), '--retries=2')
+        self.assertIn('rejected: send failed: 1', report)
+        self.assertEqual(self.results()['zm0@example.com']['attempts'], '3')
+        self.assertEqual(self.api.messages, [])
+
+    def test_unexpected_errors_fail_the_row_not_the_batch(self):
+        real_payload = zeptomail_backend.message_payload
+
+        def payload(message):
+            if message.to == ['zm1@example.com']:
+                raise ValueError("unencodable body")
+            return real_payload(message)
+
+        with mock.patch('accounts.zeptomail_backend.message_payload', side_effect=payload):
+            report = self.send(self.users(3), '--retries=3')
+        self.assertIn('emails sent: 2', report)
+        self.assertIn('rejected: send failed: 1', report)
+        result = self.results()['zm1@example.com']
+        self.assertEqual((result['status'], result['attempts']), ('failed', '1'))
+        self.assertEqual(result['error'], 'ValueError: unencodable body')
 
-# Create your tests here.
+    def test_dry_run_sends_nothing(self):
+        report = self.send(self.users(3), '--dry-run')
+        self.assertIn('emails rendered: 3', report)
+        self.assertEqual(self.api.requests, [])
@@ -3,5 +3,6 @@ from . import views
 
 urlpatterns = [
    path('wallet/', views.wallet_view, name='wallet'),
+   path('wallet/statement/', views.wallet_statement, name='wallet_statement'),
 
 ]
@@ -0,0 +1,287 @@
+# partner/utils.py
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.utils import decode_cursor, encode_cursor, max_numeric_suffix, reserve_sequence
+from asset.models import Asset, CartItem
+from order.models import OrderItem
+from .models import Partner, PartnerAssetLimit, PartnerCategoryAssetLimit, WalletMonthlySnapshot, WalletTransaction
+
+# Orders in these states don't count towards a partner's lifetime quantity
+EXCLUDED_ORDER_STATUSES = ['Cancelled', 'Failed']
+
+
+def asset_limits_queryset(partner, asset_ids=None):
+    """
+    Annotate every asset with the partner's effective limit, lifetime ordered
+    quantity and current cart quantity in a single query.
+
+    The effective limit is resolved as partner override > partner category
+    default > ``Asset.max_order_per_partner``. A limit of 0/None means "no limit".
+    """
+    partner_limit = PartnerAssetLimit.objects.filter(
+        partner=partner, asset=OuterRef('pk')
+    ).values('max_purchase_limit')[:1]
+
+    if partner.partner_category_id:
+        category_limit = Subquery(
+            PartnerCategoryAssetLimit.objects.filter(
+                partner_category_id=partner.partner_category_id, asset=OuterRef('pk')
+            ).order_by().values('default_limit')[:1],
+            output_field=IntegerField(),
+        )
+    else:
+        category_limit = Value(None, output_field=IntegerField())
+
+    ordered_qty = (
+        OrderItem.objects.filter(order__user_id=partner.user_id, asset=OuterRef('pk'))
+        .exclude(order__status__in=EXCLUDED_ORDER_STATUSES)
+        .order_by()
+        .values('asset')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    cart_qty = CartItem.objects.filter(
+        cart__user_id=partner.user_id, asset=OuterRef('pk')
+    ).values('quantity')[:1]
+
+    assets = Asset.objects.all()
+    if asset_ids is not None:
+        assets = assets.filter(pk__in=asset_ids)
+
+    return assets.annotate(
+        max_limit=Coalesce(
+            Subquery(partner_limit, output_field=IntegerField()),
+            category_limit,
+            'max_order_per_partner',
+            output_field=IntegerField(),
+        ),
+        ordered_qty=Coalesce(Subquery(ordered_qty, output_field=IntegerField()), 0),
+        cart_qty=Coalesce(Subquery(cart_qty, output_field=IntegerField()), 0),
+    ).order_by('id')
+
+
+def get_asset_limits(partner, asset_ids=None):
+    """
+    Return ``{asset_id: {...}}`` with the effective limit, lifetime ordered
+    quantity, cart quantity and remaining quota of each asset for ``partner``.
+
+    ``remaining`` is None when the asset has no limit.
+    """
+    limits = {}
+    for asset in asset_limits_queryset(partner, asset_ids):
+        max_limit = asset.max_limit or 0
+        remaining = None
+        if max_limit:
+            remaining = max(max_limit - asset.ordered_qty - asset.cart_qty, 0)
+
+        limits[asset.id] = {
+            "asset": asset,
+            "max_limit": max_limit,
+            "ordered_qty": asset.ordered_qty,
+            "cart_qty": asset.cart_qty,
+            "remaining": remaining,
+        }
+    return limits
+
+
+def get_asset_limit(partner, asset_id):
+    """Resolve the limits of a single asset; raises ``Asset.DoesNotExist`` if missing."""
+    asset_id = int(asset_id)
+    limits = get_asset_limits(partner, asset_ids=[asset_id])
+    if asset_id not in limits:
+        raise Asset.DoesNotExist
+    return limits[asset_id]
+
+
+# ---------------------- PARTNER CODES ----------------------
+
+def _last_partner_code_number():
+    codes = Partner.objects.filter(code__startswith='skyplay_').values_list('code', flat=True)
+    # Codes have always started at skyplay_1000
+    return max_numeric_suffix(codes.iterator(), prefix='skyplay_') or 999
+
+
+def next_partner_codes(count=1):
+    """Reserve ``count`` partner codes (skyplay_1000, skyplay_1001, ...)."""
+    return [f"skyplay_{n}" for n in reserve_sequence('partner_code', count, initial=_last_partner_code_number)]
+
+
+# ---------------------- WALLET ----------------------
+# Every change to Partner.refundable_wallet goes through post_wallet_entry:
+# the balance is moved with an F() UPDATE (which also row-locks the partner
+# until commit), then the new balance is read back and stored on the
+# WalletTransaction. Concurrent postings therefore queue on the partner row
+# and each ledger row carries the exact running balance after it.
+
+WALLET_PAGE_SIZE = 25
+
+
+def signed_wallet_total(transactions):
+    """Net effect of ``transactions`` on the balance (credits minus debits), in one aggregate."""
+    money = DecimalField(max_digits=14, decimal_places=2)
+    amount = Coalesce(F("amount"), Value(0), output_field=money)
+    signed = Case(When(transaction_type="Debit", then=-amount), default=amount, output_field=money)
+    return transactions.aggregate(total=Sum(signed))["total"] or Decimal("0.00")
+
+
+def post_wallet_entry(partner, transaction_type, amount, description="", order=None, transaction_date=None):
+    """
+    Post a Credit or Debit to a partner's wallet and return the new
+    ``WalletTransaction`` (its ``balance_after`` is the running balance at
+    its date). A backdated posting also moves the running balance of every
+    later posting and the snapshots of its month and every later one.
+    """
+    if transaction_type not in ("Credit", "Debit"):
+        raise ValueError(f"Unknown wallet transaction type: {transaction_type}")
+    if amount <= 0:
+        raise ValueError("Wallet amounts must be positive.")
+
+    delta = amount if transaction_type == "Credit" else -amount
+    with transaction.atomic():
+        Partner.objects.filter(pk=partner.pk).update(
+            refundable_wallet=Coalesce(F("refundable_wallet"), Value(0), output_field=DecimalField()) + delta
+        )
+        balance = Partner.objects.filter(pk=partner.pk).values_list("refundable_wallet", flat=True).get()
+        partner.refundable_wallet = balance
+
+        transaction_date = transaction_date or timezone.now()
+        later = WalletTransaction.objects.filter(partner=partner, transaction_date__gt=transaction_date)
+        backdated = later.update(balance_after=F("balance_after") + delta) > 0
+        balance_after = balance - signed_wallet_total(later) if backdated else balance
+        record_wallet_snapshot(partner, transaction_date, balance_after, delta, backdated=backdated)
+
+        return WalletTransaction.objects.create(
+            partner=partner,
+            order=order,
+            transaction_type=transaction_type,
+            amount=amount,
+            description=description,
+            transaction_date=transaction_date,
+            balance_after=balance_after,
+        )
+
+
+def post_opening_deposits(deposits, transaction_date=None):
+    """
+    Credit the first deposit of several partners that have no ledger rows
+    yet (e.g. partners created by an import) in three queries, however many
+    there are: one bulk_create of the WalletTransactions, one of their
+    month's snapshots and one bulk_update of ``refundable_wallet``.
+    ``deposits`` is a list of ``(partner, amount, description)``. Partners
+    with earlier postings must go through post_wallet_entry instead.
+    """
+    if not deposits:
+        return []
+    transaction_date = transaction_date or timezone.now()
+    month = timezone.localtime(transaction_date).date().replace(day=1)
+    for partner, amount, _ in deposits:
+        if amount <= 0:
+            raise ValueError("Wallet amounts must be positive.")
+        partner.refundable_wallet = Decimal(amount)
+
+    with transaction.atomic():
+        transactions = WalletTransaction.objects.bulk_create([
+            WalletTransaction(
+                partner=partner,
+                transaction_type="Credit",
+                amount=amount,
+                description=description,
+                transaction_date=transaction_date,
+                balance_after=partner.refundable_wallet,
+            )
+            for partner, amount, description in deposits
+        ])
+        WalletMonthlySnapshot.objects.bulk_create([
+            WalletMonthlySnapshot(
+                partner=partner, month=month, opening_balance=0, closing_balance=partner.refundable_wallet,
+            )
+            for partner, _, _ in deposits
+        ])
+        Partner.objects.bulk_update([partner for partner, _, _ in deposits], ["refundable_wallet"])
+    return transactions
+
+
+def record_wallet_snapshot(partner, when, balance, delta, backdated=False):
+    """
+    Move the closing balance of ``when``'s month to ``balance`` (one UPDATE),
+    creating the month's snapshot on its first posting. For a ``backdated``
+    posting the month's closing and every later month's balances shift by
+    ``delta`` instead. Runs under the partner row lock taken by post_wallet_entry.
+    """
+    month = timezone.localtime(when).date().replace(day=1)
+    now = timezone.now()
+    snapshots = WalletMonthlySnapshot.objects.filter(partner=partner)
+    if backdated:
+        snapshots.filter(month__gt=month).update(
+            opening_balance=F("opening_balance") + delta, closing_balance=F("closing_balance") + delta, updated_at=now,
+        )
+        closing = F("closing_balance") + delta
+    else:
+        closing = balance
+    updated = snapshots.filter(month=month).update(closing_balance=closing, updated_at=now)
+    if not updated:
+        # The month's first posting, so ``balance`` is also its closing balance
+        WalletMonthlySnapshot.objects.create(
+            partner=partner, month=month, opening_balance=balance - delta, closing_balance=balance,
+        )
+
+
+def credit_refundable_deposit(order):
+    """
+    Credit the partner's refundable wallet with the deposit value of the
+    refundable assets in ``order``. Call once, when the order becomes Paid,
+    inside the same transaction. Returns the credited amount (0 if none).
+    """
+    partner = Partner.objects.filter(user_id=order.user_id).first()
+    if partner is None:
+        return 0
+
+    refundable_total = (
+        OrderItem.objects.filter(order=order, asset__is_refundable_wallet_deposit=True)
+        .aggregate(total=Sum(F('quantity') * F('asset__purchase_price'),
+                             output_field=DecimalField(max_digits=12, decimal_places=2)))['total']
+    ) or 0
+    if refundable_total <= 0:
+        return 0
+
+    post_wallet_entry(
+        partner, "Credit", refundable_total,
+        description=f"Refundable wallet credit for Order {order.order_id}",
+        order=order,
+    )
+    return refundable_total
+
+
+def encode_wallet_cursor(txn):
+    return encode_cursor(txn.transaction_date, txn.id)
+
+
+def decode_wallet_cursor(cursor):
+    """Return ``(transaction_date, id)`` from a cursor; raises ValueError if it is malformed."""
+    return decode_cursor(cursor, datetime, int)
+
+
+def get_wallet_page(partner, cursor=None, limit=WALLET_PAGE_SIZE):
+    """
+    One page of a partner's wallet history, newest first, using keyset
+    pagination on ``(transaction_date, id)`` (served by
+    partner_wallet_history_idx). Returns ``(transactions, next_cursor)``.
+    """
+    qs = (
+        WalletTransaction.objects.filter(partner=partner)
+        .select_related("order")
+        .order_by("-transaction_date", "-id")
+    )
+    if cursor:
+        date, txn_id = decode_wallet_cursor(cursor)
+        qs = qs.filter(Q(transaction_date__lt=date) | Q(transaction_date=date, id__lt=txn_id))
+
+    rows = list(qs[:limit + 1])
+    next_cursor = encode_wallet_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
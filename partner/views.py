@@ -1,26 +1,65 @@
-from django.shortcuts import render, get_object_or_404
+from datetime import date
+
+from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
 
-from asset.models import CartItem,Cart
 from .models import Partner, WalletTransaction
+from .statements import MAX_PDF_STATEMENT_DAYS, stream_statement_csv, stream_statement_pdf
+from .utils import get_wallet_page
 
 @login_required
 def wallet_view(request):
     """
-    Show the partner's refundable wallet and transaction history.
+    Show the partner's refundable wallet and transaction history,
+    one keyset page at a time (``?before=<cursor>`` for older entries).
     """
     partner = get_object_or_404(Partner, user=request.user)
-    transactions = partner.wallet_transactions.all().order_by('-transaction_date')
-
-    cart = Cart.objects.filter(user=request.user).first()
-    cart_count = 0
-
-    if cart:
-        cart_count = cart_items = CartItem.objects.filter(cart=cart).count()
+    try:
+        transactions, next_cursor = get_wallet_page(partner, cursor=request.GET.get('before'))
+    except ValueError:
+        return redirect('wallet')
 
     context = {
         'partner': partner,
         'transactions': transactions,
-        'cart_count':cart_count,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('before'),
     }
     return render(request, 'partner/wallet.html', context)
+
+
+@login_required
+def wallet_statement(request):
+    """
+    Download a wallet statement for ``?start=YYYY-MM-DD&end=YYYY-MM-DD`` as
+    CSV (default) or ``?format=pdf`` (at most MAX_PDF_STATEMENT_DAYS).
+    Staff can pass ``?partner=<id>``.
+    """
+    if request.user.is_staff and request.GET.get('partner'):
+        partner = get_object_or_404(Partner.objects.select_related('user'), pk=request.GET['partner'])
+    else:
+        partner = get_object_or_404(Partner.objects.select_related('user'), user=request.user)
+
+    today = timezone.localdate()
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else today.replace(day=1)
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else today
+    except ValueError:
+        return HttpResponseBadRequest("Dates must be in YYYY-MM-DD format.")
+    if start > end:
+        return HttpResponseBadRequest("Start date must be on or before the end date.")
+
+    filename = f"wallet_statement_{partner.user.username}_{start:%Y%m%d}_{end:%Y%m%d}"
+    if request.GET.get('format') == 'pdf':
+        if (end - start).days >= MAX_PDF_STATEMENT_DAYS:
+            return HttpResponseBadRequest(
+                f"PDF statements cover at most {MAX_PDF_STATEMENT_DAYS} days; download a CSV for longer ranges."
+            )
+        response = StreamingHttpResponse(stream_statement_pdf(partner, start, end), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
+    else:
+        response = StreamingHttpResponse(stream_statement_csv(partner, start, end), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
@@ -74,6 +74,14 @@ LOGOUT_REDIRECT_URL = 'login'
 
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET')
+# Secret set on the Razorpay dashboard webhook (order/razorpay/webhook/)
+RAZORPAY_WEBHOOK_SECRET = config('RAZORPAY_WEBHOOK_SECRET', default='')
+# Shared gateway client (order/payments.py): keep-alive pool and (connect, read) timeouts
+RAZORPAY_BASE_URL = config('RAZORPAY_BASE_URL', default='https://api.razorpay.com')
+RAZORPAY_TIMEOUT = (3.05, 10)
+RAZORPAY_POOL_SIZE = 10
+# Create Razorpay orders from the process_payment_intents worker instead of the checkout request
+RAZORPAY_DEFERRED_ORDERS = config('RAZORPAY_DEFERRED_ORDERS', default=False, cast=bool)
 
 TEMPLATES = [
     {
@@ -86,6 +94,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'asset.context_processors.cart',
             ],
         },
     },
@@ -149,6 +158,31 @@ DATABASES = {
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by every gunicorn worker on the host (counters, cross-worker state)
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+}
+
+# Partner home catalog snapshot (see asset/utils.py)
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_STATS_CACHE_ALIAS = 'shared'
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+CATALOG_VERSION_FILE = BASE_DIR / 'cache' / 'catalog.version'
+
+# Per-user cart badge summary (see asset/context_processors.py)
+CART_CACHE_ALIAS = 'shared'
+CART_CACHE_TIMEOUT = 60 * 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
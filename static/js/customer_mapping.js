@@ -1,6 +1,5 @@
 document.addEventListener("DOMContentLoaded", () => {
   const modal = document.getElementById("mapModal");
-  const openButtons = document.querySelectorAll(".open-map-modal");
   const cancelBtn = document.getElementById("cancelMap");
   const confirmBtn = document.getElementById("confirmMap");
   const searchBtn = document.getElementById("btnSearch");
@@ -15,16 +14,16 @@ document.addEventListener("DOMContentLoaded", () => {
   let selectedSerialId = null;
   let selectedCustomer = null;
 
-  // ✅ Open modal
-  openButtons.forEach((btn) => {
-    btn.addEventListener("click", () => {
-      selectedSerialId = btn.dataset.serial;
-      modal.classList.remove("hidden");
-      customerCard.classList.add("hidden");
-      confirmBtn.classList.add("hidden");
-      searchStatus.textContent = "";
-      searchInput.value = "";
-    });
+  // ✅ Open modal (delegated, so rows loaded later by serial_table.js work too)
+  document.addEventListener("click", (e) => {
+    const btn = e.target.closest(".open-map-modal");
+    if (!btn) return;
+    selectedSerialId = btn.dataset.serial;
+    modal.classList.remove("hidden");
+    customerCard.classList.add("hidden");
+    confirmBtn.classList.add("hidden");
+    searchStatus.textContent = "";
+    searchInput.value = "";
   });
 
   // ✅ Close modal
@@ -0,0 +1,138 @@
+// Server-side paging / filtering for the customer asset mapping serial table.
+// The page renders the first page; further pages come from customer_serials_api.
+document.addEventListener("DOMContentLoaded", () => {
+  const tableBody = document.getElementById("assetTableBody");
+  const cardContainer = document.getElementById("assetCardContainer");
+  const loadMoreBtn = document.getElementById("loadMoreSerials");
+  const searchInput = document.getElementById("assetSearch");
+  const paymentFilter = document.getElementById("filterPayment");
+  const assetFilter = document.getElementById("filterAsset");
+  const mappedFilter = document.getElementById("filterMapped");
+
+  if (!tableBody || !loadMoreBtn) return;
+
+  const apiUrl = loadMoreBtn.dataset.url;
+  let nextCursor = loadMoreBtn.dataset.next || null;
+  let requestId = 0;
+
+  const CHECK_ICON = '<svg xmlns="http://www.w3.org/2000/svg" class="w-4 h-4 text-white" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="2"><path stroke-linecap="round" stroke-linejoin="round" d="M5 13l4 4L19 7" /></svg>';
+  const PLUS_ICON = '<svg xmlns="http://www.w3.org/2000/svg" class="w-4 h-4 text-white" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="2"><path stroke-linecap="round" stroke-linejoin="round" d="M12 4v16m8-8H4" /></svg>';
+  const DASH = '<span class="text-gray-400">—</span>';
+
+  const esc = (value) =>
+    String(value ?? "").replace(/[&<>"']/g, (c) => ({
+      "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;",
+    })[c]);
+
+  function rowHtml(s) {
+    const mapped = Boolean(s.customer);
+    const action = mapped
+      ? `<button class="px-3 py-1 rounded-lg bg-gray-400 text-white text-sm flex items-center justify-center gap-1 cursor-not-allowed" disabled>${CHECK_ICON} Mapped</button>`
+      : `<button type="button" class="open-map-modal px-3 py-1 rounded-lg bg-green-600 hover:bg-green-700 text-white text-sm flex items-center gap-1 justify-center transition" data-serial="${s.id}">${PLUS_ICON} Map</button>`;
+    return `
+      <tr class="hover:bg-gray-50 transition" data-payment="Paid" data-mapped="${mapped ? "Mapped" : "Unmapped"}">
+        <td class="p-3">${esc(s.order_id)}</td>
+        <td class="p-3">${esc(s.asset)}</td>
+        <td class="p-3 font-mono text-sm">${esc(s.serial)}</td>
+        <td class="p-3 font-mono text-sm">${s.mac ? esc(s.mac) : "—"}</td>
+        <td class="p-3">${s.make ? esc(s.make) : "—"}</td>
+        <td class="p-3">${s.model ? esc(s.model) : "—"}</td>
+        <td class="p-3">${mapped ? `${esc(s.customer)} (${esc(s.phone)})` : DASH}</td>
+        <td class="p-3">${s.skyid ? esc(s.skyid) : DASH}</td>
+        <td class="p-3">Paid</td>
+        <td class="p-3 text-sm">${mapped ? esc(s.mapped_at) : DASH}</td>
+        <td class="p-3 text-sm">${s.mapped_by ? esc(s.mapped_by) : DASH}</td>
+        <td class="p-3 flex align-center justify-content-center text-center">${action}</td>
+      </tr>`;
+  }
+
+  function cardHtml(s) {
+    const mapped = Boolean(s.customer);
+    const action = mapped
+      ? `<button class="w-full py-2 rounded-lg bg-gray-400 text-white text-sm flex items-center justify-center gap-2 cursor-not-allowed" disabled>${CHECK_ICON} Mapped</button>`
+      : `<button type="button" class="open-map-modal w-full py-2 rounded-lg bg-green-600 hover:bg-green-700 text-white text-sm flex items-center justify-center gap-2 transition" data-serial="${s.id}">${PLUS_ICON} Map Customer</button>`;
+    return `
+      <div class="bg-gray-50 border border-gray-200 rounded-xl shadow-sm p-4 flex flex-col gap-2" data-payment="Paid" data-mapped="${mapped ? "Mapped" : "Unmapped"}">
+        <div class="flex justify-between items-center">
+          <span class="font-semibold text-gray-800">${esc(s.asset)}</span>
+          <span class="text-xs px-2 py-1 rounded-full ${mapped ? "bg-green-100 text-green-700" : "bg-gray-200 text-gray-600"}">${mapped ? "Mapped" : "Unmapped"}</span>
+        </div>
+        <p class="text-sm text-gray-600">Order ID: <span class="font-medium">${esc(s.order_id)}</span></p>
+        <p class="text-sm text-gray-600">Serial: <span class="font-mono">${esc(s.serial)}</span></p>
+        <p class="text-sm text-gray-600">Mac: <span class="font-mono">${esc(s.mac)}</span></p>
+        <p class="text-sm text-gray-600">Make: <span class="font-mono">${esc(s.make)}</span></p>
+        <p class="text-sm text-gray-600">Model: <span class="font-mono">${esc(s.model)}</span></p>
+        <p class="text-sm text-gray-600">Customer: ${mapped ? `<span class="font-medium">${esc(s.customer)}</span>` : "—"}</p>
+        <p class="text-sm text-gray-600">Sky ID: ${s.skyid ? esc(s.skyid) : "—"}</p>
+        <p class="text-sm text-gray-600">Payment: Paid</p>
+        <p class="text-xs text-gray-500">Assigned: ${mapped ? esc(s.mapped_at) : "—"}</p>
+        <div class="mt-2">${action}</div>
+      </div>`;
+  }
+
+  function currentParams(extra = {}) {
+    const params = new URLSearchParams();
+    const q = searchInput ? searchInput.value.trim() : "";
+    if (q) params.set("q", q);
+    if (assetFilter && assetFilter.value) params.set("asset", assetFilter.value);
+    if (mappedFilter && mappedFilter.value) params.set("status", mappedFilter.value);
+    Object.entries(extra).forEach(([key, value]) => value && params.set(key, value));
+    return params;
+  }
+
+  // Payment status isn't part of the API; filter the loaded rows client-side.
+  function applyPaymentFilter() {
+    const paymentValue = paymentFilter ? paymentFilter.value : "";
+    document.querySelectorAll("#assetTableBody tr, #assetCardContainer > div").forEach((row) => {
+      const payment = row.dataset.payment || "";
+      row.style.display = !paymentValue || payment.includes(paymentValue) ? "" : "none";
+    });
+  }
+
+  async function fetchPage(params, append) {
+    const thisRequest = ++requestId;
+    loadMoreBtn.disabled = true;
+    try {
+      const response = await fetch(`${apiUrl}?${params.toString()}`);
+      const data = await response.json();
+      if (thisRequest !== requestId) return; // a newer filter change won
+
+      const rows = data.results || [];
+      if (!append) {
+        tableBody.innerHTML = rows.length ? "" : '<tr><td colspan="12" class="text-center p-6 text-gray-500">No assets available for mapping.</td></tr>';
+        cardContainer.innerHTML = rows.length ? "" : '<p class="text-gray-500 text-center col-span-full py-6">No assets found.</p>';
+      }
+      tableBody.insertAdjacentHTML("beforeend", rows.map(rowHtml).join(""));
+      cardContainer.insertAdjacentHTML("beforeend", rows.map(cardHtml).join(""));
+
+      nextCursor = data.next;
+      loadMoreBtn.classList.toggle("hidden", !nextCursor);
+      applyPaymentFilter();
+    } catch (err) {
+      console.error(err);
+      showToast("Failed to load serials!", "error");
+    } finally {
+      loadMoreBtn.disabled = false;
+    }
+  }
+
+  // Reload from the first page; `overrides` can preset the search box.
+  window.reloadSerials = (overrides = {}) => {
+    if (overrides.q !== undefined && searchInput) searchInput.value = overrides.q;
+    return fetchPage(currentParams(), false);
+  };
+
+  loadMoreBtn.addEventListener("click", () => {
+    if (nextCursor) fetchPage(currentParams({ cursor: nextCursor }), true);
+  });
+
+  let searchTimer = null;
+  if (searchInput) {
+    searchInput.addEventListener("input", () => {
+      clearTimeout(searchTimer);
+      searchTimer = setTimeout(() => window.reloadSerials(), 300);
+    });
+  }
+  [assetFilter, mappedFilter].forEach((el) => el && el.addEventListener("change", () => window.reloadSerials()));
+  if (paymentFilter) paymentFilter.addEventListener("input", applyPaymentFilter);
+});
@@ -0,0 +1,233 @@
+# store/packing_lists.py
+import codecs
+import csv
+import os
+import zipfile
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from order.models import Order, OrderItem, OrderItemSerial
+from .utils import needs_serials_expression
+
+# ---------------------- PACKING LIST UPLOADS ----------------------
+# Vendor packing lists (CSV or XLSX) assign serials to order items in bulk.
+# The file is read as a stream of rows; validation then runs set-based: one
+# lookup for serials that already exist, one for the orders, and one lock +
+# one grouped count for the items' remaining capacity, each chunked at
+# LOOKUP_CHUNK_SIZE keys. Nothing is written unless every row is valid, so
+# a rejected file can be fixed and uploaded again as a whole.
+
+LOOKUP_CHUNK_SIZE = 2000
+INSERT_BATCH_SIZE = 1000
+
+# Accepted header spellings for each field (compared lowercased, without spaces/underscores/dots)
+PACKING_LIST_COLUMNS = {
+    "order": ("order", "orderid", "orderno", "dc", "dcnumber", "dcno"),
+    "asset": ("asset", "assetcode", "assetname", "item", "product"),
+    "serial_number": ("serial", "serialnumber", "serialno", "sn"),
+    "make": ("make", "brand"),
+    "model": ("model",),
+    "mac_id": ("mac", "macid", "macaddress", "macnumber"),
+}
+REQUIRED_COLUMNS = ("order", "asset", "serial_number")
+
+
+class PackingListError(ValueError):
+    """The file can't be read as a packing list at all (wrong type, not CSV/XLSX inside, missing columns)."""
+
+
+def _normalise_header(value):
+    return "".join(ch for ch in str(value or "").lower() if ch not in " _.-#")
+
+
+def _cell(value):
+    # XLSX cells come back typed: 1234.0 should read as "1234"
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() if value is not None else ""
+
+
+def _column_map(header):
+    aliases = {alias: field for field, names in PACKING_LIST_COLUMNS.items() for alias in names}
+    columns = {}
+    for index, name in enumerate(header):
+        field = aliases.get(_normalise_header(name))
+        if field and field not in columns.values():
+            columns[index] = field
+    missing = [f for f in REQUIRED_COLUMNS if f not in columns.values()]
+    if missing:
+        raise PackingListError(f"Missing column(s): {', '.join(missing)}.")
+    return columns
+
+
+def _rows(lines):
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None:
+        raise PackingListError("The file is empty.")
+    columns = _column_map(header)
+    for line_no, values in enumerate(lines, start=2):
+        row = {field: _cell(values[i]) if i < len(values) else "" for i, field in columns.items()}
+        if any(row.values()):
+            yield line_no, row
+
+
+def read_csv_rows(uploaded):
+    """Yield ``(line_no, row)`` from an uploaded CSV, decoding it line by line."""
+    try:
+        yield from _rows(csv.reader(codecs.iterdecode(uploaded, "utf-8-sig")))
+    except UnicodeDecodeError:
+        raise PackingListError("The file isn't UTF-8 text; save it as \"CSV UTF-8\" and upload it again.")
+    except csv.Error as e:
+        raise PackingListError(f"The file can't be read as CSV ({e}).")
+
+
+def read_xlsx_rows(uploaded):
+    """Yield ``(line_no, row)`` from the first sheet of an uploaded XLSX (read-only mode)."""
+    try:
+        import openpyxl
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise PackingListError("XLSX uploads need openpyxl installed; upload a CSV instead.")
+
+    uploaded.seek(0)
+    try:
+        workbook = openpyxl.load_workbook(uploaded, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        # KeyError: a zip that lacks the workbook parts
+        raise PackingListError("The file isn't a valid XLSX workbook.")
+    try:
+        yield from _rows(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def read_packing_list(uploaded):
+    extension = os.path.splitext(uploaded.name)[1].lower()
+    if extension == ".csv":
+        return read_csv_rows(uploaded)
+    if extension in (".xlsx", ".xlsm"):
+        return read_xlsx_rows(uploaded)
+    raise PackingListError("Upload a .csv or .xlsx file.")
+
+
+def _chunks(values, size=LOOKUP_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def import_packing_list(rows, dry_run=False):
+    """
+    Validate ``rows`` (``(line_no, row)`` pairs) and, if every row is valid and
+    this isn't a dry run, create the serials. Returns ``{"rows", "valid",
+    "created", "orders", "errors"}`` where ``errors`` is a list of
+    ``{"row", "serial_number", "error"}``.
+    """
+    errors, parsed, seen = [], [], {}
+
+    def reject(line_no, row, message):
+        errors.append({"row": line_no, "serial_number": row.get("serial_number", ""), "error": message})
+
+    total = 0
+    for line_no, row in rows:
+        total += 1
+        missing = [f for f in REQUIRED_COLUMNS if not row.get(f)]
+        if missing:
+            reject(line_no, row, f"Missing {', '.join(missing)}")
+        elif row["serial_number"] in seen:
+            reject(line_no, row, f"Duplicate of row {seen[row['serial_number']]}")
+        else:
+            seen[row["serial_number"]] = line_no
+            parsed.append((line_no, row))
+
+    existing = set()
+    for chunk in _chunks(seen):
+        existing.update(
+            OrderItemSerial.objects.filter(serial_number__in=chunk).values_list("serial_number", flat=True)
+        )
+
+    orders, owners = {}, {}
+    for chunk in _chunks({row["order"] for _, row in parsed}):
+        for pk, order_id, dc_number, user_id in Order.objects.filter(
+            Q(order_id__in=chunk) | Q(dc_number__in=chunk)
+        ).values_list("pk", "order_id", "dc_number", "user_id"):
+            orders[order_id] = pk
+            owners[pk] = user_id
+            if dc_number:
+                orders.setdefault(dc_number, pk)
+
+    touched, to_create = set(), []
+    with transaction.atomic():
+        order_pks = set(orders.values())
+        items = []
+        for chunk in _chunks(order_pks):
+            items.extend(
+                OrderItem.objects.select_for_update(of=("self",))
+                .filter(order_id__in=chunk)
+                .select_related("asset")
+                .order_by("id")
+            )
+        counts = {}
+        for chunk in _chunks(order_pks):
+            counts.update(
+                OrderItemSerial.objects.filter(order_item__order_id__in=chunk)
+                .values("order_item").annotate(n=Count("pk")).values_list("order_item", "n")
+            )
+
+        # (order pk, asset code or name) -> items; remaining capacity per item
+        items_by_key, capacity = {}, {}
+        for item in items:
+            capacity[item.pk] = item.quantity - counts.get(item.pk, 0)
+            for key in {item.asset.asset_code, item.asset.name}:
+                if key:
+                    items_by_key.setdefault((item.order_id, key.lower()), []).append(item)
+
+        for line_no, row in parsed:
+            order_pk = orders.get(row["order"])
+            if row["serial_number"] in existing:
+                reject(line_no, row, "Serial already exists")
+                continue
+            if order_pk is None:
+                reject(line_no, row, f"Unknown order {row['order']}")
+                continue
+            candidates = items_by_key.get((order_pk, row["asset"].lower()))
+            if not candidates:
+                reject(line_no, row, f"Order {row['order']} has no {row['asset']}")
+                continue
+            item = next((i for i in candidates if capacity[i.pk] > 0), None)
+            if item is None:
+                reject(line_no, row, f"Order {row['order']} already has every {row['asset']} serial")
+                continue
+
+            capacity[item.pk] -= 1
+            touched.add(order_pk)
+            serial = OrderItemSerial(
+                order_item=item,
+                serial_number=row["serial_number"],
+                make=row.get("make") or None,
+                model=row.get("model") or None,
+                mac_id=row.get("mac_id") or None,
+                owner_id=owners[order_pk],
+            )
+            serial.sync_mac()
+            to_create.append(serial)
+
+        if not errors and not dry_run:
+            OrderItemSerial.objects.bulk_create(to_create, batch_size=INSERT_BATCH_SIZE)
+            # Same rule as update_serials: complete orders move to "Serial Updated"
+            for chunk in _chunks(touched):
+                Order.objects.filter(pk__in=chunk).exclude(status="Completed").exclude(
+                    needs_serials_expression()
+                ).update(status="Serial Updated")
+
+    errors.sort(key=lambda e: e["row"])
+    written = not errors and not dry_run
+    return {
+        "rows": total,
+        "created": len(to_create) if written else 0,
+        "valid": len(to_create),
+        "orders": len(touched),
+        "errors": errors,
+    }
@@ -1,3 +1,428 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from asset.models import Asset
+from customermapping.models import CustomerAssetMapping
+from order.macs import format_mac, parse_mac, parse_mac_range
+from order.models import Order, OrderItem, OrderItemSerial, OrderShipment
+from partner.models import Partner
+from .packing_lists import import_packing_list
+from .utils import (
+    SerialConflict, get_store_orders_page, lookup_serials, order_serials_complete, save_item_serials, serial_lookup_row,
+    serials_in_mac_block,
+)
+
+
+class StoreOrderQueueTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.store_user = User.objects.create_user(username='store', password='pass1234')
+        self.partner_user = User.objects.create_user(username='partner1', password='pass1234')
+        Partner.objects.create(user=self.partner_user, code='skyplay_1000')
+        other = User.objects.create_user(username='partner2', password='pass1234')
+        self.ont = Asset.objects.create(name='ONT', asset_code='ONT-0001')
+
+        now = timezone.now()
+        self.orders = []
+        for n, (user, status) in enumerate([
+            (self.partner_user, 'Paid'), (self.partner_user, 'Paid'), (self.partner_user, 'Completed'),
+            (other, 'Paid'), (other, 'Pending'), (other, 'Serial Updated'),
+        ]):
+            order = Order.objects.create(user=user, order_id=f'ORD{n}', status=status)
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=n))
+            item = OrderItem.objects.create(order=order, asset=self.ont, quantity=2)
+            # Even orders get both serials, odd ones only one
+            for i in range(2 if n % 2 == 0 else 1):
+                OrderItemSerial.objects.create(order_item=item, serial_number=f'SN-{n}-{i}')
+            self.orders.append(order)
+        OrderShipment.objects.create(order=self.orders[0], shipping_status=1)
+
+        self.client.login(username='store', password='pass1234')
+
+    def test_annotations(self):
+        orders, next_cursor, facets = get_store_orders_page()
+        self.assertIsNone(next_cursor)
+        self.assertEqual([o.id for o in orders], [o.id for o in self.orders])
+
+        first, second = orders[0], orders[1]
+        self.assertFalse(first.needs_serials)
+        self.assertEqual(first.shipment_status_label, 'In Transit')
+        self.assertTrue(second.needs_serials)
+        item = second.orderitem_set.all()[0]
+        self.assertEqual((item.serial_count, item.serials_missing, item.asset.name), (1, 1, 'ONT'))
+        self.assertEqual(facets, {'All': 6, 'Pending': 1, 'Paid': 3, 'Failed': 0, 'Cancelled': 0,
+                                  'Completed': 1, 'Serial Updated': 1})
+
+    def test_filters_and_facets(self):
+        _, _, facets = get_store_orders_page(needs_serials=True)
+        self.assertEqual((facets['All'], facets['Paid'], facets['Pending']), (3, 2, 0))
+
+        orders, _, facets = get_store_orders_page(status='Paid', user_id=self.partner_user.id)
+        self.assertEqual([o.order_id for o in orders], ['ORD0', 'ORD1'])
+        self.assertEqual(facets['All'], 3)  # facets ignore the status filter
+
+        today = timezone.localdate()
+        orders, _, _ = get_store_orders_page(start=today - timedelta(days=2), end=today - timedelta(days=1))
+        self.assertEqual([o.order_id for o in orders], ['ORD1', 'ORD2'])
+
+        resp = self.client.get(reverse('store_orders'), {'partner': 'skyplay_1000'})
+        self.assertEqual(resp.context['facets']['All'], 3)
+        resp = self.client.get(reverse('store_orders'), {'partner': 'nobody'})
+        self.assertEqual(resp.context['orders'], [])
+
+    def test_keyset_pages(self):
+        seen, cursor = [], None
+        while True:
+            orders, cursor, _ = get_store_orders_page(cursor=cursor, limit=4)
+            seen.extend(o.id for o in orders)
+            if not cursor:
+                break
+        self.assertEqual(seen, [o.id for o in self.orders])
+
+    def test_query_count_does_not_grow_with_page(self):
+        # orders, items, serials, facets
+        with self.assertNumQueries(4):
+            orders, _, _ = get_store_orders_page()
+            for order in orders:
+                for item in order.orderitem_set.all():
+                    list(item.serials.all())
+                    item.asset.name
+                order.user.get_full_name()
+
+        for n in range(6, 10):
+            order = Order.objects.create(user=self.partner_user, order_id=f'ORD{n}')
+            item = OrderItem.objects.create(order=order, asset=self.ont, quantity=3)
+            OrderItemSerial.objects.create(order_item=item, serial_number=f'SN-{n}')
+        with self.assertNumQueries(4):
+            get_store_orders_page()
+
+        resp = self.client.get(reverse('store_orders'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'Serials missing')
+
+
+class SerialUpdateTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        ont = Asset.objects.create(name='ONT', asset_code='ONT-0001')
+        self.order = Order.objects.create(user=self.user, order_id='ORD1', status='Paid')
+        self.item = OrderItem.objects.create(order=self.order, asset=ont, quantity=3)
+        OrderItem.objects.create(order=self.order, asset=ont, quantity=1)
+        self.kept = OrderItemSerial.objects.create(order_item=self.item, serial_number='SN-1')
+        self.edited = OrderItemSerial.objects.create(order_item=self.item, serial_number='SN-2')
+        self.removed = OrderItemSerial.objects.create(order_item=self.item, serial_number='SN-3')
+        self.mapping = CustomerAssetMapping.objects.create(order_serial=self.kept, customer_name='Cust')
+
+    def test_diff_keeps_unchanged_rows(self):
+        created_at = self.kept.created_at
+        result = save_item_serials(self.item, [
+            {'id': self.kept.id, 'serial_number': 'SN-1', 'make': None, 'model': None, 'mac_id': None},
+            {'id': self.edited.id, 'serial_number': 'SN-2B', 'make': 'Acme', 'model': None, 'mac_id': None},
+            {'id': None, 'serial_number': 'SN-4', 'make': None, 'model': None, 'mac_id': None},
+        ])
+        self.assertEqual(result, {'created': 1, 'updated': 1, 'deleted': 1})
+
+        self.kept.refresh_from_db()
+        self.assertEqual(self.kept.created_at, created_at)
+        self.assertTrue(CustomerAssetMapping.objects.filter(pk=self.mapping.pk).exists())
+        self.assertEqual(OrderItemSerial.objects.get(pk=self.edited.pk).serial_number, 'SN-2B')
+        self.assertFalse(OrderItemSerial.objects.filter(pk=self.removed.pk).exists())
+        self.assertEqual(sorted(self.item.serials.values_list('serial_number', flat=True)), ['SN-1', 'SN-2B', 'SN-4'])
+        self.assertEqual(OrderItemSerial.objects.get(serial_number='SN-4').owner, self.user)
+
+    def test_swapped_serial_numbers_are_renamed_in_two_phases(self):
+        result = save_item_serials(self.item, [
+            {'id': self.kept.id, 'serial_number': 'SN-2', 'make': None, 'model': None, 'mac_id': None},
+            {'id': self.edited.id, 'serial_number': 'SN-3', 'make': None, 'model': None, 'mac_id': None},
+            {'id': self.removed.id, 'serial_number': 'SN-1', 'make': None, 'model': None, 'mac_id': None},
+            {'id': None, 'serial_number': 'SN-4', 'make': None, 'model': None, 'mac_id': None},
+        ])
+        self.assertEqual(result, {'created': 1, 'updated': 3, 'deleted': 0})
+        self.assertEqual(
+            dict(self.item.serials.values_list('pk', 'serial_number')),
+            {self.kept.pk: 'SN-2', self.edited.pk: 'SN-3', self.removed.pk: 'SN-1',
+             self.item.serials.get(serial_number='SN-4').pk: 'SN-4'},
+        )
+        self.assertTrue(CustomerAssetMapping.objects.filter(pk=self.mapping.pk, order_serial=self.kept).exists())
+
+    def test_rows_without_ids_match_by_serial_number(self):
+        rows = [{'serial_number': s, 'make': None, 'model': None, 'mac_id': None} for s in ('SN-3', 'SN-1', 'SN-2')]
+        self.assertEqual(save_item_serials(self.item, rows), {'created': 0, 'updated': 0, 'deleted': 0})
+
+    def test_view_updates_status_when_complete(self):
+        url = reverse('update_serials', args=[self.item.id])
+        data = {
+            'serial_id': [self.kept.id, self.edited.id, self.removed.id],
+            'serial_numbers': ['SN-1', 'SN-2', 'SN-3'],
+            'make': ['', '', ''], 'model': ['', '', ''], 'mac_id': ['', '', ''],
+        }
+        self.client.post(url, data)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'Paid')  # the second item has no serial yet
+        self.assertTrue(CustomerAssetMapping.objects.filter(pk=self.mapping.pk).exists())
+
+        other = self.order.orderitem_set.exclude(pk=self.item.pk).get()
+        self.assertFalse(order_serials_complete(self.order.id))
+        self.client.post(reverse('update_serials', args=[other.id]), {
+            'serial_id': [''], 'serial_numbers': ['SN-9'], 'make': [''], 'model': [''], 'mac_id': [''],
+        })
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'Serial Updated')
+
+    def test_view_reports_a_serial_taken_meanwhile(self):
+        # The unique constraint catches an insert that slipped in after save_item_serials' check
+        with mock.patch('store.views.save_item_serials', side_effect=IntegrityError):
+            response = self.client.post(reverse('update_serials', args=[self.item.id]), {
+                'serial_id': [''], 'serial_numbers': ['SN-9'], 'make': [''], 'model': [''], 'mac_id': [''],
+            }, follow=True)
+        self.assertIn('registered by someone else meanwhile', str(list(response.context['messages'])[0]))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'Paid')
+
+
+class PackingListUploadTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='partner1', password='pass1234')
+        self.ont = Asset.objects.create(name='ONT', asset_code='ONT-0001')
+        self.stb = Asset.objects.create(name='Set Top Box', asset_code='STB-0001')
+        self.order = Order.objects.create(user=self.user, order_id='ORD1', status='Paid')
+        self.ont_item = OrderItem.objects.create(order=self.order, asset=self.ont, quantity=3)
+        self.stb_item = OrderItem.objects.create(order=self.order, asset=self.stb, quantity=1)
+        OrderItemSerial.objects.create(order_item=self.ont_item, serial_number='SN-OLD')
+        User.objects.create_user(username='store', password='pass1234', user_type='store')
+        self.client.login(username='store', password='pass1234')
+        self.url = reverse('upload_serials')
+
+    def upload(self, text, name='packing.csv', **data):
+        return self.client.post(self.url, dict(data, packing_list=SimpleUploadedFile(name, text.encode('utf-8-sig'))))
+
+    def test_valid_file_assigns_serials(self):
+        resp = self.upload(
+            'Order,Asset,Serial Number,Make,MAC Address\n'
+            f'ORD1,ONT-0001,SN-1,Acme,AA:BB:CC:00:00:01\n'
+            f'{self.order.dc_number},ont,SN-2,,\n'
+            'ORD1,Set Top Box,SN-3,,\n'
+        )
+        result = resp.context['result']
+        self.assertEqual((result['rows'], result['created'], result['errors']), (3, 3, []))
+        self.assertEqual(self.ont_item.serials.count(), 3)
+        self.assertEqual(OrderItemSerial.objects.get(serial_number='SN-1').mac_id, 'AA:BB:CC:00:00:01')
+        self.assertEqual(OrderItemSerial.objects.get(serial_number='SN-1').owner, self.user)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'Serial Updated')
+
+    def test_errors_are_reported_per_row_and_nothing_is_saved(self):
+        resp = self.upload(
+            'order,asset,serial\n'
+            'ORD1,ONT,SN-1\n'
+            'ORD1,ONT,SN-1\n'        # duplicate in file
+            'ORD1,ONT,SN-OLD\n'      # already exists
+            'ORD9,ONT,SN-9\n'        # unknown order
+            'ORD1,Router,SN-10\n'    # not in the order
+            'ORD1,ONT,SN-11\n'
+            'ORD1,ONT,SN-12\n'       # over quantity
+            'ORD1,,SN-13\n'
+        )
+        errors = {e['row']: e['error'] for e in resp.context['result']['errors']}
+        self.assertEqual(sorted(errors), [3, 4, 5, 6, 8, 9])
+        self.assertEqual(errors[3], 'Duplicate of row 2')
+        self.assertEqual(errors[4], 'Serial already exists')
+        self.assertIn('already has every ONT serial', errors[8])
+        self.assertEqual(OrderItemSerial.objects.count(), 1)
+
+    def test_dry_run_and_bad_files(self):
+        resp = self.upload('Order,Asset,Serial\nORD1,ONT,SN-1\n', dry_run='1')
+        self.assertEqual(resp.context['result']['valid'], 1)
+        self.assertEqual(OrderItemSerial.objects.count(), 1)
+
+        resp = self.upload('Order,Serial\nORD1,SN-1\n')
+        self.assertIsNone(resp.context['result'])
+        self.assertContains(resp, 'Missing column(s): asset')
+        resp = self.upload('whatever', name='packing.pdf')
+        self.assertContains(resp, 'Upload a .csv or .xlsx file.')
+
+    def test_garbage_uploads_are_reported_not_raised(self):
+        garbage = bytes(range(256)) * 4
+        for name, content, message in (
+            ('packing.csv', 'Order,Asset,Serial\nORD1,ONT,SN-1\n'.encode('utf-16'), "isn&#x27;t UTF-8 text"),
+            ('packing.csv', b'Order,Asset,Serial\nORD1,ONT,' + b'9' * 200000 + b'\n', "can&#x27;t be read as CSV"),
+            ('packing.xlsx', garbage, 'XLSX'),  # not a zip (or openpyxl missing): either way a message
+        ):
+            resp = self.client.post(self.url, {'packing_list': SimpleUploadedFile(name, content)})
+            self.assertEqual(resp.status_code, 200)
+            self.assertIsNone(resp.context['result'])
+            self.assertContains(resp, message)
+        self.assertEqual(OrderItemSerial.objects.count(), 1)
+
+    def test_only_store_users_can_upload(self):
+        csv_text = 'Order,Asset,Serial\nORD1,ONT,SN-1\n'
+        self.client.logout()
+        resp = self.upload(csv_text)
+        self.assertEqual(resp.status_code, 302)
+        self.assertIn(reverse('login'), resp['Location'])
+
+        self.client.login(username='partner1', password='pass1234')
+        self.assertEqual(self.upload(csv_text).status_code, 403)
+        self.assertEqual(OrderItemSerial.objects.count(), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'Paid')
+
+    def test_large_file_uses_fixed_queries(self):
+        order = Order.objects.create(user=self.user, order_id='BIG')
+        item = OrderItem.objects.create(order=order, asset=self.ont, quantity=5000)
+        rows = ((n, {'order': 'BIG', 'asset': 'ONT', 'serial_number': f'BULK-{n}'}) for n in range(2, 5002))
+        with CaptureQueriesContext(connection) as ctx:
+            result = import_packing_list(rows)
+        # 3 serial lookups, order lookup, item lock, serial counts, status update, savepoint pair;
+        # the INSERT batches depend on the backend's parameter limit
+        other = [q for q in ctx.captured_queries if not q['sql'].startswith('INSERT')]
+        self.assertEqual(len(other), 9)
+        self.assertEqual(result['created'], 5000)
+        self.assertEqual(item.serials.count(), 5000)
+
+
+class SerialRegistryTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.store_user = User.objects.create_user(username='store', password='pass1234', user_type='store')
+        self.partner_user = User.objects.create_user(username='partner1', password='pass1234', first_name='Ravi')
+        Partner.objects.create(user=self.partner_user, code='skyplay_1000', phone='9876543210')
+        ont = Asset.objects.create(name='ONT', asset_code='ONT-0001')
+        self.order = Order.objects.create(user=self.partner_user, order_id='ORD1', status='Completed')
+        self.item = OrderItem.objects.create(order=self.order, asset=ont, quantity=3)
+        self.serial = OrderItemSerial.objects.create(order_item=self.item, serial_number='ZTEG1234', mac_id='AA:BB:CC:00:00:01')
+        OrderItemSerial.objects.create(order_item=self.item, serial_number='ZTEG1299')
+        OrderShipment.objects.create(order=self.order, shipping_status=2, courier_name='BlueDart')
+        CustomerAssetMapping.objects.create(order_serial=self.serial, customer_name='Old', phone='1')
+        CustomerAssetMapping.objects.create(order_serial=self.serial, customer_name='Asha', phone='9000000001')
+        self.url = reverse('serial_lookup')
+
+    def test_serial_numbers_are_unique(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OrderItemSerial.objects.create(order_item=self.item, serial_number='ZTEG1234')
+
+        other = OrderItem.objects.create(order=self.order, asset=self.item.asset, quantity=1)
+        with self.assertRaisesMessage(SerialConflict, 'Already registered to another order: ZTEG1234'):
+            save_item_serials(other, [{'serial_number': 'ZTEG1234', 'make': None, 'model': None, 'mac_id': None}])
+        with self.assertRaisesMessage(SerialConflict, 'entered twice: X1'):
+            save_item_serials(other, [{'serial_number': 'X1', 'make': None, 'model': None, 'mac_id': None}] * 2)
+
+    def test_exact_lookup_is_one_query(self):
+        with self.assertNumQueries(1):
+            serials = lookup_serials('ZTEG1234')
+        row = serial_lookup_row(serials[0])
+        self.assertEqual(row['order']['order_id'], 'ORD1')
+        self.assertEqual(row['partner'], {'username': 'partner1', 'name': 'Ravi', 'code': 'skyplay_1000',
+                                          'phone': '9876543210'})
+        self.assertEqual((row['shipment']['status'], row['shipment']['courier']), ('Delivered', 'BlueDart'))
+        self.assertEqual(row['customer']['name'], 'Asha')
+
+    def test_prefix_and_mac_lookup(self):
+        self.client.login(username='store', password='pass1234')
+        data = self.client.get(self.url, {'q': 'zteg12'}).json()
+        self.assertEqual([r['serial_number'] for r in data['results']], ['ZTEG1234', 'ZTEG1299'])
+        data = self.client.get(self.url, {'q': 'AA:BB:CC:00:00:01'}).json()
+        self.assertEqual([r['serial_number'] for r in data['results']], ['ZTEG1234'])
+        data = self.client.get(self.url, {'q': 'ZT'}).json()
+        self.assertEqual(data['results'], [])  # too short for a prefix search
+
+    def test_partners_cannot_look_up(self):
+        self.client.login(username='partner1', password='pass1234')
+        self.assertEqual(self.client.get(self.url, {'q': 'ZTEG1234'}).status_code, 403)
+
+
+class MacAddressTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.store_user = User.objects.create_user(username='store', password='pass1234', user_type='store')
+        user = User.objects.create_user(username='partner1', password='pass1234')
+        ont = Asset.objects.create(name='ONT', asset_code='ONT-0001')
+        order = Order.objects.create(user=user, order_id='ORD1')
+        self.item = OrderItem.objects.create(order=order, asset=ont, quantity=10)
+        self.serials = [
+            OrderItemSerial.objects.create(order_item=self.item, serial_number=f'SN-{n}', mac_id=mac)
+            for n, mac in enumerate([
+                'AA:BB:CC:00:00:01', 'aa-bb-cc-00-00-ff', 'aabb.cc00.1000', 'AABBCD000000', 'not a mac',
+            ])
+        ]
+
+    def test_parsing(self):
+        self.assertEqual(parse_mac('aa-bb-cc-dd-ee-ff'), 0xAABBCCDDEEFF)
+        self.assertEqual(parse_mac('AABB.CCDD.EEFF'), 0xAABBCCDDEEFF)
+        self.assertIsNone(parse_mac('AA:BB:CC'))
+        self.assertEqual(format_mac(0xAABBCC000001), 'AA:BB:CC:00:00:01')
+
+        self.assertEqual(parse_mac_range('AA:BB:CC'), (0xAABBCC000000, 0xAABBCCFFFFFF))
+        self.assertEqual(parse_mac_range('AA:BB:CC:00:00:00/40'), (0xAABBCC000000, 0xAABBCC0000FF))
+        self.assertEqual(parse_mac_range('AA:BB:CC:00:00:10..aa-bb-cc-00-00-20'), (0xAABBCC000010, 0xAABBCC000020))
+        for bad in ('', 'ZZ:ZZ', 'AA:BB:CC:00:00:00/49', 'AA:BB:CC:00:00:20..AA:BB:CC:00:00:10'):
+            with self.assertRaises(ValueError):
+                parse_mac_range(bad)
+
+    def test_mac_int_kept_in_sync(self):
+        self.assertEqual(self.serials[1].mac_int, 0xAABBCC0000FF)
+        self.assertEqual(self.serials[1].mac_id, 'aa-bb-cc-00-00-ff')  # display form kept
+        self.assertIsNone(self.serials[4].mac_int)
+
+        save_item_serials(self.item, [
+            {'id': s.id, 'serial_number': s.serial_number, 'make': None, 'model': None,
+             'mac_id': 'AA:BB:CC:00:00:02' if n == 0 else s.mac_id}
+            for n, s in enumerate(self.serials)
+        ])
+        self.assertEqual(OrderItemSerial.objects.get(pk=self.serials[0].pk).mac_int, 0xAABBCC000002)
+
+    def test_block_queries(self):
+        low, high = parse_mac_range('AA:BB:C0:00:00:00/20')
+        seen, after = [], None
+        while True:
+            serials, after = serials_in_mac_block(low, high, after=after, limit=2)
+            seen.extend(s.serial_number for s in serials)
+            if after is None:
+                break
+        self.assertEqual(seen, ['SN-0', 'SN-1', 'SN-2', 'SN-3'])
+
+        # The same MAC on several serials, across a page boundary
+        twins = [OrderItemSerial.objects.create(order_item=self.item, serial_number=f'TWIN-{n}',
+                                                mac_id='AA:BB:C0:00:00:01') for n in range(3)]
+        seen, after = [], None
+        while True:
+            serials, after = serials_in_mac_block(low, high, after=after, limit=2)
+            seen.extend(s.serial_number for s in serials)
+            if after is None:
+                break
+        self.assertEqual(sorted(seen), sorted(['SN-0', 'SN-1', 'SN-2', 'SN-3'] + [t.serial_number for t in twins]))
+        self.assertEqual(len(seen), len(set(seen)))
+
+        self.client.login(username='store', password='pass1234')
+        url = reverse('serial_lookup')
+        data = self.client.get(url, {'block': 'AA:BB:CC'}).json()
+        self.assertEqual(data['block'], ['AA:BB:CC:00:00:00', 'AA:BB:CC:FF:FF:FF'])
+        self.assertEqual([r['serial_number'] for r in data['results']], ['SN-0', 'SN-1', 'SN-2'])
+        self.assertIsNone(data['next'])
+        self.assertEqual(self.client.get(url, {'block': 'nonsense'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'block': 'AA:BB:CC', 'after': 'nonsense'}).status_code, 400)
+
+        data = self.client.get(url, {'q': 'aabbcc000001'}).json()
+        self.assertEqual([r['mac'] for r in data['results']], ['AA:BB:CC:00:00:01'])
 
-# Create your tests here.
+    def test_backfill_command(self):
+        OrderItemSerial.objects.update(mac_int=None)
+        OrderItemSerial.objects.filter(pk=self.serials[0].pk).update(model='AA:BB:CC:00:00:01')
+        out = StringIO()
+        call_command('backfill_mac_addresses', '--batch-size=2', '--clear-model-copies', stdout=out)
+        self.assertIn('Set mac_int on 4 serial(s)', out.getvalue())
+        self.assertIn('1 serial(s) have a mac_id', out.getvalue())
+        self.assertEqual(OrderItemSerial.objects.get(pk=self.serials[2].pk).mac_int, 0xAABBCC001000)
+        self.assertIsNone(OrderItemSerial.objects.get(pk=self.serials[0].pk).model)
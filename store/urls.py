@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('store_orders/', views.store_orders, name='store_orders'),
     path('orders/update_serials/<int:item_id>/', views.update_serials, name='update_serials'),
+    path('orders/upload_serials/', views.upload_serials, name='upload_serials'),
+    path('serials/lookup/', views.serial_lookup, name='serial_lookup'),
     path('orders/mark_completed/<int:order_id>/', views.mark_order_completed, name='mark_order_completed'),
     path('orders/<int:order_id>/add-shipment/', views.add_shipment, name='add_shipment'),
     path('store_order_detail/<int:order_id>/', views.store_order_detail, name='store_order_detail'),
@@ -0,0 +1,327 @@
+# store/utils.py
+import uuid
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from customermapping.models import CustomerAssetMapping
+from order.macs import format_mac, parse_mac
+from order.models import Order, OrderItem, OrderItemSerial
+from order.utils import SHIPMENT_STATUS_LABELS, decode_order_cursor, encode_order_cursor
+
+# ---------------------- STORE ORDER QUEUE ----------------------
+# The queue page is a fixed handful of queries whatever the page holds: the
+# orders (with user and shipment joined), their items (with asset and serial
+# counts annotated), the items' serials, and one aggregate for the status
+# facets. Pages are keyset-paged on (created_at, id) like the partner list.
+
+STORE_ORDERS_PAGE_SIZE = 10
+# 'Serial Updated' is set by update_serials but isn't one of Order.STATUS_CHOICES
+QUEUE_STATUSES = [status for status, _ in Order.STATUS_CHOICES] + ["Serial Updated"]
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def needs_serials_expression():
+    """True when any item of the order has fewer serials than its quantity."""
+    return Exists(
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .annotate(n=Count("serials"))
+        .filter(quantity__gt=F("n"))
+    )
+
+
+def store_order_queryset():
+    """Every order with ``needs_serials`` annotated; items and serials prefetched."""
+    items = (
+        OrderItem.objects.select_related("asset")
+        .annotate(
+            serial_count=Count("serials"),
+            serials_missing=Greatest(F("quantity") - Count("serials"), Value(0)),
+        )
+        .order_by("id")
+    )
+    return (
+        Order.objects.select_related("user", "shipment")
+        .annotate(needs_serials=needs_serials_expression())
+        .prefetch_related(
+            Prefetch("orderitem_set", queryset=items),
+            Prefetch("orderitem_set__serials", queryset=OrderItemSerial.objects.order_by("id")),
+        )
+    )
+
+
+def resolve_partner_user_id(value):
+    """User id for a partner username or partner code, or ``None`` if there is no such partner."""
+    return (
+        get_user_model().objects.filter(Q(username=value) | Q(partner__code=value))
+        .values_list("id", flat=True)
+        .first()
+    )
+
+
+def filter_store_orders(qs, start=None, end=None, user_id=None, needs_serials=False):
+    """Apply every queue filter except status (which the facets are counted across)."""
+    # Plain datetime bounds (not created_at__date) so the created_at indexes apply
+    if start:
+        qs = qs.filter(created_at__gte=_start_of_day(start))
+    if end:
+        qs = qs.filter(created_at__lt=_start_of_day(end + timedelta(days=1)))
+    if user_id is not None:
+        qs = qs.filter(user_id=user_id)
+    if needs_serials:
+        qs = qs.filter(needs_serials_expression())
+    return qs
+
+
+def status_facets(qs):
+    """``{status: count}`` for every queue status plus ``"All"``, from one aggregate."""
+    # Aliases can't contain spaces ("Serial Updated"), so count under positional names
+    counts = qs.aggregate(
+        all=Count("pk"),
+        **{f"status_{i}": Count("pk", filter=Q(status=status)) for i, status in enumerate(QUEUE_STATUSES)},
+    )
+    facets = {"All": counts["all"]}
+    facets.update((status, counts[f"status_{i}"]) for i, status in enumerate(QUEUE_STATUSES))
+    return facets
+
+
+def get_store_orders_page(status=None, start=None, end=None, user_id=None, needs_serials=False,
+                          cursor=None, limit=STORE_ORDERS_PAGE_SIZE):
+    """
+    One page of the store queue, newest first, plus the status facets for
+    the other filters. Returns ``(orders, next_cursor, facets)``.
+    """
+    facets = status_facets(filter_store_orders(
+        Order.objects.all(), start=start, end=end, user_id=user_id, needs_serials=needs_serials,
+    ))
+
+    orders = filter_store_orders(
+        store_order_queryset(), start=start, end=end, user_id=user_id, needs_serials=needs_serials,
+    ).order_by("-created_at", "-id")
+    if status:
+        orders = orders.filter(status=status)
+    if cursor:
+        created, last_id = decode_order_cursor(cursor)
+        orders = orders.filter(Q(created_at__lt=created) | Q(created_at=created, id__lt=last_id))
+
+    orders = list(orders[:limit + 1])
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    orders = orders[:limit]
+    for order in orders:
+        shipment = getattr(order, "shipment", None)
+        order.shipment_status_label = SHIPMENT_STATUS_LABELS[shipment.shipping_status] if shipment else "Not shipped"
+    return orders, next_cursor, facets
+
+
+# ---------------------- SERIAL UPDATES ----------------------
+# Serials are edited in place: rows the store kept are updated (so their
+# created_at and any customer mapping survive), new rows are inserted and
+# only rows that were removed from the form are deleted. Renamed rows first
+# move to a temporary unique serial number, so numbers can be swapped or
+# shifted between rows without tripping the unique index mid-update.
+
+SERIAL_FIELDS = ("serial_number", "make", "model", "mac_id")
+
+
+class SerialConflict(ValueError):
+    """Posted serial numbers repeat each other or already belong to another order item."""
+
+
+def save_item_serials(item, rows):
+    """
+    Make ``item``'s serials match ``rows``, a list of dicts with an optional
+    ``id`` plus SERIAL_FIELDS. Rows without an id are matched to an existing
+    serial with the same serial number before a new one is created.
+    Returns ``{"created": n, "updated": n, "deleted": n}``; raises
+    ``SerialConflict`` without writing anything if a serial number is repeated
+    or registered to another item.
+    """
+    numbers = [row["serial_number"] for row in rows]
+    repeated = sorted({n for n in numbers if numbers.count(n) > 1})
+    if repeated:
+        raise SerialConflict(f"Serial numbers entered twice: {', '.join(repeated)}")
+
+    with transaction.atomic():
+        taken = sorted(
+            OrderItemSerial.objects.filter(serial_number__in=numbers)
+            .exclude(order_item=item)
+            .values_list("serial_number", flat=True)
+        )
+        if taken:
+            raise SerialConflict(f"Already registered to another order: {', '.join(taken)}")
+
+        existing = {s.id: s for s in OrderItemSerial.objects.select_for_update().filter(order_item=item)}
+        by_number = {s.serial_number: s for s in existing.values()}
+        kept, to_update, renamed, to_create = set(), [], [], []
+
+        for row in rows:
+            serial = existing.get(row.get("id"))
+            if serial is None or serial.id in kept:
+                serial = by_number.get(row["serial_number"])
+                if serial is not None and serial.id in kept:
+                    serial = None
+            if serial is None:
+                serial = OrderItemSerial(order_item=item, **{f: row[f] for f in SERIAL_FIELDS})
+                serial.sync_mac()
+                to_create.append(serial)
+                continue
+
+            kept.add(serial.id)
+            if any(getattr(serial, f) != row[f] for f in SERIAL_FIELDS):
+                if serial.serial_number != row["serial_number"]:
+                    renamed.append(serial)
+                for f in SERIAL_FIELDS:
+                    setattr(serial, f, row[f])
+                serial.sync_mac()
+                to_update.append(serial)
+
+        removed = [pk for pk in existing if pk not in kept]
+        if removed:
+            OrderItemSerial.objects.filter(pk__in=removed).delete()
+        if renamed:
+            OrderItemSerial.objects.bulk_update(
+                [OrderItemSerial(pk=s.pk, serial_number=f"~renaming~{s.pk}~{uuid.uuid4().hex}") for s in renamed],
+                ["serial_number"],
+            )
+        if to_update:
+            OrderItemSerial.objects.bulk_update(to_update, [*SERIAL_FIELDS, "mac_int"])
+        if to_create:
+            owner_id = Order.objects.filter(pk=item.order_id).values_list("user_id", flat=True).get()
+            for serial in to_create:
+                serial.owner_id = owner_id
+            OrderItemSerial.objects.bulk_create(to_create)
+
+    return {"created": len(to_create), "updated": len(to_update), "deleted": len(removed)}
+
+
+def order_serials_complete(order_id):
+    """True when every item of the order has at least ``quantity`` serials (one query)."""
+    return not OrderItem.objects.filter(order_id=order_id).annotate(
+        n=Count("serials")
+    ).filter(quantity__gt=F("n")).exists()
+
+
+# ---------------------- SERIAL LOOKUP ----------------------
+# "Who holds this device?" Every answer comes from one query: the serial row
+# (found through its unique index, or a prefix range on the pattern_ops
+# indexes) joined to its item, asset, order, partner and shipment, with the
+# latest customer mapping pulled in as correlated subqueries.
+
+SERIAL_LOOKUP_LIMIT = 20
+MIN_PREFIX_LENGTH = 3
+MAC_BLOCK_PAGE_SIZE = 100
+
+
+def serial_registry_queryset():
+    latest_mapping = CustomerAssetMapping.objects.filter(order_serial=OuterRef("pk")).order_by("-assigned_at", "-id")
+    return OrderItemSerial.objects.select_related(
+        "order_item__asset",
+        "order_item__order__user__partner",
+        "order_item__order__shipment",
+    ).annotate(
+        customer_name=Subquery(latest_mapping.values("customer_name")[:1]),
+        customer_phone=Subquery(latest_mapping.values("phone")[:1]),
+    )
+
+
+def lookup_serials(query, limit=SERIAL_LOOKUP_LIMIT):
+    """
+    Serials matching ``query`` exactly (serial number or MAC), or failing that
+    starting with it. Prefix searches need at least MIN_PREFIX_LENGTH characters.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    condition = Q(serial_number=query) | Q(mac_id=query)
+    mac = parse_mac(query)
+    if mac is not None:
+        condition |= Q(mac_int=mac)  # the same MAC typed in any format
+    exact = list(serial_registry_queryset().filter(condition)[:limit])
+    if exact or len(query) < MIN_PREFIX_LENGTH:
+        return exact
+
+    # Serials are usually stored upper-case; also try the query that way so
+    # both branches stay plain index range scans (no UPPER() on the column)
+    prefixes = {query, query.upper()}
+    condition = Q()
+    for prefix in prefixes:
+        condition |= Q(serial_number__startswith=prefix) | Q(mac_id__startswith=prefix)
+    return list(serial_registry_queryset().filter(condition).order_by("serial_number")[:limit])
+
+
+def serial_lookup_row(serial):
+    """JSON-ready description of a serial, its order, partner, shipment and customer."""
+    item = serial.order_item
+    order = item.order
+    user = order.user
+    partner = getattr(user, "partner", None)
+    shipment = getattr(order, "shipment", None)
+    return {
+        "serial_number": serial.serial_number,
+        "mac_id": serial.mac_id,
+        "mac": format_mac(serial.mac_int) if serial.mac_int is not None else None,
+        "make": serial.make,
+        "model": serial.model,
+        "asset": item.asset.name,
+        "order": {
+            "id": order.id,
+            "order_id": order.order_id,
+            "dc_number": order.dc_number,
+            "status": order.status,
+            "created_at": order.created_at.isoformat(),
+        },
+        "partner": {
+            "username": user.username,
+            "name": user.get_full_name(),
+            "code": partner.code if partner else None,
+            "phone": partner.phone if partner else user.phone,
+        },
+        "shipment": {
+            "status": SHIPMENT_STATUS_LABELS.get(shipment.shipping_status),
+            "courier": shipment.courier_name,
+            "tracking_id": shipment.tracking_id,
+            "dispatched_at": shipment.dispatched_at.isoformat() if shipment.dispatched_at else None,
+            "delivered_at": shipment.delivered_at.isoformat() if shipment.delivered_at else None,
+        } if shipment else None,
+        "customer": {
+            "name": serial.customer_name,
+            "phone": serial.customer_phone,
+            "mapped_at": serial.mapped_at.isoformat(),
+        } if serial.mapped_at else None,
+    }
+
+
+def encode_mac_block_cursor(serial):
+    return f"{serial.mac_int}-{serial.pk}"
+
+
+def decode_mac_block_cursor(cursor):
+    """Return ``(mac_int, id)`` from a cursor; raises ValueError if it is malformed."""
+    mac_int, _, pk = cursor.partition("-")
+    try:
+        return int(mac_int), int(pk)
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def serials_in_mac_block(low, high, after=None, limit=MAC_BLOCK_PAGE_SIZE):
+    """
+    Serials whose MAC lies in ``low``..``high`` (inclusive), in MAC order, as
+    one range scan on the mac_int index. ``after`` is the cursor of a previous
+    page: ``(mac_int, id)``, since a MAC can be recorded on more than one
+    serial. Returns ``(serials, next_after)``; raises ValueError for a bad cursor.
+    """
+    qs = serial_registry_queryset().filter(mac_int__gte=low, mac_int__lte=high).order_by("mac_int", "id")
+    if after:
+        mac_int, pk = decode_mac_block_cursor(after)
+        qs = qs.filter(Q(mac_int__gt=mac_int) | Q(mac_int=mac_int, id__gt=pk))
+    serials = list(qs[:limit + 1])
+    next_after = encode_mac_block_cursor(serials[limit - 1]) if len(serials) > limit else None
+    return serials[:limit], next_after
@@ -1,61 +1,117 @@
+from datetime import date
+from itertools import zip_longest
+from urllib.parse import urlencode
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError
+from django.http import HttpResponseForbidden, JsonResponse
 from django.utils import timezone
 
 # ✅ Import from order app (correct app)
+from order.macs import format_mac, parse_mac_range
 from order.models import Order, OrderItem, OrderItemSerial, OrderShipment
+from .packing_lists import PackingListError, import_packing_list, read_packing_list
+from .utils import (
+    SerialConflict, get_store_orders_page, lookup_serials, order_serials_complete, resolve_partner_user_id,
+    save_item_serials, serial_lookup_row, serials_in_mac_block,
+)
 
 
-# 🧾 Store Orders List
-from django.core.paginator import Paginator
+def is_store_user(user):
+    """Staff, store and superadmin users may work on serials; partners may not."""
+    return user.is_staff or user.user_type in ('store', 'superadmin')
 
 
+# 🧾 Store Orders List
 def store_orders(request):
-    orders = Order.objects.all().order_by('-created_at')
-
-    # Get current page ?page=1,2,3...
-    page_number = request.GET.get('page')
+    """
+    The store's order queue, newest first, keyset-paged with ``?before=``.
+    Filters: ``status``, ``start``/``end`` (YYYY-MM-DD), ``partner``
+    (username or partner code) and ``needs_serials=1``.
+    """
+    filters = {
+        'status': request.GET.get('status', '').strip(),
+        'start': request.GET.get('start', '').strip(),
+        'end': request.GET.get('end', '').strip(),
+        'partner': request.GET.get('partner', '').strip(),
+        'needs_serials': request.GET.get('needs_serials') == '1',
+    }
+    try:
+        start = date.fromisoformat(filters['start']) if filters['start'] else None
+        end = date.fromisoformat(filters['end']) if filters['end'] else None
+    except ValueError:
+        messages.error(request, "Dates must be in YYYY-MM-DD format.")
+        return redirect('store_orders')
 
-    # Create paginator (show 10 orders per page)
-    paginator = Paginator(orders, 10)
+    user_id = None
+    if filters['partner']:
+        # An unknown partner matches nothing rather than everything
+        user_id = resolve_partner_user_id(filters['partner']) or 0
+
+    try:
+        orders, next_cursor, facets = get_store_orders_page(
+            status=filters['status'] or None,
+            start=start,
+            end=end,
+            user_id=user_id,
+            needs_serials=filters['needs_serials'],
+            cursor=request.GET.get('before'),
+        )
+    except ValueError:
+        return redirect('store_orders')
 
-    # Get paginated page
-    page_obj = paginator.get_page(page_number)
+    # Query string of the active filters, for the facet and paging links
+    active = {k: ('1' if v is True else v) for k, v in filters.items() if v}
+    facet_query = urlencode({k: v for k, v in active.items() if k != 'status'})
 
     return render(request, 'store/order_list.html', {
-        'page_obj': page_obj,       # main pagination object
-        'orders': page_obj.object_list,  # optional
+        'orders': orders,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('before'),
+        'facets': facets,
+        'filters': filters,
+        'filter_query': urlencode(active),
+        'facet_query': facet_query,
     })
 
 
 # 🔢 Update Serial Numbers
 def update_serials(request, item_id):
-    item = get_object_or_404(OrderItem, id=item_id)
+    item = get_object_or_404(OrderItem.objects.select_related('asset'), id=item_id)
 
     if request.method == 'POST':
+        serial_ids = request.POST.getlist('serial_id')
         serials = request.POST.getlist('serial_numbers')
         makes = request.POST.getlist('make')
         models_ = request.POST.getlist('model')
         mac_ids = request.POST.getlist('mac_id')
 
-        # Clear old serials
-        item.serials.all().delete()
-
-        # Add new serials with optional fields
-        for s, mk, mdl, mac in zip(serials, makes, models_, mac_ids):
+        rows = []
+        for pk, s, mk, mdl, mac in zip_longest(serial_ids, serials, makes, models_, mac_ids, fillvalue=''):
             if s.strip():
-                OrderItemSerial.objects.create(
-                    order_item=item,
-                    serial_number=s.strip(),
-                    make=mk.strip() or None,
-                    model=mdl.strip() or None,
-                    mac_id=mac.strip() or None
-                )
+                rows.append({
+                    'id': int(pk) if pk.isdigit() else None,
+                    'serial_number': s.strip(),
+                    'make': mk.strip() or None,
+                    'model': mdl.strip() or None,
+                    'mac_id': mac.strip() or None,
+                })
+
+        try:
+            save_item_serials(item, rows)
+        except SerialConflict as e:
+            messages.error(request, str(e))
+            return redirect('store_orders')
+        except IntegrityError:
+            # Someone else registered one of these serials between the check and the write
+            messages.error(request, "Some serials were registered by someone else meanwhile; save again to see which.")
+            return redirect('store_orders')
 
         # ✅ Optional: Update status
-        if all(i.serials.count() >= i.quantity for i in item.order.orderitem_set.all()):
-            item.order.status = 'Serial Updated'
-            item.order.save()
+        if order_serials_complete(item.order_id):
+            Order.objects.filter(pk=item.order_id).update(status='Serial Updated')
 
         messages.success(request, f"Serial numbers updated for {item.asset.name}")
         return redirect('store_orders')
@@ -148,4 +204,68 @@ def edit_shipment(request, order_id):
         shipment.save()
         messages.success(request, "✅ Shipment details updated successfully!")
         return redirect("store_order_detail", order_id=order_id)  
-    return render(request, "store/edit_shipment.html", {"shipment": shipment})
\ No newline at end of file
+    return render(request, "store/edit_shipment.html", {"shipment": shipment})
+
+
+# 📥 Upload Serials from a Packing List
+@login_required
+def upload_serials(request):
+    if not is_store_user(request.user):
+        return HttpResponseForbidden("Only store users can upload packing lists.")
+
+    result = None
+    if request.method == "POST":
+        uploaded = request.FILES.get("packing_list")
+        if not uploaded:
+            messages.error(request, "Choose a CSV or XLSX packing list to upload.")
+        else:
+            dry_run = request.POST.get("dry_run") == "1"
+            try:
+                result = import_packing_list(read_packing_list(uploaded), dry_run=dry_run)
+            except PackingListError as e:
+                messages.error(request, str(e))
+            except IntegrityError:
+                # Another upload registered some of these serials between validation and insert
+                messages.error(request, "Some serials were registered by someone else meanwhile; upload again to see which.")
+            else:
+                if result["errors"]:
+                    messages.error(request, f"{len(result['errors'])} row(s) need fixing; nothing was saved.")
+                elif dry_run:
+                    messages.success(request, f"✅ All {result['valid']} serials are valid (nothing saved).")
+                else:
+                    messages.success(
+                        request, f"✅ {result['created']} serials added across {result['orders']} order(s)."
+                    )
+
+    return render(request, "store/upload_serials.html", {"result": result})
+
+
+
+# 🔍 Serial Lookup ("who holds this device?")
+@login_required
+def serial_lookup(request):
+    """
+    ``?q=<serial or MAC>``: exact matches, or failing that up to 20 serials
+    starting with ``q``, each with its order, partner, shipment and customer.
+
+    ``?block=<MAC block>`` (an OUI like ``AA:BB:CC``, ``AA:BB:CC:D0:00:00/36``
+    or ``<first MAC>..<last MAC>``) lists every serial in the block in MAC
+    order, 100 at a time; pass the returned ``next`` back as ``?after=``.
+    """
+    if not is_store_user(request.user):
+        return JsonResponse({"error": "Not allowed."}, status=403)
+
+    if request.GET.get('block'):
+        try:
+            low, high = parse_mac_range(request.GET['block'])
+            serials, next_after = serials_in_mac_block(low, high, after=request.GET.get('after'))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        return JsonResponse({
+            "block": [format_mac(low), format_mac(high)],
+            "results": [serial_lookup_row(serial) for serial in serials],
+            "next": next_after,
+        })
+
+    serials = lookup_serials(request.GET.get('q', ''))
+    return JsonResponse({"results": [serial_lookup_row(serial) for serial in serials]})